@@ -1,10 +1,18 @@
+import argparse
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+parser = argparse.ArgumentParser(description="Swarm plot of ΔRMSD per catalytic-cycle category.")
+parser.add_argument("--input", default="Serine_Protease_Suppmentary_table - Chymotrypsin(pairs).csv",
+                    help="Pairs table with Category and ΔRMSD (Å) columns")
+parser.add_argument("--output", default="rmsd_plot.png", help="Output figure")
+parser.add_argument("--family", default="Chymotrypsin", help="Protease family named in the title")
+args = parser.parse_args()
+
 # Read data (assume missing categories in CSV are already filled downward)
-df = pd.read_csv("Serine_Protease_Suppmentary_table - Chymotrypsin(pairs).csv")
-df["Category"] = df["Category"].fillna(method="ffill")
+df = pd.read_csv(args.input)
+df["Category"] = df["Category"].ffill()
 
 # Define custom color palette (optional)
 custom_palette = {"#0072B2"}
@@ -22,11 +30,11 @@ sns.swarmplot(
 )
 
 # Improve plot aesthetics
-plt.title("Alpha Carbon ΔRMSD Comparison Across Catalytic Cycle for Chymotrypsin", fontsize=13)
+plt.title(f"Alpha Carbon ΔRMSD Comparison Across Catalytic Cycle for {args.family}", fontsize=13)
 plt.ylim(0, 0.2)
 plt.grid(axis="y", linestyle="--", alpha=0.5)
 sns.despine()
 plt.tight_layout()
 
-plt.savefig("rmsd_plot.png", dpi=300)  # Save high-resolution image
+plt.savefig(args.output, dpi=300)  # Save high-resolution image
 plt.show()
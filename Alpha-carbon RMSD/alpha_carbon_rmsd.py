@@ -3,9 +3,11 @@ import sys
 from pymol import cmd
 import os
 
-# Check input arguments (added chain identifier argument)
-if len(sys.argv) != 5:
-    print("Usage: python alpha_carbon_rmsd.py <structure_1.pdb> <chain_1> <structure_2.pdb> <chain_2>")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+
+# Check input arguments (added chain identifier argument; optional result store)
+if len(sys.argv) not in (5, 6):
+    print("Usage: python alpha_carbon_rmsd.py <structure_1.pdb> <chain_1> <structure_2.pdb> <chain_2> [results.db]")
     sys.exit(1)
 
 # Retrieve parameters
@@ -13,6 +15,7 @@ structure_1 = sys.argv[1]
 chain_1 = sys.argv[2]
 structure_2 = sys.argv[3]
 chain_2 = sys.argv[4]
+result_db = sys.argv[5] if len(sys.argv) == 6 else None
 
 # Load structures
 cmd.load(structure_1, "structure_1")
@@ -38,6 +41,14 @@ rmsd = cmd.align(f"chain_{chain_1}_1", f"chain_{chain_2}_2")[0]
 struct1_name = os.path.splitext(os.path.basename(structure_1))[0]
 struct2_name = os.path.splitext(os.path.basename(structure_2))[0]
 
+# With a result store, add one row to its "rmsd" table instead of writing a per-pair file
+if result_db:
+    import pandas as pd
+    from result_store import write_results
+    row = {"structure_1": struct1_name, "chain_1": chain_1, "structure_2": struct2_name, "chain_2": chain_2}
+    write_results(result_db, "rmsd", pd.DataFrame([{**row, "rmsd": round(rmsd, 3)}]), replace=row)
+    sys.exit(0)
+
 # Generate output filename (no subdirectory)
 output_file = f"{struct1_name}_chain{chain_1}_vs_{struct2_name}_chain{chain_2}_RMSD.txt"
 
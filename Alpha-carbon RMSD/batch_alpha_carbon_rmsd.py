@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 import sys
 import os
-from pymol import cmd
+from kabsch_rmsd import batch_rmsd, read_pairs
 
 # Define input file with PDB pairs
 input_file = "pdb_pairs.txt"
@@ -13,32 +13,18 @@ output_file = "batch_rmsd_results.txt"
 with open(output_file, "w") as out_f:
     out_f.write("Structure 1\tStructure 2\tAlpha Carbon RMSD (Å)\n")
 
-    # Read each PDB pair from the input file
-    with open(input_file, "r") as f:
-        for line in f:
-            structure_1, structure_2 = line.strip().split()
+    # Read each PDB pair from the input file; each structure is parsed once and
+    # fitted with the NumPy Kabsch engine (same outlier rejection as cmd.align)
+    for structure_1, structure_2, rmsd in batch_rmsd(read_pairs(input_file), chain_1="A", chain_2="A"):
 
-            # Load structures into PyMOL
-            cmd.reinitialize()  # Reset PyMOL for each pair
-            cmd.load(structure_1, "structure_1")
-            cmd.load(structure_2, "structure_2")
+        # Check if both structures have chain A alpha carbons
+        if rmsd is None:
+            print(f"Skipping {structure_1} and {structure_2}: No CA atoms in Chain A")
+            continue
 
-            # Select alpha carbon atoms of chain A
-            cmd.select("chain_A_1", "structure_1 and chain A and name CA")
-            cmd.select("chain_A_2", "structure_2 and chain A and name CA")
+        # Write results to file
+        out_f.write(f"{structure_1}\t{structure_2}\t{rmsd:.3f}\n")
 
-            # Check if selections contain atoms
-            if cmd.count_atoms("chain_A_1") == 0 or cmd.count_atoms("chain_A_2") == 0:
-                print(f"Skipping {structure_1} and {structure_2}: No CA atoms in Chain A")
-                continue
-
-            # Compute RMSD
-            rmsd = cmd.align("chain_A_1", "chain_A_2")[0]
-
-            # Write results to file
-            out_f.write(f"{structure_1}\t{structure_2}\t{rmsd:.3f}\n")
-
-            print(f"Processed: {structure_1} vs {structure_2} | RMSD: {rmsd:.3f} Å")
+        print(f"Processed: {structure_1} vs {structure_2} | RMSD: {rmsd:.3f} Å")
 
 print(f"Batch processing complete. Results saved in {output_file}.")
-
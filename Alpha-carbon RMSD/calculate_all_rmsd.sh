@@ -3,6 +3,7 @@
 #-------------------------------Configuration Section-------------------------------#
 PDB_PAIR_LIST="pdb_pairs.txt"  # Input file with PDB pairs (one pair per line: "PDB1_path PDB2_path")
 OUTPUT_DIR="rmsd_results"       # Output directory for results
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"  # Location of kabsch_rmsd.py
 
 #-------------------------------Script Start-------------------------------#
 mkdir -p ${OUTPUT_DIR}
@@ -13,7 +14,9 @@ echo -e "PDB1\tPDB2\tRMSD" > ${OUTPUT_DIR}/all_results.tsv
 echo "Processing PDB pairs from: ${PDB_PAIR_LIST}"
 echo "----------------------------------------"
 
-# Process input file line by line
+# Validate input file line by line; valid pairs are computed together afterwards
+VALID_PAIRS=${OUTPUT_DIR}/valid_pairs.txt
+> ${VALID_PAIRS}
 while IFS= read -r line; do
   # Extract PDB paths
   PDB1=$(echo "$line" | awk '{print $1}')
@@ -35,27 +38,27 @@ while IFS= read -r line; do
     continue
   fi
 
-  # Extract base PDB names for reporting
-  BASE1=$(basename "${PDB1}" .pdb)
-  BASE2=$(basename "${PDB2}" .pdb)
-
-  # Perform RMSD calculation
-  echo "Processing pair: ${BASE1} ↔ ${BASE2}"
-  RMSD=$(python - <<END
-from pymol import cmd
-cmd.load("$PDB1", "mobile")
-cmd.load("$PDB2", "target")
-rmsd = cmd.align("mobile & chain A & name CA", 
-                 "target & chain A & name CA",
-                 cycles=0)[0]
-print(f"{rmsd:.3f}")
-END
-  )
-
-  # Record results (PDB names and RMSD)
-  echo -e "${BASE1}\t${BASE2}\t${RMSD}" >> ${OUTPUT_DIR}/all_results.tsv
+  echo "Queued pair: $(basename "${PDB1}" .pdb) ↔ $(basename "${PDB2}" .pdb)"
+  echo "${PDB1} ${PDB2}" >> ${VALID_PAIRS}
 
 done < "${PDB_PAIR_LIST}"
 
+# Perform all RMSD calculations in a single Python process (NumPy Kabsch fit, no outlier rejection)
+python - "${VALID_PAIRS}" >> ${OUTPUT_DIR}/all_results.tsv <<END
+import os
+import sys
+sys.path.append("${SCRIPT_DIR}")
+from kabsch_rmsd import batch_rmsd, read_pairs
+
+def base_name(path):
+    name = os.path.basename(path)
+    return name[:-4] if name.endswith(".pdb") else name
+
+for pdb1, pdb2, rmsd in batch_rmsd(read_pairs(sys.argv[1]), chain_1="A", chain_2="A", cycles=0):
+    # Record results (PDB names and RMSD)
+    print(f"{base_name(pdb1)}\t{base_name(pdb2)}\t{'' if rmsd is None else f'{rmsd:.3f}'}")
+END
+rm -f ${VALID_PAIRS}
+
 echo "----------------------------------------"
 echo "All tasks completed! Results saved to: ${OUTPUT_DIR}/all_results.tsv"
\ No newline at end of file
@@ -1,9 +1,16 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+parser = argparse.ArgumentParser(description="Strip plot of ΔRMSD per category.")
+parser.add_argument("--input", default="Alpha_Lytic_Protease_pairs.csv", help="Pairs table with category and RMSD columns")
+parser.add_argument("--output", default="scatter_plot.png", help="Output figure")
+parser.add_argument("--family", default="Alpha Lytic Protease", help="Protease family named in the title")
+args = parser.parse_args()
+
 # Read CSV file
-file_path = "Alpha_Lytic_Protease_pairs.csv"
+file_path = args.input
 df = pd.read_csv(file_path)
 
 # Clean column names
@@ -18,7 +25,7 @@ if category_col is None or rmsd_col is None:
     raise ValueError("Could not find 'Category' or 'RMSD' columns. Check column names.")
 
 # Forward-fill missing category values
-df[category_col] = df[category_col].fillna(method="ffill")
+df[category_col] = df[category_col].ffill()
 
 # Drop missing values in detected columns
 df = df.dropna(subset=[category_col, rmsd_col])
@@ -33,11 +40,11 @@ sns.stripplot(x=category_col, y=rmsd_col, data=df, jitter=False, size=8, alpha=0
 # Add labels and title
 plt.xlabel(category_col)
 plt.ylabel(rmsd_col)
-plt.title("Scatter Plot of ΔRMSD for Alpha Lytic Protease")
+plt.title(f"Scatter Plot of ΔRMSD for {args.family}")
 plt.xticks(rotation=30)  # Rotate x-axis labels for better readability
 
 # Save plot as a file
-output_file = "scatter_plot.png"
+output_file = args.output
 plt.savefig(output_file, dpi=300, bbox_inches="tight")
 
 print(f"Plot saved as {output_file}")
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+"""
+Usage:
+Pure NumPy alpha-carbon RMSD engine (no PyMOL session per pair).
+
+Cα coordinates are extracted once per structure and chain, residues are matched by residue
+number + insertion code (or by a global sequence alignment), and the RMSD comes from a Kabsch
+superposition with the same iterative outlier rejection as PyMOL's cmd.align
+(defaults cycles=5, cutoff=2.0: pairs deviating by more than cutoff * RMSD are dropped and the
+fit is repeated). cycles=0 gives the plain RMSD over all matched pairs.
+
+Command to run:
+python kabsch_rmsd.py <pdb_pairs.txt> [--chain_1 A] [--chain_2 A] [--cycles 5] [--cutoff 2.0]
+                      [--match numbering|sequence] [--residue_map residue_map.csv] [--output batch_rmsd_results.txt]
+
+Each line of pdb_pairs.txt is "<structure_1.pdb> <structure_2.pdb>", optionally followed by
+"<chain_1> <chain_2>" to override the chains for that pair.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+from structure_store import load_atoms
+from residue_map import align_sequences, load_residue_map, structure_id
+
+THREE_TO_ONE = {
+    'ALA': 'A', 'CYS': 'C', 'ASP': 'D', 'GLU': 'E', 'PHE': 'F',
+    'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LYS': 'K', 'LEU': 'L',
+    'MET': 'M', 'ASN': 'N', 'PRO': 'P', 'GLN': 'Q', 'ARG': 'R',
+    'SER': 'S', 'THR': 'T', 'VAL': 'V', 'TRP': 'W', 'TYR': 'Y'
+}
+
+
+def load_ca_chains(pdb_file, store_dir=None):
+    """
+    Extract Cα atoms of every chain once.
+
+    Parameters:
+    pdb_file (str): Path to the PDB file.
+    store_dir (str): Optional structure store directory (see "Structure store/structure_store.py").
+
+    Returns:
+    dict: chain ID -> {"keys": residue number + insertion code, "resn": residue names, "coords": n x 3 array}.
+          Only the first model and the first alternate conformer of each residue are used.
+    """
+    atoms = load_atoms(pdb_file, store_dir)
+    if len(atoms["model"]) == 0:
+        return {}
+
+    # Protein Cα only (calcium ions are also named CA)
+    ca = (atoms["name"] == "CA") & (atoms["element"] == "C") & (atoms["model"] == atoms["model"][0])
+    chains = atoms["chain"][ca]
+    keys = np.char.add(np.asarray(atoms["resi"][ca]).astype(str), atoms["icode"][ca])
+    resn = atoms["resn"][ca]
+    coords = np.asarray(atoms["coords"][ca], dtype=float)
+
+    ca_chains = {}
+    for chain in np.unique(chains):
+        in_chain = np.flatnonzero(chains == chain)
+        # First occurrence of each residue drops alternate conformers
+        _, first = np.unique(keys[in_chain], return_index=True)
+        idx = in_chain[np.sort(first)]
+        ca_chains[str(chain)] = {"keys": keys[idx], "resn": resn[idx], "coords": coords[idx]}
+    return ca_chains
+
+
+def match_by_numbering(ca_1, ca_2):
+    """Indices of residues present in both chains with the same number and insertion code."""
+    _, idx_1, idx_2 = np.intersect1d(ca_1["keys"], ca_2["keys"], assume_unique=True, return_indices=True)
+    return idx_1, idx_2
+
+
+def match_by_sequence(ca_1, ca_2, gap=-1.0, alignments=None):
+    """
+    Indices of residues aligned by a global (Needleman-Wunsch) alignment of the two sequences.
+
+    Identities score 1, mismatches 0 and gaps `gap`; only aligned positions with identical residues are returned.
+    alignments (dict): Optional cache of results keyed on the sequence pair, so chains with the same
+                       sequences (the same protein in many structures) are aligned once.
+    """
+    seq_1 = [THREE_TO_ONE.get(r, 'X') for r in ca_1["resn"]]
+    seq_2 = [THREE_TO_ONE.get(r, 'X') for r in ca_2["resn"]]
+    key = ("".join(seq_1), "".join(seq_2), gap)
+    if alignments is not None and key in alignments:
+        return alignments[key]
+    idx_1, idx_2, identical = align_sequences(seq_1, seq_2, gap)
+    matched = idx_1[identical], idx_2[identical]
+    if alignments is not None:
+        alignments[key] = matched
+    return matched
+
+
+def ca_to_reference(ca_chains, residue_map, structure):
+    """
+    Replace residue keys by reference numbering from a residue map (see "Structure store/residue_map.py").
+
+    Residues without a reference position are dropped, so match_by_numbering then pairs residues
+    by their family numbering whatever the chain names and numbering of each structure.
+    """
+    mapped = residue_map[residue_map["structure"] == structure]
+    converted = {}
+    for chain, ca in ca_chains.items():
+        in_chain = mapped[mapped["chain"] == chain]
+        labels = pd.Series(in_chain["ref_label"].to_numpy(),
+                           index=in_chain["resi"].astype(str) + in_chain["icode"])
+        ref_keys = labels.reindex(ca["keys"]).to_numpy()
+        keep = pd.notna(ref_keys)
+        converted[chain] = {"keys": ref_keys[keep].astype(str), "resn": ca["resn"][keep], "coords": ca["coords"][keep]}
+    return converted
+
+
+def kabsch(mobile, target):
+    """
+    Optimal rotation superposing mobile onto target (both n x 3).
+
+    Returns:
+    tuple: (rotation matrix, mobile centroid, target centroid); fitted = (mobile - c_mobile) @ R.T + c_target
+    """
+    mobile_center = mobile.mean(axis=0)
+    target_center = target.mean(axis=0)
+    covariance = (mobile - mobile_center).T @ (target - target_center)
+    u, _, vt = np.linalg.svd(covariance)
+    # Correct for reflection
+    d = np.sign(np.linalg.det(vt.T @ u.T))
+    rotation = vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+    return rotation, mobile_center, target_center
+
+
+def _deviations(mobile, target):
+    rotation, mobile_center, target_center = kabsch(mobile, target)
+    fitted = (mobile - mobile_center) @ rotation.T + target_center
+    return np.sqrt(np.sum((fitted - target) ** 2, axis=1))
+
+
+def superpose_rmsd(mobile, target, cycles=5, cutoff=2.0):
+    """
+    Kabsch RMSD with iterative outlier rejection, following cmd.align.
+
+    Parameters:
+    mobile, target (array): Matched n x 3 coordinates.
+    cycles (int): Maximum number of outlier rejection cycles (0 = no rejection).
+    cutoff (float): Pairs deviating by more than cutoff * RMSD are rejected each cycle.
+
+    Returns:
+    tuple: (RMSD after refinement, atoms after refinement, cycles run,
+            RMSD before refinement, atoms before refinement), like cmd.align's first five values.
+    """
+    mobile = np.asarray(mobile, dtype=float)
+    target = np.asarray(target, dtype=float)
+    if len(mobile) == 0:
+        return None, 0, 0, None, 0
+
+    keep = np.ones(len(mobile), dtype=bool)
+    deviations = _deviations(mobile, target)
+    rmsd = float(np.sqrt(np.mean(deviations ** 2)))
+    rmsd_before, atoms_before = rmsd, len(mobile)
+
+    cycles_run = 0
+    while cycles_run < cycles:
+        reject = deviations > cutoff * rmsd
+        # Stop when nothing is rejected or too few pairs would remain for a fit
+        if not reject.any() or keep.sum() - reject.sum() < 3:
+            break
+        keep[np.flatnonzero(keep)[reject]] = False
+        deviations = _deviations(mobile[keep], target[keep])
+        rmsd = float(np.sqrt(np.mean(deviations ** 2)))
+        cycles_run += 1
+
+    return rmsd, int(keep.sum()), cycles_run, rmsd_before, atoms_before
+
+
+def ca_rmsd(ca_1, ca_2, cycles=5, cutoff=2.0, match="numbering", alignments=None):
+    """
+    Cα RMSD between two chains from load_ca_chains; see superpose_rmsd for the return value.
+
+    alignments (dict): Optional sequence alignment cache for match="sequence" (see match_by_sequence).
+    """
+    if match == "sequence":
+        idx_1, idx_2 = match_by_sequence(ca_1, ca_2, alignments=alignments)
+    else:
+        idx_1, idx_2 = match_by_numbering(ca_1, ca_2)
+    return superpose_rmsd(ca_1["coords"][idx_1], ca_2["coords"][idx_2], cycles, cutoff)
+
+
+def batch_rmsd(pairs, chain_1="A", chain_2="A", cycles=5, cutoff=2.0, match="numbering", store_dir=None,
+               residue_map=None):
+    """
+    RMSD for many structure pairs in one process; each structure is read once, and with
+    match="sequence" each distinct pair of chain sequences is aligned once.
+
+    Parameters:
+    pairs (iterable): (structure_1, structure_2) or (structure_1, structure_2, chain_1, chain_2) tuples.
+    residue_map (DataFrame): Optional residue map; residues are then matched by reference numbering
+                             (structure IDs are the file names without .pdb/.gz).
+
+    Yields:
+    tuple: (structure_1, structure_2, RMSD), with RMSD None when a chain has no Cα atoms.
+    """
+    cache = {}
+    alignments = {}
+    for pair in pairs:
+        structure_1, structure_2 = pair[0], pair[1]
+        pair_chain_1, pair_chain_2 = (pair[2], pair[3]) if len(pair) >= 4 else (chain_1, chain_2)
+        for structure in (structure_1, structure_2):
+            if structure not in cache:
+                cache[structure] = load_ca_chains(structure, store_dir)
+                if residue_map is not None:
+                    cache[structure] = ca_to_reference(cache[structure], residue_map, structure_id(structure))
+
+        ca_1 = cache[structure_1].get(pair_chain_1)
+        ca_2 = cache[structure_2].get(pair_chain_2)
+        if ca_1 is None or ca_2 is None:
+            yield structure_1, structure_2, None
+            continue
+        yield structure_1, structure_2, ca_rmsd(ca_1, ca_2, cycles, cutoff, match, alignments)[0]
+
+
+def read_pairs(input_file):
+    """Read whitespace-separated structure pairs (optionally with chains), skipping blank and malformed lines."""
+    pairs = []
+    with open(input_file, "r") as f:
+        for line in f:
+            fields = tuple(line.split())
+            if len(fields) in (2, 4):
+                pairs.append(fields)
+            elif fields:
+                print(f"Skipping invalid line: {line.strip()}")
+    return pairs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch alpha-carbon RMSD with a NumPy Kabsch fit.")
+    parser.add_argument("pairs_file", help="File with one '<structure_1> <structure_2> [chain_1 chain_2]' pair per line")
+    parser.add_argument("--chain_1", default="A", help="Chain of structure 1 (default A)")
+    parser.add_argument("--chain_2", default="A", help="Chain of structure 2 (default A)")
+    parser.add_argument("--cycles", type=int, default=5, help="Outlier rejection cycles, as in cmd.align (0 = none)")
+    parser.add_argument("--cutoff", type=float, default=2.0, help="Outlier rejection cutoff in units of RMSD")
+    parser.add_argument("--match", choices=["numbering", "sequence"], default="numbering",
+                        help="Match residues by number + insertion code or by sequence alignment")
+    parser.add_argument("--store_dir", default=None, help="Structure store directory for cached coordinates")
+    parser.add_argument("--residue_map", default=None,
+                        help="Residue map CSV from residue_map.py; match residues by reference numbering")
+    parser.add_argument("--output", default="batch_rmsd_results.txt", help="Output file")
+    args = parser.parse_args()
+
+    residue_map = load_residue_map(args.residue_map) if args.residue_map else None
+    with open(args.output, "w") as out_f:
+        out_f.write("Structure 1\tStructure 2\tAlpha Carbon RMSD (Å)\n")
+        for structure_1, structure_2, rmsd in batch_rmsd(read_pairs(args.pairs_file), args.chain_1, args.chain_2,
+                                                         args.cycles, args.cutoff, args.match, args.store_dir,
+                                                         residue_map):
+            if rmsd is None:
+                print(f"Skipping {structure_1} and {structure_2}: No CA atoms in the selected chains")
+                continue
+            out_f.write(f"{structure_1}\t{structure_2}\t{rmsd:.3f}\n")
+
+    print(f"Batch processing complete. Results saved in {args.output}.")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+"""
+Usage:
+All-vs-all alpha-carbon RMSD matrix for a protease family, computed in tiles across a process pool.
+
+Every structure's Cα chain is extracted once, the upper triangle of the matrix is split into
+square tiles and each tile is fitted with the NumPy Kabsch engine in kabsch_rmsd.py. Results go
+into a memory-mapped float32 .npy matrix; finished tiles are logged so an interrupted run picks up
+where it stopped.
+
+Command to run:
+python rmsd_matrix.py <structure_list.txt> <output_dir> [--chain A] [--tile 64] [--workers 8] [--cycles 5]
+
+Each line of structure_list.txt is "<structure.pdb>" or "<structure.pdb> <chain>".
+
+Output (in output_dir):
+- rmsd_matrix.npy: n x n float32 matrix (load with np.load(path, mmap_mode="r")); NaN where a pair has no matched Cα
+- structure_index.csv: index, structure_id, path, chain
+- completed_tiles.txt: tiles already written (used to resume)
+"""
+
+import argparse
+import csv
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from kabsch_rmsd import load_ca_chains, ca_rmsd
+
+MATRIX_FILE = "rmsd_matrix.npy"
+INDEX_FILE = "structure_index.csv"
+TILES_FILE = "completed_tiles.txt"
+
+# Cα chains of every structure, set once per worker process
+_ca_chains = None
+
+
+def read_structure_list(list_file, chain="A"):
+    """Return [(path, chain)] from a structure list file."""
+    structures = []
+    with open(list_file, "r") as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                structures.append((fields[0], fields[1] if len(fields) > 1 else chain))
+    return structures
+
+
+def structure_id(path, chain):
+    name = os.path.basename(path)
+    return f"{name[:-4] if name.endswith('.pdb') else name}_{chain}"
+
+
+def load_all_ca(structures, store_dir=None):
+    """Extract the selected Cα chain of every structure once (None if the chain is missing)."""
+    return [load_ca_chains(path, store_dir).get(chain) for path, chain in structures]
+
+
+def make_tiles(n, tile):
+    """Upper-triangle tiles as (row_start, row_end, col_start, col_end)."""
+    starts = range(0, n, tile)
+    return [(i, min(i + tile, n), j, min(j + tile, n)) for i in starts for j in starts if j >= i]
+
+
+def tile_name(tile):
+    return "{}-{}_{}-{}".format(*tile)
+
+
+def _init_worker(ca_chains):
+    global _ca_chains
+    _ca_chains = ca_chains
+
+
+def compute_tile(tile, cycles=5, cutoff=2.0, match="numbering"):
+    """RMSD block for one tile; on diagonal tiles only pairs above the diagonal are computed."""
+    row_start, row_end, col_start, col_end = tile
+    block = np.full((row_end - row_start, col_end - col_start), np.nan, dtype=np.float32)
+    for i in range(row_start, row_end):
+        for j in range(max(col_start, i + 1), col_end):
+            ca_1, ca_2 = _ca_chains[i], _ca_chains[j]
+            if ca_1 is None or ca_2 is None:
+                continue
+            rmsd = ca_rmsd(ca_1, ca_2, cycles, cutoff, match)[0]
+            if rmsd is not None:
+                block[i - row_start, j - col_start] = rmsd
+    return tile, block
+
+
+def _compute_tile_args(args):
+    return compute_tile(*args)
+
+
+def write_index(structures, output_dir):
+    with open(os.path.join(output_dir, INDEX_FILE), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["index", "structure_id", "path", "chain"])
+        for idx, (path, chain) in enumerate(structures):
+            writer.writerow([idx, structure_id(path, chain), path, chain])
+
+
+def read_index(output_dir):
+    with open(os.path.join(output_dir, INDEX_FILE), "r", newline="") as f:
+        return [(row["path"], row["chain"]) for row in csv.DictReader(f)]
+
+
+def open_matrix(structures, output_dir):
+    """
+    Open (resume) or create the memory-mapped matrix.
+
+    Returns:
+    tuple: (matrix memmap, set of completed tile names)
+    """
+    matrix_path = os.path.join(output_dir, MATRIX_FILE)
+    tiles_path = os.path.join(output_dir, TILES_FILE)
+    n = len(structures)
+
+    if os.path.exists(matrix_path) and os.path.exists(os.path.join(output_dir, INDEX_FILE)):
+        if read_index(output_dir) != structures:
+            raise ValueError(f"{output_dir} holds a matrix for a different structure list; use a new output directory")
+        matrix = np.load(matrix_path, mmap_mode="r+")
+        completed = set()
+        if os.path.exists(tiles_path):
+            with open(tiles_path, "r") as f:
+                completed = {line.strip() for line in f if line.strip()}
+        return matrix, completed
+
+    os.makedirs(output_dir, exist_ok=True)
+    write_index(structures, output_dir)
+    matrix = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=np.float32, shape=(n, n))
+    matrix[:] = np.nan
+    np.fill_diagonal(matrix, 0.0)
+    matrix.flush()
+    open(tiles_path, "w").close()
+    return matrix, set()
+
+
+def compute_rmsd_matrix(structures, output_dir, tile=64, workers=1, cycles=5, cutoff=2.0,
+                        match="numbering", store_dir=None):
+    """
+    Fill the all-vs-all RMSD matrix tile by tile, skipping tiles completed by an earlier run.
+
+    Parameters:
+    structures (list): [(path, chain)] in matrix order.
+    output_dir (str): Directory for the matrix, index and tile log.
+    tile (int): Tile edge length.
+    workers (int): Number of worker processes.
+
+    Returns:
+    numpy.memmap: The n x n float32 matrix.
+    """
+    matrix, completed = open_matrix(structures, output_dir)
+    pending = [t for t in make_tiles(len(structures), tile) if tile_name(t) not in completed]
+    print(f"{len(structures)} structures, {len(pending)} tiles to compute ({len(completed)} already done)")
+    if not pending:
+        return matrix
+
+    ca_chains = load_all_ca(structures, store_dir)
+    tasks = [(t, cycles, cutoff, match) for t in pending]
+
+    with open(os.path.join(output_dir, TILES_FILE), "a") as tiles_log:
+        def record(tile_result):
+            (row_start, row_end, col_start, col_end), block = tile_result
+            # Fill both triangles, keeping the diagonal at 0
+            upper = ~np.isnan(block)
+            matrix[row_start:row_end, col_start:col_end][upper] = block[upper]
+            matrix[col_start:col_end, row_start:row_end][upper.T] = block.T[upper.T]
+            matrix.flush()
+            # Log the tile only once its data is on disk
+            tiles_log.write(tile_name((row_start, row_end, col_start, col_end)) + "\n")
+            tiles_log.flush()
+
+        if workers > 1:
+            with Pool(processes=workers, initializer=_init_worker, initargs=(ca_chains,)) as pool:
+                for tile_result in pool.imap_unordered(_compute_tile_args, tasks):
+                    record(tile_result)
+        else:
+            _init_worker(ca_chains)
+            for task in tasks:
+                record(compute_tile(*task))
+
+    return matrix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="All-vs-all alpha-carbon RMSD matrix.")
+    parser.add_argument("structure_list", help="File with one '<structure.pdb> [chain]' per line")
+    parser.add_argument("output_dir", help="Output directory (re-use it to resume an interrupted run)")
+    parser.add_argument("--chain", default="A", help="Default chain when a line has no chain column")
+    parser.add_argument("--tile", type=int, default=64, help="Tile edge length")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--cycles", type=int, default=5, help="Outlier rejection cycles, as in cmd.align (0 = none)")
+    parser.add_argument("--cutoff", type=float, default=2.0, help="Outlier rejection cutoff in units of RMSD")
+    parser.add_argument("--match", choices=["numbering", "sequence"], default="numbering",
+                        help="Match residues by number + insertion code or by sequence alignment")
+    parser.add_argument("--store_dir", default=None, help="Structure store directory for cached coordinates")
+    args = parser.parse_args()
+
+    structures = read_structure_list(args.structure_list, args.chain)
+    compute_rmsd_matrix(structures, args.output_dir, args.tile, args.workers, args.cycles, args.cutoff,
+                        args.match, args.store_dir)
+    print(f"RMSD matrix saved in {os.path.join(args.output_dir, MATRIX_FILE)}")
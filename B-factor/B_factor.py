@@ -1,29 +1,29 @@
-from Bio.PDB import PDBParser
-import numpy as np
+import argparse
+import os
+import sys
+import pandas as pd
 import matplotlib.pyplot as plt
 
-p = PDBParser(QUIET=True)
-structure = p.get_structure("ensemble", "2GCH/2GCH.updated_refine_001_ensemble.pdb")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+from ensemble import ensemble_residue_b_factors
 
-res_b_factors = {}
+parser = argparse.ArgumentParser(description="Per-residue B-factors across the models of an ensemble.")
+parser.add_argument("--ensemble", default="2GCH/2GCH.updated_refine_001_ensemble.pdb", help="Ensemble refinement PDB")
+parser.add_argument("--csv", default="B-factor_filtered.csv", help="Per-residue statistics table")
+parser.add_argument("--output", default="B-factor_filtered.jpg", help="Output figure")
+args = parser.parse_args()
 
-for model in structure:
-    for chain in model:
-        if chain.id == 'S':  # ⛔️ Skip chain S entirely
-            continue
-        for residue in chain:
-            if residue.id[0] != ' ':
-                continue  # Skip HETATM (e.g., water, ligands)
-            res_id = (chain.id, residue.id[1])
-            b_list = [atom.bfactor for atom in residue if atom.element != 'H']
-            if b_list:  # Only if non-empty
-                res_b_factors.setdefault(res_id, []).append(np.mean(b_list))
+# Stream the ensemble one MODEL block at a time; skip chain S entirely, HETATM (e.g., water, ligands) and hydrogens
+stats = ensemble_residue_b_factors(args.ensemble,
+                                   exclude_chains=("S",), include_hetatm=False, heavy_only=True)
 
-# Calculate per-residue average B-factor across models
-avg_b_factors = {res: np.mean(vals) for res, vals in res_b_factors.items()}
+# Per-residue average B-factor across models (mean of each model's heavy-atom mean)
+res_indices = stats["resi"]
+b_values = stats["mean"]
 
-res_indices = [res[1] for res in avg_b_factors.keys()]
-b_values = [avg_b_factors[res] for res in avg_b_factors.keys()]
+# Save per-residue statistics across models
+columns = ["chain", "resi", "icode", "resn", "mean", "median", "std", "min", "max"]
+pd.DataFrame({column: stats[column] for column in columns}).to_csv(args.csv, index=False)
 
 # Plotting
 plt.figure(figsize=(10, 5))
@@ -33,6 +33,5 @@ plt.ylabel("B-factor (Å²)")
 plt.title("Per-residue B-factor from Ensemble Refinement")
 plt.grid(True)
 plt.tight_layout()
-plt.savefig("B-factor_filtered.jpg", dpi=300)
+plt.savefig(args.output, dpi=300)
 plt.show()
-
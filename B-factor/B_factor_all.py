@@ -1,41 +1,72 @@
-import MDAnalysis as mda
+import argparse
+import os
+import sys
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 
-# List of file names
-pdb_files = [
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+from structure_store import load_atoms
+from residue_map import build_residue_map, primary_chains, structure_id, to_reference
+
+parser = argparse.ArgumentParser(description="Compare Cα B-factors of several structures on a shared reference numbering.")
+parser.add_argument("--pdb_files", nargs="+", default=[
     "2GCH/2GCH.updated_refine_001_ensemble.pdb",
     "1AFQ/1AFQ.updated_refine_001_ensemble.pdb",
     "3VGC/3VGC.updated_refine_001_ensemble.pdb"
-]
-labels = ["2GCH(APO)", "1AFQ(GSA)", "3VGC(TSA)"]
-colors = ["r", "g", "b"]
+], help="Structures to compare (the first one is the numbering reference)")
+parser.add_argument("--labels", nargs="+", default=["2GCH(APO)", "1AFQ(GSA)", "3VGC(TSA)"], help="Legend label per structure")
+parser.add_argument("--colors", nargs="+", default=["r", "g", "b"], help="Line color per structure")
+parser.add_argument("--output", default="bfactor_comparison.png", help="Output figure")
+parser.add_argument("--residue_map", default="residue_map.csv", help="Residue map CSV (created or extended)")
+parser.add_argument("--store_dir", default="structure_store", help="Binary structure store directory")
+args = parser.parse_args()
+
+# List of file names
+pdb_files = args.pdb_files
+labels = args.labels
+colors = args.colors
+
+# Binary structure store; ensembles are parsed once and memory-mapped on later runs
+store_dir = args.store_dir
+
+# Residue correspondence onto the numbering of the first structure (computed once, then read from the map)
+residue_map = build_residue_map([(pdb, structure_id(pdb)) for pdb in pdb_files], pdb_files[0],
+                                args.residue_map, reference_chain="A", store_dir=store_dir)
 
-# Store B-factors from all models
+# Store Cα B-factors of every structure keyed by reference residue, from its chain closest to the reference
+main_chain = primary_chains(residue_map)
 bfactors_all = []
 
 for pdb in pdb_files:
-    u = mda.Universe(pdb)
-    ca = u.select_atoms("name CA")  # Select only Cα atoms
-    bfactors = ca.tempfactors
-    bfactors_all.append(bfactors)
+    atoms = load_atoms(pdb, store_dir)
+    ca = (atoms["name"] == "CA") & (atoms["model"] == atoms["model"][0])  # Select only Cα atoms of the first model
+    ca_df = pd.DataFrame({"chain": atoms["chain"][ca], "resi": atoms["resi"][ca], "icode": atoms["icode"][ca],
+                          "b": np.asarray(atoms["b"][ca])})
+    ca_df = ca_df[ca_df["chain"] == main_chain[structure_id(pdb)]]
+    ca_df = ca_df.drop_duplicates(subset=["chain", "resi", "icode"])  # first alternate conformer
+    ca_df["structure"] = structure_id(pdb)
+    mapped = to_reference(ca_df, residue_map, icode_column="icode")
+    bfactors_all.append(mapped.set_index("ref_label")["b"])
 
-# Ensure all sequences have the same length
-min_len = min(len(b) for b in bfactors_all)
-bfactors_all = [b[:min_len] for b in bfactors_all]  # Truncate to the shortest length
+# Keep the reference residues present in every structure, in reference order
+reference_order = residue_map.loc[residue_map["structure"] == structure_id(pdb_files[0]), "ref_label"]
+shared = [label for label in pd.unique(reference_order) if all(label in b.index for b in bfactors_all)]
+bfactors_all = [b.reindex(shared).to_numpy() for b in bfactors_all]
 
 # Plotting
-residue_indices = np.arange(1, min_len + 1)
+residue_indices = np.arange(1, len(shared) + 1)
 plt.figure(figsize=(12, 6))
 
 for bfactors, label, color in zip(bfactors_all, labels, colors):
     plt.plot(residue_indices, bfactors, label=label, color=color, linewidth=2)
 
-plt.xlabel("Residue Index (Cα)")
+plt.xticks(residue_indices[::10], shared[::10], rotation=90)
+plt.xlabel("Reference Residue (Cα)")
 plt.ylabel("B-factor")
 plt.title("Comparison of B-factors across Models")
 plt.legend()
 plt.grid(True, linestyle="--", alpha=0.5)
 plt.tight_layout()
-plt.savefig("bfactor_comparison.png", dpi=300)
+plt.savefig(args.output, dpi=300)
 plt.show()
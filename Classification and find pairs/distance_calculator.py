@@ -1,44 +1,60 @@
 import argparse
 import csv
 import os
+import sys
+import pandas as pd
 from pymol import cmd
+from spatial_index import get_atom_table, load_atom_table, residue_keys, residue_min_distances, min_distance
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+from result_store import write_results
 
 def get_min_distance(sel1, sel2):
     """Calculate minimum distance between two selections."""
     coords1 = cmd.get_coords(sel1)
     coords2 = cmd.get_coords(sel2)
-    min_distance = None
-    for c1 in coords1:
-        for c2 in coords2:
-            d = ((c1[0]-c2[0])**2 + (c1[1]-c2[1])**2 + (c1[2]-c2[2])**2) ** 0.5
-            if min_distance is None or d < min_distance:
-                min_distance = d
-    return min_distance
-
-def find_all_distances(pdb_file, target_res_num, target_chain, output_dir):
-    """Calculate distances from target residue to ALL other residues."""
-    cmd.load(pdb_file)
+    if coords1 is None or coords2 is None:
+        return None
+    return min_distance(coords1, coords2)[0]
+
+def find_all_distances(pdb_file, target_res_num, target_chain, output_dir, store_dir=None, result_db=None):
+    """Calculate distances from target residue to ALL other residues (written to result_db's "distances" table if given)."""
     pdb_id = os.path.basename(pdb_file).split('.')[0]
-    target_sel = f'chain {target_chain} and resi {target_res_num}'
-    cmd.select('target', target_sel)
 
-    # Get all residues except the target
-    cmd.select('all_residues', 'not target')
-    model = cmd.get_model('all_residues')
-    residues = set((atom.resi, atom.chain) for atom in model.atom)
+    # Pull all coordinates once (from the structure store if given) and split them into target / everything else
+    if store_dir:
+        atoms = load_atom_table(pdb_file, store_dir)
+    else:
+        cmd.load(pdb_file)
+        atoms = get_atom_table('all')
+    target_mask = (atoms['chain'] == str(target_chain)) & (atoms['resi'] == str(target_res_num))
+    if not target_mask.any():
+        print(f"Warning: chain {target_chain} resi {target_res_num} not found in {pdb_file}. Skipping.")
+        return
+    keys = residue_keys(atoms)
+
+    # Per-residue minimum distance to the target from a single KD-tree query
+    residues, distances = residue_min_distances(atoms['coords'][target_mask],
+                                                atoms['coords'][~target_mask],
+                                                keys[~target_mask])
+
+    if result_db:
+        # One transaction replacing any earlier rows of this structure and target
+        chains, resis = zip(*(key.split(':', 1) for key in residues)) if len(residues) else ((), ())
+        write_results(result_db, "distances",
+                      pd.DataFrame({'PDB': pdb_id, 'resi': resis, 'chain': chains, 'distance': distances.astype(float),
+                                    'target_resi': str(target_res_num), 'target_chain': str(target_chain)}),
+                      replace={'PDB': pdb_id, 'target_resi': str(target_res_num), 'target_chain': str(target_chain)})
+        return
 
     # Write distances to CSV
     output_file = os.path.join(output_dir, f"{pdb_id}_all_distances.csv")
     with open(output_file, 'w') as f:
         writer = csv.writer(f)
         writer.writerow(['resi', 'chain', 'distance'])
-        for resi, chain in residues:
-            res_sel = f'chain {chain} and resi {resi}'
-            distance = get_min_distance('target', res_sel)
-            writer.writerow([resi, chain, distance])
-
-    cmd.delete('target')
-    cmd.delete('all_residues')
+        for key, distance in zip(residues, distances):
+            chain, resi = key.split(':', 1)
+            writer.writerow([resi, chain, float(distance)])
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Calculate distances from a target residue to ALL residues.')
@@ -46,6 +62,8 @@ if __name__ == "__main__":
     parser.add_argument('target_res_num', help='Target residue number')
     parser.add_argument('target_chain', help='Target residue chain')
     parser.add_argument('--output_dir', default='.', help='Output directory')
+    parser.add_argument('--store_dir', default=None, help='Read coordinates from this structure store instead of PyMOL')
+    parser.add_argument('--result_db', default=None, help='Write to the "distances" table of this result store instead of <PDB>_all_distances.csv')
     args = parser.parse_args()
     
-    find_all_distances(args.pdb_file, args.target_res_num, args.target_chain, args.output_dir)
+    find_all_distances(args.pdb_file, args.target_res_num, args.target_chain, args.output_dir, args.store_dir, args.result_db)
@@ -1,32 +1,79 @@
 import os
 import csv
-from Bio.PDB import PDBParser
+import gzip
+from functools import partial
+from multiprocessing import Pool
+
+# Coordinate files the folder scan picks up (plain or gzipped PDB / mmCIF)
+PDB_EXTENSIONS = (".pdb", ".pdb.gz", ".ent", ".ent.gz", ".cif", ".cif.gz")
+
+def _open_text(path):
+    """Open a plain or gzipped text file for line-by-line reading."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+def _scan_pdb(lines, residue_number, residue_name):
+    # Fixed PDB columns: residue name 18-20, chain 22, residue number 23-26
+    for line in lines:
+        if line.startswith(("ATOM  ", "HETATM")):
+            if line[17:20].strip() == residue_name and line[22:26].strip() == residue_number:
+                return line[21]
+        elif line.startswith("ENDMDL"):
+            break  # Only the first model is needed
+    return None
+
+def _first_field(fields, *names):
+    for name in names:
+        if name in fields:
+            return fields.index(name)
+    raise ValueError(f"mmCIF _atom_site loop has none of {names}")
+
+def _scan_mmcif(lines, residue_number, residue_name):
+    # Column positions come from the _atom_site loop header; author numbering matches the PDB format
+    fields = []
+    columns = None
+    for line in lines:
+        if line.startswith("_atom_site."):
+            fields.append(line.split()[0][len("_atom_site."):])
+            continue
+        if not fields:
+            continue
+        if line.startswith(("#", "loop_", "_")):
+            break  # End of the _atom_site loop
+        if columns is None:
+            columns = (_first_field(fields, "auth_comp_id", "label_comp_id"),
+                       _first_field(fields, "auth_seq_id", "label_seq_id"),
+                       _first_field(fields, "auth_asym_id", "label_asym_id"))
+        values = line.split()
+        if values[columns[0]] == residue_name and values[columns[1]] == residue_number:
+            return values[columns[2]]
+    return None
 
 def find_chain_info(pdb_file, residue_number, residue_name):
     """
     Finds the chain information for a specific residue in a PDB file.
+
+    Only ATOM/HETATM records are read (fixed columns for PDB, the _atom_site loop for mmCIF),
+    and the scan stops at the first matching record. Gzipped files are read directly.
     
     Parameters:
-    pdb_file (str): Path to the PDB file.
+    pdb_file (str): Path to the PDB file (.pdb, .ent, .cif, optionally .gz).
     residue_number (int): Residue number of interest.
     residue_name (str): Residue name (e.g., SER).
     
     Returns:
     str: Chain ID of the specified residue, or "Not Found" if not found.
     """
-    parser = PDBParser(QUIET=True)  # Initialize the PDB parser
-    structure = parser.get_structure("pdb_structure", pdb_file)  # Parse the PDB file
-    
-    for model in structure:  # Loop through models in the PDB file
-        for chain in model:  # Loop through chains in the model
-            for residue in chain:  # Loop through residues in the chain
-                # Check if the residue matches the specified name and number
-                if residue.get_resname() == residue_name and residue.id[1] == residue_number:
-                    return chain.id  # Return the chain ID
+    name = pdb_file[:-3] if pdb_file.endswith(".gz") else pdb_file
+    scan = _scan_mmcif if name.endswith(".cif") else _scan_pdb
+
+    with _open_text(pdb_file) as lines:
+        chain_id = scan(lines, str(residue_number), residue_name)
     
-    return "Not Found"
+    return "Not Found" if chain_id is None else chain_id
 
-def process_pdb_folder(folder_path, residue_number, residue_name, output_csv):
+def process_pdb_folder(folder_path, residue_number, residue_name, output_csv, workers=1):
     """
     Processes all PDB files in a folder and writes chain information for a specific residue to a CSV file.
     
@@ -35,21 +82,28 @@ def process_pdb_folder(folder_path, residue_number, residue_name, output_csv):
     residue_number (int): Residue number to search for.
     residue_name (str): Residue name (e.g., SER).
     output_csv (str): Path to the output CSV file.
+    workers (int): Number of worker processes scanning files in parallel.
     """
     # Get a list of all PDB files in the folder
-    pdb_files = [f for f in os.listdir(folder_path) if f.endswith(".pdb")]
+    pdb_files = [f for f in os.listdir(folder_path) if f.endswith(PDB_EXTENSIONS)]
 
     if not pdb_files:
         print("No PDB files found in the specified folder.")
         return
 
+    pdb_paths = [os.path.join(folder_path, pdb_file) for pdb_file in pdb_files]
+    scan = partial(find_chain_info, residue_number=residue_number, residue_name=residue_name)
+    if workers > 1:
+        with Pool(processes=workers) as pool:
+            chain_ids = pool.map(scan, pdb_paths, chunksize=32)
+    else:
+        chain_ids = [scan(pdb_path) for pdb_path in pdb_paths]
+
     with open(output_csv, mode='w', newline='') as csvfile:
         csv_writer = csv.writer(csvfile)
         csv_writer.writerow(["PDB Name", "Chain ID"])  # Write header row
 
-        for pdb_file in pdb_files:
-            pdb_path = os.path.join(folder_path, pdb_file)
-            chain_id = find_chain_info(pdb_path, residue_number, residue_name)
+        for pdb_file, chain_id in zip(pdb_files, chain_ids):
             csv_writer.writerow([pdb_file, chain_id])  # Write PDB name and chain ID
 
     print(f"Output written to {output_csv}")
@@ -64,8 +118,9 @@ if __name__ == "__main__":
     parser.add_argument("residue_number", type=int, help="Residue number to search for.")
     parser.add_argument("residue_name", type=str, help="Residue name (e.g., SER).")
     parser.add_argument("output_csv", type=str, help="Path to the output CSV file.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes.")
 
     args = parser.parse_args()
 
     # Process the folder and write to CSV
-    process_pdb_folder(args.folder_path, args.residue_number, args.residue_name, args.output_csv)
+    process_pdb_folder(args.folder_path, args.residue_number, args.residue_name, args.output_csv, args.workers)
@@ -11,7 +11,7 @@ Requirements:
 - Python libraries `pandas` and `csv` must be installed.
 
 Command to run:
-python <script_name>.py <pdb_folder> <chain_mapping_csv> <residue_number> <residue_name> <target_atom> <distance> <no_lig_output> <with_lig_output>
+python <script_name>.py <pdb_folder> <chain_mapping_csv> <residue_number> <residue_name> <target_atom> <distance> <no_lig_output> <with_lig_output> [--workers N]
 
 Example command:
 python find_close_residues.py /path/to/pdb_files /path/to/chain_mapping.csv 195 SER CA 4.0 no_lig_output.csv with_lig_output.csv
@@ -27,6 +27,7 @@ Arguments:
 - distance: Distance threshold in angstroms to identify residues near the target.
 - no_lig_output: Path to the output CSV file for results without ligand.
 - with_lig_output: Path to the output CSV file for results with ligand.
+- --workers: Number of worker processes, each with its own PyMOL session (default 1).
 
 Output:
 - Two CSV files:
@@ -38,48 +39,43 @@ Output:
 
 import argparse
 import csv
+import multiprocessing
 import os
 from pymol import cmd
+import numpy as np
 import pandas as pd
+from spatial_index import (get_atom_table, residue_keys, build_index, atoms_within, atoms_near,
+                           nearest_distances, group_min, min_distance)
 
 def get_min_distance(sel1, sel2):
     # Calculate the minimum distance between two selections
     coords1 = cmd.get_coords(sel1)
     coords2 = cmd.get_coords(sel2)
-    min_distance = None
-    closest_atom = None
-    for c1 in coords1:
-        for c2 in coords2:
-            d = ((c1[0]-c2[0])**2 + (c1[1]-c2[1])**2 + (c1[2]-c2[2])**2) ** 0.5
-            if min_distance is None or d < min_distance:
-                min_distance = d
-                closest_atom = c2
-    return min_distance, closest_atom
-
-def get_nearest_valid_oxygen(carbon_selection, pdb_id):
-    # Find the nearest valid oxygen atom to the given carbon atom
-    model = cmd.get_model(f"model {pdb_id} and name O")
-    carbon_coords = cmd.get_coords(carbon_selection)
-    nearest_oxygen = None
-    min_distance = None
-
-    for atom in model.atom:
-        coords = (atom.coord[0], atom.coord[1], atom.coord[2])
-        d = ((carbon_coords[0][0]-coords[0])**2 +
-             (carbon_coords[0][1]-coords[1])**2 +
-             (carbon_coords[0][2]-coords[2])**2) ** 0.5
-
-        if (min_distance is None or d < min_distance) and d <= 2.2:
-            min_distance = d
-            nearest_oxygen = {
-                "resi": atom.resi,
-                "chain": atom.chain,
-                "name": atom.name,
-                "distance": d,
-                "coords": coords
-            }
-
-    return nearest_oxygen
+    if coords1 is None or coords2 is None:
+        return None, None
+    distance, idx = min_distance(coords1, coords2)
+    return distance, coords2[idx]
+
+def get_nearest_valid_oxygen(atoms, index, carbon_idx, max_distance=2.2):
+    # Find the nearest valid oxygen atom (name O) to the given carbon atom with one radius query
+    carbon_coords = atoms['coords'][carbon_idx]
+    nearby = atoms_within(index, carbon_coords, max_distance)
+    oxygens = nearby[atoms['name'][nearby] == 'O']
+    if len(oxygens) == 0:
+        return None
+
+    d = np.sqrt(np.sum((atoms['coords'][oxygens] - carbon_coords) ** 2, axis=1))
+    best = np.argmin(d)  # first in atom order on ties
+    if d[best] > max_distance:
+        return None
+    atom_idx = oxygens[best]
+    return {
+        "resi": str(atoms['resi'][atom_idx]),
+        "chain": str(atoms['chain'][atom_idx]),
+        "name": str(atoms['name'][atom_idx]),
+        "distance": float(d[best]),
+        "coords": tuple(float(x) for x in atoms['coords'][atom_idx])
+    }
 
 def find_closest_residue(pdb_file, residue_number, residue_name, target_atom, chain, distance):
     # Clear all previous selections to avoid conflicts
@@ -89,46 +85,44 @@ def find_closest_residue(pdb_file, residue_number, residue_name, target_atom, ch
     cmd.load(pdb_file)
     pdb_id = os.path.basename(pdb_file).rsplit('.', 1)[0]
 
+    # Pull the whole model once and index it; both the carbon and oxygen scans reuse the index
+    atoms = get_atom_table(f"model {pdb_id}")
+    index = build_index(atoms['coords'])
+    keys = residue_keys(atoms)
+
     # Define the selection for the target residue with the specific atom
     target_selection = f"model {pdb_id} and chain {chain} and resi {residue_number} and resn {residue_name} and name {target_atom}"
-    cmd.select('target_residue', target_selection)
+    target = ((atoms['chain'] == str(chain)) & (atoms['resi'] == str(residue_number)) &
+              (atoms['resn'] == str(residue_name)) & (atoms['name'] == str(target_atom)))
 
     # Ensure target atom exists
-    if cmd.count_atoms('target_residue') == 0:
+    if not target.any():
         print(f"Warning: Target atom {target_atom} not found in residue {residue_number} ({residue_name}) of chain {chain}. Skipping.")
         return []
 
     print(f"Target selection: {target_selection}")
 
-    residues = []
-    model = cmd.get_model(f"model {pdb_id} and not chain {chain}")
-
-    # Collect residues with C in the name
-    for atom in model.atom:
-        resi = atom.resi
-        res_chain = atom.chain
-        res_name = atom.name
-
-        # Skip if the atom does not meet the carbon condition
-        if 'C' not in res_name:
-            continue
-
-        # Calculate the distance to the target residue
-        residue_selection = f"model {pdb_id} and chain {res_chain} and resi {resi} and name {res_name}"
-        min_distance, closest_atom_coords = get_min_distance('target_residue', residue_selection)
-
-        if min_distance <= distance:
-            residues.append((resi, res_chain, res_name, min_distance, closest_atom_coords))
-
-    # Sort residues by distance and take the closest one
-    if residues:
-        closest_residue = sorted(residues, key=lambda x: x[3])[0]
+    # Atoms with C in the name outside the target chain, within distance of the target atom
+    target_coords = atoms['coords'][target]
+    nearby = atoms_near(index, target_coords, distance)
+    nearby = nearby[(atoms['chain'][nearby] != str(chain)) & (np.char.find(atoms['name'][nearby], 'C') >= 0)]
+
+    # Atoms sharing chain/resi/name (alternate conformers) take the minimum over the group, as the selection did
+    candidate_keys = np.char.add(np.char.add(keys[nearby], ':'), atoms['name'][nearby])
+    _, group_minima, inverse = group_min(nearest_distances(target_coords, atoms['coords'][nearby]), candidate_keys)
+    candidate_distances = group_minima[inverse]
+
+    # Sort residues by distance and take the closest one (first in atom order on ties)
+    if len(nearby):
+        best = np.argmin(candidate_distances)
+        atom_idx = nearby[best]
+        closest_residue = (str(atoms['resi'][atom_idx]), str(atoms['chain'][atom_idx]),
+                           str(atoms['name'][atom_idx]), float(candidate_distances[best]))
         print(f"Closest residue to target atom {target_atom} in {pdb_id}: {closest_residue}")
 
-        # Find the nearest valid oxygen atom
-        carbon_selection = f"model {pdb_id} and chain {closest_residue[1]} and resi {closest_residue[0]} and name {closest_residue[2]}"
-        cmd.select('current_carbon', carbon_selection)
-        nearest_oxygen = get_nearest_valid_oxygen('current_carbon', pdb_id)
+        # Find the nearest valid oxygen atom to the first atom of the chosen carbon (as cmd.get_coords would)
+        carbon_atoms = np.flatnonzero((keys == keys[atom_idx]) & (atoms['name'] == atoms['name'][atom_idx]))
+        nearest_oxygen = get_nearest_valid_oxygen(atoms, index, carbon_atoms[0])
 
         if nearest_oxygen:
             print(f"  Closest valid oxygen atom: {nearest_oxygen}")
@@ -148,7 +142,10 @@ def find_closest_residue(pdb_file, residue_number, residue_name, target_atom, ch
         print(f"No residues with C within {distance} Å found.")
         return []
 
-def process_pdb_files(pdb_folder, chain_mapping_csv, residue_number, residue_name, target_atom, distance, no_lig_output, with_lig_output):
+NO_LIG_COLUMNS = ['PDB_ID', 'residue_number', 'chain', 'item_name', 'distance', 'nearest_oxygen']
+WITH_LIG_COLUMNS = ['PDB_ID', 'lig_Residue', 'chain', 'distance', 'ligand']
+
+def load_chain_mapping(chain_mapping_csv):
     # Load the chain mapping CSV file and clean column names
     chain_mapping = pd.read_csv(chain_mapping_csv)
     chain_mapping.columns = chain_mapping.columns.str.strip()
@@ -158,63 +155,116 @@ def process_pdb_files(pdb_folder, chain_mapping_csv, residue_number, residue_nam
         print("Error: 'Ligand' column not found in chain_mapping.csv. Please check the file format.")
         exit()
 
+    # One lookup dict keyed by PDB_ID (first row wins, as before)
+    chain_mapping = chain_mapping.drop_duplicates(subset='PDB_ID', keep='first')
+    return {pdb_id: (chain, ligand) for pdb_id, chain, ligand in
+            zip(chain_mapping['PDB_ID'], chain_mapping['Chain_ID'], chain_mapping['Ligand'])}
+
+def process_pdb_file(pdb_path, pdb_id, chain, ligand, residue_number, residue_name, target_atom, distance):
+    # Process a single PDB file; returns (no_lig_rows, with_lig_rows)
+    print(f"Processing PDB: {pdb_id}, Chain: {chain}, Ligand: {ligand}")
     no_lig_data = []
     with_lig_data = []
 
-    # Iterate through all PDB files in the folder
+    if ligand == 'no_lig':
+        # Process the no-ligand logic with the new requirements
+        residues = find_closest_residue(pdb_path, residue_number, residue_name, target_atom, chain, distance)
+        for residue in residues:
+            oxygen_info = ("None" if residue['nearest_oxygen'] is None else
+                           f"{residue['nearest_oxygen']['name']} (Residue: {residue['nearest_oxygen']['resi']}, Chain: {residue['nearest_oxygen']['chain']}, Distance: {residue['nearest_oxygen']['distance']:.2f}, Coordinates: {residue['nearest_oxygen']['coords']}")
+            no_lig_data.append([pdb_id, residue['resi'], residue['chain'], residue['name'], residue['distance'], oxygen_info])
+    else:
+        # Process the ligand-specific logic (unchanged)
+        cmd.delete('all')  # Clear selections
+        cmd.load(pdb_path)
+        ligand_selection = f"model {pdb_id} and resn {ligand}"
+        cmd.select('ligand', ligand_selection)
+
+        target_selection = f"model {pdb_id} and chain {chain} and resi {residue_number}"
+        cmd.select('target_residue', target_selection)
+
+        # Calculate the minimum distance between ligand and target residue
+        distance_value = get_min_distance('target_residue', 'ligand')[0]
+
+        # Find the ligand residue number and chain
+        ligand_model = cmd.get_model('ligand')
+        if ligand_model.atom:
+            lig_residue = ligand_model.atom[0].resi
+            lig_chain = ligand_model.atom[0].chain
+        else:
+            lig_residue = 'N/A'
+            lig_chain = 'N/A'
+
+        with_lig_data.append([pdb_id, lig_residue, lig_chain, distance_value, ligand])
+
+        # Clean up
+        cmd.delete('target_residue')
+        cmd.delete('ligand')
+
+    return no_lig_data, with_lig_data
+
+def _process_task(task):
+    # Worker entry point: each worker process has its own PyMOL instance
+    return process_pdb_file(*task)
+
+def list_pdb_tasks(pdb_folder, chain_lookup, residue_number, residue_name, target_atom, distance):
+    # Match every PDB file in the folder to its chain mapping entry
+    tasks = []
     for pdb_file in os.listdir(pdb_folder):
         if pdb_file.endswith('.pdb'):
             pdb_id = pdb_file.rsplit('.', 1)[0].upper()  # Remove file extension and ensure uppercase
             pdb_path = os.path.join(pdb_folder, pdb_file)
 
             # Get the chain and ligand information for the current PDB file
-            chain_info = chain_mapping[chain_mapping['PDB_ID'] == pdb_id]
-            if chain_info.empty:
+            if pdb_id not in chain_lookup:
                 print(f"Warning: No matching chain information for PDB ID {pdb_id}. Skipping.")
                 continue
 
-            chain = chain_info.iloc[0]['Chain_ID']
-            ligand = chain_info.iloc[0]['Ligand']
-            print(f"Processing PDB: {pdb_id}, Chain: {chain}, Ligand: {ligand}")
-
-            if ligand == 'no_lig':
-                # Process the no-ligand logic with the new requirements
-                residues = find_closest_residue(pdb_path, residue_number, residue_name, target_atom, chain, distance)
-                for residue in residues:
-                    oxygen_info = ("None" if residue['nearest_oxygen'] is None else
-                                   f"{residue['nearest_oxygen']['name']} (Residue: {residue['nearest_oxygen']['resi']}, Chain: {residue['nearest_oxygen']['chain']}, Distance: {residue['nearest_oxygen']['distance']:.2f}, Coordinates: {residue['nearest_oxygen']['coords']}")
-                    no_lig_data.append([pdb_id, residue['resi'], residue['chain'], residue['name'], residue['distance'], oxygen_info])
-            else:
-                # Process the ligand-specific logic (unchanged)
-                cmd.delete('all')  # Clear selections
-                cmd.load(pdb_path)
-                ligand_selection = f"model {pdb_id} and resn {ligand}"
-                cmd.select('ligand', ligand_selection)
-
-                target_selection = f"model {pdb_id} and chain {chain} and resi {residue_number}"
-                cmd.select('target_residue', target_selection)
-
-                # Calculate the minimum distance between ligand and target residue
-                distance_value = get_min_distance('target_residue', 'ligand')[0]
-
-                # Find the ligand residue number and chain
-                ligand_model = cmd.get_model('ligand')
-                if ligand_model.atom:
-                    lig_residue = ligand_model.atom[0].resi
-                    lig_chain = ligand_model.atom[0].chain
-                else:
-                    lig_residue = 'N/A'
-                    lig_chain = 'N/A'
-
-                with_lig_data.append([pdb_id, lig_residue, lig_chain, distance_value, ligand])
-
-                # Clean up
-                cmd.delete('target_residue')
-                cmd.delete('ligand')
+            chain, ligand = chain_lookup[pdb_id]
+            tasks.append((pdb_path, pdb_id, chain, ligand, residue_number, residue_name, target_atom, distance))
+    return tasks
+
+def sort_output_csv(output_csv):
+    # Re-sort a streamed CSV by PDB_ID, keeping every field exactly as written
+    df = pd.read_csv(output_csv, dtype=str, keep_default_na=False)
+    df.sort_values(by='PDB_ID').to_csv(output_csv, index=False)
+
+def process_pdb_files(pdb_folder, chain_mapping_csv, residue_number, residue_name, target_atom, distance, no_lig_output, with_lig_output, workers=1):
+    chain_lookup = load_chain_mapping(chain_mapping_csv)
+    tasks = list_pdb_tasks(pdb_folder, chain_lookup, residue_number, residue_name, target_atom, distance)
+
+    if workers > 1:
+        # Stream rows to both CSVs as structures finish, then sort them by PDB_ID
+        context = multiprocessing.get_context('spawn')
+        with open(no_lig_output, 'w', newline='') as no_lig_f, open(with_lig_output, 'w', newline='') as with_lig_f:
+            no_lig_writer = csv.writer(no_lig_f, lineterminator='\n')
+            with_lig_writer = csv.writer(with_lig_f, lineterminator='\n')
+            no_lig_writer.writerow(NO_LIG_COLUMNS)
+            with_lig_writer.writerow(WITH_LIG_COLUMNS)
+
+            with context.Pool(processes=workers) as pool:
+                for no_lig_rows, with_lig_rows in pool.imap_unordered(_process_task, tasks):
+                    no_lig_writer.writerows(no_lig_rows)
+                    with_lig_writer.writerows(with_lig_rows)
+                    no_lig_f.flush()
+                    with_lig_f.flush()
+
+        sort_output_csv(no_lig_output)
+        sort_output_csv(with_lig_output)
+        return
+
+    no_lig_data = []
+    with_lig_data = []
+
+    # Iterate through all PDB files in the folder
+    for task in tasks:
+        no_lig_rows, with_lig_rows = process_pdb_file(*task)
+        no_lig_data.extend(no_lig_rows)
+        with_lig_data.extend(with_lig_rows)
 
     # Write sorted data to CSV files
-    no_lig_df = pd.DataFrame(no_lig_data, columns=['PDB_ID', 'residue_number', 'chain', 'item_name', 'distance', 'nearest_oxygen'])
-    with_lig_df = pd.DataFrame(with_lig_data, columns=['PDB_ID', 'lig_Residue', 'chain', 'distance', 'ligand'])
+    no_lig_df = pd.DataFrame(no_lig_data, columns=NO_LIG_COLUMNS)
+    with_lig_df = pd.DataFrame(with_lig_data, columns=WITH_LIG_COLUMNS)
 
     no_lig_df.sort_values(by='PDB_ID').to_csv(no_lig_output, index=False)
     with_lig_df.sort_values(by='PDB_ID').to_csv(with_lig_output, index=False)
@@ -229,9 +279,10 @@ if __name__ == "__main__":
     parser.add_argument('distance', type=float, help='Distance threshold in angstroms')
     parser.add_argument('no_lig_output', type=str, help='Path to the output CSV file for no ligand results')
     parser.add_argument('with_lig_output', type=str, help='Path to the output CSV file for ligand results')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (each with its own PyMOL)')
 
     # Parse command-line arguments
     args = parser.parse_args()
 
     # Process all PDB files and write results to CSV files
-    process_pdb_files(args.pdb_folder, args.chain_mapping_csv, args.residue_number, args.residue_name, args.target_atom, args.distance, args.no_lig_output, args.with_lig_output)
\ No newline at end of file
+    process_pdb_files(args.pdb_folder, args.chain_mapping_csv, args.residue_number, args.residue_name, args.target_atom, args.distance, args.no_lig_output, args.with_lig_output, args.workers)
\ No newline at end of file
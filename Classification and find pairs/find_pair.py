@@ -1,11 +1,23 @@
 import pandas as pd
 import numpy as np
+from scipy.spatial import cKDTree
 from datetime import datetime  # NEW: For timestamp
 
+# Maximum allowed absolute difference per dimension (pairs must be strictly below each)
+DEFAULT_TOLERANCES = {
+    "UnitCell_L1": 1.0, "UnitCell_L2": 1.0, "UnitCell_L3": 1.0,
+    "UnitCell_A1": 0.1, "UnitCell_A2": 0.1, "UnitCell_A3": 0.1,
+    "Resolution": 0.2,
+}
+
+# State labels in the table -> names used in the comparison keys
+STATE_NAMES = {"APO": "APO", "GSA-bound": "GSA", "TSA-bound": "TSA"}
+COMPARISONS = [("APO", "GSA-bound"), ("APO", "TSA-bound"), ("GSA-bound", "TSA-bound")]
+
 # ========================
 # STEP 1: Load and categorize data
 # ========================
-def load_and_categorize_data(csv_file):
+def load_data(csv_file):
     df = pd.read_csv(csv_file)
     
     # Clean up the "Resolution (A)" column and convert to numeric
@@ -17,7 +29,10 @@ def load_and_categorize_data(csv_file):
     df["State"] = df["State"].str.extract(r'(APO|GSA-bound|TSA-bound)', expand=False)
     
     # Drop rows with invalid resolution or state
-    df = df.dropna(subset=["State", "Resolution"])
+    return df.dropna(subset=["State", "Resolution"])
+
+def load_and_categorize_data(csv_file):
+    df = load_data(csv_file)
     
     # Split into categories
     apo = df[df["State"] == "APO"]
@@ -29,44 +44,87 @@ def load_and_categorize_data(csv_file):
 # ========================
 # STEP 2: Pair-finding logic
 # ========================
-def find_pairs(group1, group2, name1, name2):
+def find_pairs(group1, group2, name1, name2, tolerances=None, by=("SpaceGroup",)):
+    """
+    Find comparable PDB pairs between two groups with a vectorized tolerance join.
+
+    Rows are grouped by the `by` columns (space group by default); inside each group, candidate
+    pairs come from a Chebyshev range query on a KD-tree over the tolerance-scaled unit cell and
+    resolution, and are then checked exactly against each per-dimension tolerance.
+
+    Parameters:
+    group1, group2 (DataFrame): Rows to pair, e.g. APO and GSA-bound structures.
+    name1, name2 (str): Labels used in the result key.
+    tolerances (dict): Column -> maximum absolute difference (defaults to DEFAULT_TOLERANCES).
+    by (tuple): Columns that must match exactly, e.g. ("Family", "SpaceGroup") for a cross-family table.
+
+    Returns:
+    dict: {"name1_vs_name2": [(PDB ID 1, PDB ID 2), ...]} in group1 row order, then group2 row order.
+    """
+    tolerances = DEFAULT_TOLERANCES if tolerances is None else tolerances
+    columns = list(tolerances)
+    scale = np.array([tolerances[c] for c in columns], dtype=float)
+
+    # Positional row numbers keep the original (group1, group2) ordering of the pairs
+    left = group1.assign(_row=np.arange(len(group1))).dropna(subset=columns + list(by))
+    right = group2.assign(_row=np.arange(len(group2))).dropna(subset=columns + list(by))
+    right_groups = {key: rows for key, rows in right.groupby(list(by))}
+
+    rows1, rows2 = [], []
+    for key, rows in left.groupby(list(by)):
+        if key not in right_groups:
+            continue
+        matches = right_groups[key]
+        values1 = rows[columns].to_numpy(dtype=float)
+        values2 = matches[columns].to_numpy(dtype=float)
+
+        # Every pair within tolerance in all dimensions lies within Chebyshev distance 1 after scaling
+        candidates = cKDTree(values1 / scale).sparse_distance_matrix(cKDTree(values2 / scale), 1.0, p=np.inf,
+                                                                     output_type="ndarray")
+        i, j = candidates["i"], candidates["j"]
+        keep = np.all(np.abs(values1[i] - values2[j]) < scale, axis=1)
+        rows1.append(rows["_row"].to_numpy()[i[keep]])
+        rows2.append(matches["_row"].to_numpy()[j[keep]])
+
     pairs = []
-    
-    for idx1, row1 in group1.iterrows():
-        # Filter by SpaceGroup first
-        matches = group2[group2["SpaceGroup"] == row1["SpaceGroup"]]
-        
-        for idx2, row2 in matches.iterrows():
-            # Check unit cell lengths
-            length_diff = np.abs(row1[["UnitCell_L1", "UnitCell_L2", "UnitCell_L3"]] - 
-                           row2[["UnitCell_L1", "UnitCell_L2", "UnitCell_L3"]])
-            
-            # Check unit cell angles
-            angle_diff = np.abs(row1[["UnitCell_A1", "UnitCell_A2", "UnitCell_A3"]] - 
-                          row2[["UnitCell_A1", "UnitCell_A2", "UnitCell_A3"]])
-            
-            # NEW: Check resolution difference
-            resolution_diff = abs(row1["Resolution"] - row2["Resolution"])
-            
-            if (
-                (length_diff.max() < 1.0) and 
-                (angle_diff.max() < 0.1) and 
-                (resolution_diff < 0.2)  # NEW criterion
-            ):
-                pairs.append((row1["PDB ID"], row2["PDB ID"]))
-    
+    if rows1:
+        rows1, rows2 = np.concatenate(rows1), np.concatenate(rows2)
+        order = np.lexsort((rows2, rows1))
+        ids1 = group1["PDB ID"].to_numpy()[rows1[order]]
+        ids2 = group2["PDB ID"].to_numpy()[rows2[order]]
+        pairs = list(zip(ids1, ids2))
+
     return {f"{name1}_vs_{name2}": pairs}
 
+def find_all_pairs(df, tolerances=None, by=("SpaceGroup",), comparisons=COMPARISONS):
+    """
+    Run every state comparison (APO vs GSA, APO vs TSA, GSA vs TSA) over one table in a single call.
+
+    Parameters:
+    df (DataFrame): Cleaned table from load_data (may span several protease families).
+    tolerances (dict): Column -> maximum absolute difference (defaults to DEFAULT_TOLERANCES).
+    by (tuple): Columns that must match exactly.
+    comparisons (list): (state1, state2) pairs using the labels in the State column.
+
+    Returns:
+    dict: {"APO_vs_GSA": [...], "APO_vs_TSA": [...], "GSA_vs_TSA": [...]}
+    """
+    states = {state: rows for state, rows in df.groupby("State")}
+    results = {}
+    for state1, state2 in comparisons:
+        results.update(find_pairs(states.get(state1, df.iloc[:0]), states.get(state2, df.iloc[:0]),
+                                  STATE_NAMES.get(state1, state1), STATE_NAMES.get(state2, state2),
+                                  tolerances, by))
+    return results
+
 # ========================
 # MAIN EXECUTION
 # ========================
 if __name__ == "__main__":
-    apo, gsa, tsa = load_and_categorize_data("Serine_Protease_Suppmentary_table - Elastase(filtered).csv")  # Replace with your CSV path
+    df = load_data("Serine_Protease_Suppmentary_table - Elastase(filtered).csv")  # Replace with your CSV path
     
-    results = {}
-    results.update(find_pairs(apo, gsa, "APO", "GSA"))
-    results.update(find_pairs(apo, tsa, "APO", "TSA"))
-    results.update(find_pairs(gsa, tsa, "GSA", "TSA"))
+    # All three state comparisons in one call; pass tolerances=... or by=("Family", "SpaceGroup") as needed
+    results = find_all_pairs(df, tolerances=DEFAULT_TOLERANCES)
 
     # NEW: Save results to a file
     output_file = f"pair_results_{datetime.now().strftime('%Y%m%d_%H%M')}.txt"
@@ -0,0 +1,171 @@
+"""
+Shared spatial queries for the distance scripts.
+
+All atoms of a structure are pulled out of PyMOL (or the binary structure store in
+"Structure store/") once into NumPy arrays, and min-distance, within-radius and nearest-atom questions are answered through a
+KD-tree (scipy.spatial.cKDTree) instead of looping over every atom pair in Python.
+
+Example:
+    atoms = get_atom_table("all")
+    target = (atoms["chain"] == "A") & (atoms["resi"] == "195")
+    keys, distances = residue_min_distances(atoms["coords"][target], atoms["coords"][~target],
+                                            residue_keys(atoms)[~target])
+"""
+
+import os
+import sys
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+
+# Per-atom fields copied out of a PyMOL model
+ATOM_FIELDS = ["resi", "chain", "resn", "name", "symbol", "alt"]
+
+
+def get_atom_table(selection="all"):
+    """
+    Pull every atom of a PyMOL selection into NumPy arrays with a single get_model call.
+
+    Parameters:
+    selection (str): PyMOL selection string.
+
+    Returns:
+    dict: "coords" (N x 3 float array) plus one string array per field in ATOM_FIELDS.
+    """
+    from pymol import cmd
+
+    model = cmd.get_model(selection)
+    atoms = {"coords": np.array([atom.coord for atom in model.atom], dtype=float).reshape(-1, 3)}
+    for field in ATOM_FIELDS:
+        atoms[field] = np.array([getattr(atom, field) for atom in model.atom], dtype=str)
+    return atoms
+
+
+def load_atom_table(pdb_file, store_dir=None):
+    """
+    Same table as get_atom_table, read through the binary structure store instead of PyMOL.
+
+    Parameters:
+    pdb_file (str): Path to the PDB file.
+    store_dir (str): Structure store directory; the PDB is converted on first use.
+
+    Returns:
+    dict: "coords" plus the fields in ATOM_FIELDS, with resi formatted like PyMOL (number + insertion code).
+    """
+    from structure_store import load_atoms
+
+    atoms = load_atoms(pdb_file, store_dir)
+    first_model = atoms["model"] == atoms["model"][0] if len(atoms["model"]) else slice(None)
+    return {
+        "coords": np.asarray(atoms["coords"][first_model], dtype=float),
+        "resi": np.char.add(atoms["resi"][first_model].astype(str), atoms["icode"][first_model]),
+        "chain": atoms["chain"][first_model],
+        "resn": atoms["resn"][first_model],
+        "name": atoms["name"][first_model],
+        "symbol": atoms["element"][first_model],
+        "alt": atoms["altloc"][first_model],
+    }
+
+
+def residue_keys(atoms):
+    """Return a "chain:resi" key per atom so residues can be grouped with array operations."""
+    return np.char.add(np.char.add(atoms["chain"], ":"), atoms["resi"])
+
+
+def build_index(coords):
+    """Build a KD-tree over an N x 3 coordinate array."""
+    return cKDTree(np.asarray(coords, dtype=float).reshape(-1, 3))
+
+
+def min_distance(coords1, coords2, index2=None):
+    """
+    Minimum distance between two coordinate sets.
+
+    Parameters:
+    coords1 (array): N x 3 query coordinates.
+    coords2 (array): M x 3 reference coordinates.
+    index2 (cKDTree): Optional prebuilt index over coords2.
+
+    Returns:
+    tuple: (minimum distance, index of the closest atom in coords2), or (None, None) if either set is empty.
+    """
+    coords1 = np.asarray(coords1, dtype=float).reshape(-1, 3)
+    if len(coords1) == 0 or len(coords2) == 0:
+        return None, None
+    if index2 is None:
+        index2 = build_index(coords2)
+    distances, indices = index2.query(coords1, k=1)
+    best = np.argmin(distances)
+    return float(distances[best]), int(indices[best])
+
+
+def atoms_within(index, point, radius):
+    """Return the sorted indices of all indexed atoms within radius of a point."""
+    return np.sort(np.asarray(index.query_ball_point(np.asarray(point, dtype=float), r=radius), dtype=int))
+
+
+def atoms_near(index, points, radius):
+    """Return the sorted indices of all indexed atoms within radius of any of the points."""
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    if len(points) == 0:
+        return np.zeros(0, dtype=int)
+    hits = index.query_ball_point(points, r=radius)
+    return np.unique(np.concatenate([np.asarray(h, dtype=int) for h in hits]))
+
+
+def nearest_atom(index, point, max_distance=np.inf):
+    """
+    Nearest indexed atom to a point.
+
+    Returns:
+    tuple: (distance, atom index), or (None, None) if nothing lies within max_distance.
+    """
+    distance, idx = index.query(np.asarray(point, dtype=float), k=1, distance_upper_bound=max_distance)
+    if not np.isfinite(distance):
+        return None, None
+    return float(distance), int(idx)
+
+
+def nearest_distances(target_coords, coords):
+    """Distance from every atom in coords to its closest atom in target_coords."""
+    coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+    if len(coords) == 0 or len(target_coords) == 0:
+        return np.full(len(coords), np.inf)
+    distances, _ = build_index(target_coords).query(coords, k=1)
+    return distances
+
+
+def group_min(values, keys):
+    """
+    Minimum of values within each group of keys.
+
+    Returns:
+    tuple: (unique keys in order of first appearance, group minima, inverse index per value).
+    """
+    unique_keys, first_seen, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    minima = np.full(len(unique_keys), np.inf)
+    np.minimum.at(minima, inverse, values)
+
+    # Re-order groups by first appearance so output follows the structure's atom order
+    order = np.argsort(first_seen)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return unique_keys[order], minima[order], rank[inverse]
+
+
+def residue_min_distances(target_coords, coords, keys):
+    """
+    Minimum distance from a target atom set to every residue.
+
+    Parameters:
+    target_coords (array): Coordinates of the target residue atoms.
+    coords (array): Coordinates of all other atoms.
+    keys (array): Residue key per atom in coords (see residue_keys).
+
+    Returns:
+    tuple: (residue keys in structure order, minimum distance per residue).
+    """
+    unique_keys, minima, _ = group_min(nearest_distances(target_coords, coords), keys)
+    return unique_keys, minima
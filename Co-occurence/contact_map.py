@@ -0,0 +1,102 @@
+"""
+Cell-list contact-map kernel for the co-occurrence scripts.
+
+Heavy atoms are binned into a grid with cells the size of the distance cutoff, so every
+atom pair closer than the cutoff lies in the same or a neighbouring cell. Candidate pairs
+from the 14 half-shell neighbour offsets are generated with NumPy in one pass, filtered
+by distance and collapsed to residue pairs, giving a sparse boolean residue contact matrix.
+
+Example:
+    contacts = residue_contact_matrix(coords, residue_index, n_residues, cutoff=4.0)
+    for i, j in zip(*contacts.nonzero()):
+        print(residue_ids[i], residue_ids[j])
+"""
+
+import numpy as np
+from scipy import sparse
+
+# Same cell plus the 13 neighbour offsets in the "positive" half shell; every unordered
+# pair of neighbouring cells is visited exactly once
+HALF_SHELL = [(0, 0, 0)] + [
+    (dx, dy, dz)
+    for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+    if (dx, dy, dz) > (0, 0, 0)
+]
+
+
+def atom_contact_pairs(coords, cutoff=4.0):
+    """
+    All atom pairs (i < j within a cell, any order across cells) closer than or equal to cutoff.
+
+    Parameters:
+    coords (array): N x 3 coordinates.
+    cutoff (float): Distance cutoff in Å; also the grid cell size.
+
+    Returns:
+    tuple: (i, j) integer arrays of atom indices.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+    n = len(coords)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # Integer cell per atom, padded by one cell on each side so neighbour keys never wrap
+    cells = np.floor((coords - coords.min(axis=0)) / cutoff).astype(np.int64) + 1
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    atom_range = np.arange(n)
+    pairs_i, pairs_j = [], []
+    for dx, dy, dz in HALF_SHELL:
+        neighbour_keys = keys + (dx * dims[1] + dy) * dims[2] + dz
+        start = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        counts = np.searchsorted(sorted_keys, neighbour_keys, side="right") - start
+        total = counts.sum()
+        if total == 0:
+            continue
+
+        # Expand every atom against every atom of its neighbour cell
+        i = np.repeat(atom_range, counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(start, counts) + within]
+        if (dx, dy, dz) == (0, 0, 0):
+            keep = i < j
+            i, j = i[keep], j[keep]
+
+        d2 = np.sum((coords[i] - coords[j]) ** 2, axis=1)
+        keep = d2 <= cutoff * cutoff
+        pairs_i.append(i[keep])
+        pairs_j.append(j[keep])
+
+    if not pairs_i:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def residue_contact_matrix(coords, residue_index, n_residues, cutoff=4.0):
+    """
+    Sparse boolean residue contact matrix from atom coordinates.
+
+    Parameters:
+    coords (array): N x 3 heavy-atom coordinates.
+    residue_index (array): Residue number (0 .. n_residues-1) of each atom.
+    n_residues (int): Number of residues.
+    cutoff (float): Residues are in contact if any atom pair is within cutoff Å.
+
+    Returns:
+    scipy.sparse.csr_matrix: Upper-triangular (i < j) boolean n_residues x n_residues matrix.
+    """
+    residue_index = np.asarray(residue_index, dtype=np.int64)
+    i, j = atom_contact_pairs(coords, cutoff)
+    res_i, res_j = residue_index[i], residue_index[j]
+    keep = res_i != res_j
+    low = np.minimum(res_i[keep], res_j[keep])
+    high = np.maximum(res_i[keep], res_j[keep])
+
+    matrix = sparse.coo_matrix((np.ones(len(low), dtype=bool), (low, high)),
+                               shape=(n_residues, n_residues)).tocsr()
+    matrix.sum_duplicates()
+    matrix.data[:] = True
+    return matrix
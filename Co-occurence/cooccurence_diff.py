@@ -1,33 +1,39 @@
-import pandas as pd 
-GSA_residue_network_weights = pd.read_csv('/dors/wankowicz_lab/serine_protease/Chymotrypsin/TSA_residue_network_weights.csv')
-APO_residue_network_weights = pd.read_csv('/dors/wankowicz_lab/serine_protease/Chymotrypsin/GSA_residue_network_weights.csv')
+"""
+Usage:
+Difference in co-occurrence network weights between two states (default GSA -> TSA).
 
+Edges present in only one state count as weight 0 in the other (see cooccurrence_states.py for
+any number of states).
 
-# Ensure that 'Residue1' and 'Residue2' in each file are the same before calculating differences
-merged_weights = pd.merge(
-    GSA_residue_network_weights, 
-    APO_residue_network_weights, 
-    on=['Residue1', 'Residue2'], 
-    suffixes=('_TSA', '_GSA')
-)
+Command to run:
+python cooccurence_diff.py <GSA_residue_network_weights.csv> <TSA_residue_network_weights.csv>
+                           [--states GSA TSA] [--output GSA_TSA_merged_weights.csv] [--top 10]
+"""
 
-# Calculate the absolute differences in weights between the two files
-merged_weights['Weight_Difference'] = merged_weights['Weight_TSA'] - merged_weights['Weight_GSA']
+import argparse
 
-df = merged_weights
-df.to_csv('/dors/wankowicz_lab/serine_protease/Chymotrypsin/GSA_TSA_merged_weights.csv', index=False)
+from cooccurrence_states import state_differences, difference_table, top_pair_changes
 
+parser = argparse.ArgumentParser(description="Difference in co-occurrence weights between two states.")
+parser.add_argument("first_weights", help="Residue network weights of the first state")
+parser.add_argument("second_weights", help="Residue network weights of the second state")
+parser.add_argument("--states", nargs=2, default=["GSA", "TSA"], help="Names of the two states")
+parser.add_argument("--output", default=None, help="Output CSV (default <state1>_<state2>_merged_weights.csv)")
+parser.add_argument("--top", type=int, default=10, help="Number of largest and smallest differences to print")
+args = parser.parse_args()
 
-# Identify the largest differences in weights
-largest_differences = merged_weights.nlargest(10, 'Weight_Difference')
+result = state_differences({args.states[0]: args.first_weights, args.states[1]: args.second_weights})
+pair = result["pairs"][0]
+merged_weights = difference_table(result, pair)
+merged_weights.to_csv(args.output or f"{pair[0]}_{pair[1]}_merged_weights.csv", index=False)
 
-# Print the largest differences
+# Print the largest differences (second - first)
+largest_differences = difference_table(result, pair, top_pair_changes(result, pair, args.top))
 print("Largest differences in weights between the two files:")
 print(largest_differences[['Residue1', 'Residue2', 'Weight_Difference']])
 
 # Print the smallest differences
-smallest_differences = merged_weights.nsmallest(10, 'Weight_Difference')
-
+smallest_differences = difference_table(result, pair, top_pair_changes(result, pair, args.top, largest=False))
 print("Smallest differences in weights between the two files:")
 print(smallest_differences[['Residue1', 'Residue2', 'Weight_Difference']])
 
@@ -1,10 +1,13 @@
 import Bio.PDB
 import numpy as np
 import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
+import argparse
 import glob
-import os
+from functools import partial
+from multiprocessing import Pool
+from scipy import sparse
+from contact_map import residue_contact_matrix
+from network_analysis import adjacency_from_counts, analyze_network
 
 
 # ---------- New function: generate unique residue identifier ----------
@@ -15,43 +18,141 @@ def get_residue_id(res):
     return f"{res.get_resname()}{seqnum}{icode}"
 
 
-# ---------- Modified core function ----------
-def compute_cooccurrence_multi(structures, distance_threshold=4.0):
-    cooccurrence = {}
-
-    for structure in structures:
-        model = structure[0]
-        residues = list(model.get_residues())
-        seen_pairs = set()  # Record processed residue pairs for current structure
-
-        for i, res1 in enumerate(residues):
-            for j, res2 in enumerate(residues):
-                if i >= j:
-                    continue  # Skip duplicates (i,j) and (j,i)
-
-                # Generate sorted key to ensure pair order independence
-                pair_key = tuple(sorted([get_residue_id(res1), get_residue_id(res2)]))
+# ---------- Contact keys for one model (cell-list kernel) ----------
+def get_contact_keys(model, distance_threshold=4.0):
+    """Return the residue pair keys whose heavy atoms come within distance_threshold in one model (residue order)."""
+    residues = list(model.get_residues())
+    residue_ids = [get_residue_id(res) for res in residues]
+
+    # Flatten heavy atoms into arrays once; the kernel does the pair search
+    coords = []
+    residue_index = []
+    for idx, res in enumerate(residues):
+        for atom in res:
+            if atom.element != 'H':
+                coords.append(atom.coord)
+                residue_index.append(idx)
+
+    contacts = residue_contact_matrix(np.array(coords, dtype=float).reshape(-1, 3),
+                                      residue_index, len(residues), distance_threshold)
+    rows, cols = contacts.nonzero()
+
+    # Residues sharing an ID (e.g. the same residue in two chains) give one key per structure
+    return list(dict.fromkeys(tuple(sorted([residue_ids[i], residue_ids[j]])) for i, j in zip(rows, cols)))
+
+
+# ---------- Sparse reduction of per-structure contact keys ----------
+def count_contacts(contact_keys_per_structure):
+    """
+    Reduce per-structure contact keys into a sparse count matrix over a shared residue index.
+
+    Only the count matrix, the residue index and the order in which pairs were first seen are
+    kept, so memory does not grow with the number of structures. Residues are indexed and
+    pairs ordered as the original dict accumulation saw them, so outputs keep its order.
+
+    Returns:
+    tuple: (counts coo_matrix with entries in first-seen pair order, residue IDs in index order,
+            number of structures)
+    """
+    residue_index = {}
+    first_seen = {}
+    counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+    num_structures = 0
+
+    for keys in contact_keys_per_structure:
+        rows, cols = [], []
+        for res1, res2 in keys:
+            rows.append(residue_index.setdefault(res1, len(residue_index)))
+            cols.append(residue_index.setdefault(res2, len(residue_index)))
+            first_seen.setdefault((rows[-1], cols[-1]))
+        n = len(residue_index)
+        counts.resize((n, n))
+        counts = counts + sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n, n))
+        num_structures += 1
+
+    order = np.array(list(first_seen), dtype=np.int64).reshape(-1, 2)
+    n = len(residue_index)
+    counts = sparse.coo_matrix((np.asarray(counts[order[:, 0], order[:, 1]]).ravel().astype(np.int32),
+                                (order[:, 0], order[:, 1])), shape=(n, n))
+    return counts, list(residue_index), num_structures
+
+
+def cooccurrence_from_matrix(counts, residue_ids):
+    """Convert the count matrix of count_contacts back into the {(res1, res2): count} dict, in first-seen order."""
+    counts = counts.tocoo()
+    return {(residue_ids[i], residue_ids[j]): int(c) for i, j, c in zip(counts.row, counts.col, counts.data)}
+
+
+def weights_table(counts, residue_ids, num_structures):
+    """
+    Normalized weights in the row order of the networkx edge export they replace.
+
+    Edges are listed residue by residue in index order (the order residues were added to the
+    graph), each residue with its not yet listed partners in first-seen pair order.
+
+    Returns:
+    DataFrame: Residue1, Residue2, Weight.
+    """
+    counts = counts.tocoo()
+    low, high = np.minimum(counts.row, counts.col), np.maximum(counts.row, counts.col)
+    order = np.argsort(low, kind="stable")
+    residue_ids = np.array(residue_ids, dtype=object)
+    return pd.DataFrame({"Residue1": residue_ids[low[order]], "Residue2": residue_ids[high[order]],
+                         "Weight": counts.data[order] / num_structures})
 
-                # Skip if pair already processed
-                if pair_key in seen_pairs:
-                    continue
-                seen_pairs.add(pair_key)
 
-                # Compute minimal distance between heavy atoms
-                min_dist = min(
-                    (atom1 - atom2 for atom1 in res1 if atom1.element != 'H'
-                     for atom2 in res2 if atom2.element != 'H'),
-                    default=float('inf')  # If no atom pairs, set to infinity
-                )
-
-                # Count if within threshold
-                if min_dist <= distance_threshold:
-                    cooccurrence[pair_key] = cooccurrence.get(pair_key, 0) + 1
-
-    return cooccurrence
+# ---------- Modified core function ----------
+def compute_cooccurrence_multi(structures, distance_threshold=4.0):
+    # Each pair key counts at most once per structure
+    counts, residue_ids, _ = count_contacts(get_contact_keys(structure[0], distance_threshold)
+                                            for structure in structures)
+    return cooccurrence_from_matrix(counts, residue_ids)
 
 
-# ---------- Remaining functions unchanged ----------
+# ---------- Streaming / process-pool mode ----------
+def load_contact_keys(pdb_file, distance_threshold=4.0):
+    """Parse one PDB file and return its contact keys; the structure is dropped as soon as this returns."""
+    parser = Bio.PDB.PDBParser(QUIET=True)
+    structure = parser.get_structure("protein", pdb_file)
+    return get_contact_keys(structure[0], distance_threshold)
+
+
+def count_contacts_streaming(pdb_files, distance_threshold=4.0, workers=1, chunk_size=4):
+    """
+    Sparse contact counts over an iterable of PDB files without holding parsed structures in memory.
+
+    Parameters:
+    pdb_files (iterable): PDB file paths, e.g. glob.iglob(pattern).
+    distance_threshold (float): Contact cutoff in Å.
+    workers (int): Number of worker processes (1 = run in this process).
+    chunk_size (int): Files handed to a worker at a time.
+
+    Returns:
+    tuple: (counts coo_matrix, residue IDs in index order, number of structures), see count_contacts.
+    """
+    worker = partial(load_contact_keys, distance_threshold=distance_threshold)
+    if workers > 1:
+        # imap keeps input order, so the residue index (and the weights CSV) matches the serial run
+        with Pool(processes=workers) as pool:
+            return count_contacts(pool.imap(worker, pdb_files, chunksize=chunk_size))
+    return count_contacts(map(worker, pdb_files))
+
+
+def compute_cooccurrence_streaming(pdb_files, distance_threshold=4.0, workers=1, chunk_size=4):
+    """
+    Co-occurrence dict over an iterable of PDB files (see count_contacts_streaming).
+
+    Returns:
+    tuple: (cooccurrence dict, number of structures), same counts as compute_cooccurrence_multi.
+    """
+    counts, residue_ids, num_structures = count_contacts_streaming(pdb_files, distance_threshold, workers, chunk_size)
+    return cooccurrence_from_matrix(counts, residue_ids), num_structures
+
+
+# ---------- Dict API ----------
+# The main block works on the sparse counts; compute_cooccurrence_multi / _streaming,
+# load_structures and normalize_cooccurrence are kept for callers that want the
+# {(res1, res2): frequency} dict of the original script, in the same order.
 def load_structures(pdb_files):
     parser = Bio.PDB.PDBParser(QUIET=True)
     return [parser.get_structure(f"protein_{i}", file) for i, file in enumerate(pdb_files)]
@@ -61,56 +162,34 @@ def normalize_cooccurrence(cooccurrence, num_structures):
     return {pair: count / num_structures for pair, count in cooccurrence.items()}
 
 
-def build_network(cooccurrence):
-    G = nx.Graph()
-    for (res1, res2), freq in cooccurrence.items():
-        G.add_edge(res1, res2, weight=freq)
-    return G
-
-
-def plot_network(G):
-    plt.figure(figsize=(12, 8))
-    pos = nx.spring_layout(G, seed=42)
-    edges = G.edges(data=True)
-    edge_weights = [data["weight"] for _, _, data in edges]
-
-    nx.draw(G, pos, with_labels=True,
-            node_color="skyblue",
-            edge_color=edge_weights,
-            edge_cmap=plt.cm.Blues,
-            node_size=500,
-            font_size=10,
-            width=2)
-
-    plt.savefig("TSA_residue_network.png", dpi=300)  ################NEED CHANGE################
-
-    # Save weights to CSV
-    edge_df = pd.DataFrame(
-        [(res1, res2, data["weight"]) for res1, res2, data in G.edges(data=True)],
-        columns=["Residue1", "Residue2", "Weight"]
-    )
-    edge_df.to_csv("TSA_residue_network_weights.csv", index=False)  ##############NEED CHANGE###############
-
-
 # ---------- Main pipeline ----------
 if __name__ == "__main__":
-    # Load PDB files (example path; modify as needed)
-    pdb_files = glob.glob("/dors/wankowicz_lab/serine_protease/Chymotrypsin/TSA/*.pdb")[
-                :3]  ##########NEED CHANGE#########
-    print(f"Processing {len(pdb_files)} PDB files:")
-    for f in pdb_files:
-        print(" -", os.path.basename(f))
-
-    structures = load_structures(pdb_files)
-
-    # Compute and normalize co-occurrence
-    cooccurrence = compute_cooccurrence_multi(structures)
-    normalized_cooccurrence = normalize_cooccurrence(cooccurrence, len(pdb_files))
+    parser = argparse.ArgumentParser(description="Residue co-occurrence network over many PDB files.")
+    parser.add_argument("--pdb_glob", type=str,
+                        default="/dors/wankowicz_lab/serine_protease/Chymotrypsin/TSA/*.pdb",  ##########NEED CHANGE#########
+                        help="Glob pattern for the input PDB files")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--chunk_size", type=int, default=4, help="PDB files sent to a worker at a time")
+    parser.add_argument("--output_prefix", default="TSA", help="Prefix of the weights, metrics, layout and figure files")
+    parser.add_argument("--samples", type=int, default=64, help="Source residues sampled for betweenness")
+    parser.add_argument("--no_plot", action="store_true", help="Skip the network figure")
+    args = parser.parse_args()
+
+    # Stream PDB files from the glob; structures are parsed and dropped inside the workers
+    print(f"Processing PDB files matching {args.pdb_glob} with {args.workers} worker(s)")
+    counts, residue_ids, num_structures = count_contacts_streaming(sorted(glob.iglob(args.pdb_glob)),
+                                                                   workers=args.workers,
+                                                                   chunk_size=args.chunk_size)
+    print(f"Processed {num_structures} PDB files")
+
+    # Normalized co-occurrence as a sparse weighted adjacency (no graph object)
+    adjacency = adjacency_from_counts(counts, num_structures)
 
     # Check if max weight ≤ 1
-    max_weight = max(normalized_cooccurrence.values()) if normalized_cooccurrence else 0
+    max_weight = adjacency.max() if adjacency.nnz else 0
     print(f"\nValidation: max weight = {max_weight:.2f} (should be ≤ 1.0)\n")
 
-    # Build network and output
-    G = build_network(normalized_cooccurrence)
-    plot_network(G)
+    # Weights, per-residue metrics and the network figure (layout cached next to it)
+    weights_table(counts, residue_ids, num_structures).to_csv(f"{args.output_prefix}_residue_network_weights.csv",
+                                                              index=False)
+    analyze_network(adjacency, residue_ids, args.output_prefix, samples=args.samples, plot=not args.no_plot)
@@ -0,0 +1,167 @@
+"""
+Usage:
+Multi-state co-occurrence differences on a shared sparse residue index.
+
+Each state's residue network weights (Residue1, Residue2, Weight from
+cooccurrence_network_update.py) become a sparse matrix on one residue index shared by all
+states. The union of edges is gathered into a (states x edges) array, and every pairwise state
+difference (e.g. GSA-APO, TSA-APO, TSA-GSA) is computed in one broadcast, with an edge missing
+from a state counted as weight 0. Top changes are picked with argpartition, so no residue x
+residue table is ever built.
+
+Command to run:
+python cooccurrence_states.py --state APO APO_residue_network_weights.csv --state GSA GSA_residue_network_weights.csv
+                              --state TSA TSA_residue_network_weights.csv [--top 10] [--output_dir .]
+
+Outputs:
+<state1>_<state2>_merged_weights.csv for every state pair (Residue1, Residue2, Weight_<state1>,
+Weight_<state2>, Weight_Difference = state2 - state1), and the largest / smallest changes printed.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def load_state_weights(weight_files):
+    """
+    Read the weights of every state onto a shared residue index.
+
+    Parameters:
+    weight_files (dict): State name -> weights CSV (Residue1, Residue2, Weight), in state order.
+
+    Returns:
+    tuple: (residue IDs in index order, {state: upper-triangular csr_matrix of weights})
+    """
+    residue_index = {}
+    edges = {}
+    for state, path in weight_files.items():
+        weights = pd.read_csv(path, dtype={"Residue1": str, "Residue2": str})
+        rows = np.array([residue_index.setdefault(r, len(residue_index)) for r in weights["Residue1"]], dtype=np.int64)
+        cols = np.array([residue_index.setdefault(r, len(residue_index)) for r in weights["Residue2"]], dtype=np.int64)
+        edges[state] = (rows, cols, weights["Weight"].to_numpy(dtype=float))
+
+    n = len(residue_index)
+    matrices = {}
+    for state, (rows, cols, values) in edges.items():
+        # Edges are undirected: store each once with the lower index first
+        matrix = sparse.coo_matrix((values, (np.minimum(rows, cols), np.maximum(rows, cols))), shape=(n, n)).tocsr()
+        matrix.sum_duplicates()
+        matrices[state] = matrix
+    return list(residue_index), matrices
+
+
+def stack_states(matrices):
+    """
+    Gather all states onto the union of their edges.
+
+    Returns:
+    tuple: (row, col) edge indices and a (states x edges) float array, missing edges as 0.
+    """
+    states = list(matrices)
+    if not states:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 0))
+    pattern = sum(abs(m).astype(bool).astype(np.int8) for m in matrices.values()).tocsr()
+    pattern.sort_indices()
+    row, col = pattern.nonzero()
+    # Matrices share the shape, so looking every edge up in each state is one fancy-index per state
+    weights = np.vstack([np.asarray(matrices[s][row, col]).ravel() for s in states])
+    return row, col, weights
+
+
+def pairwise_differences(weights, states):
+    """
+    Every pairwise state difference in one pass.
+
+    Parameters:
+    weights (ndarray): (states x edges) array from stack_states.
+    states (list): State names in row order.
+
+    Returns:
+    tuple: (list of (state1, state2) pairs, (pairs x edges) array of state2 - state1)
+    """
+    first, second = np.triu_indices(len(states), k=1)
+    pairs = [(states[a], states[b]) for a, b in zip(first, second)]
+    return pairs, weights[second] - weights[first]
+
+
+def top_changes(values, k=10, largest=True):
+    """Indices of the k largest (or smallest) values, sorted, via argpartition."""
+    k = min(k, len(values))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    keys = -values if largest else values
+    top = np.argpartition(keys, k - 1)[:k]
+    return top[np.argsort(keys[top], kind="stable")]
+
+
+def state_differences(weight_files):
+    """
+    Load every state and compute all pairwise differences.
+
+    Returns:
+    dict: "residue_ids", "states", "row", "col", "weights" (states x edges), "pairs" and
+          "differences" (pairs x edges).
+    """
+    residue_ids, matrices = load_state_weights(weight_files)
+    row, col, weights = stack_states(matrices)
+    states = list(matrices)
+    pairs, differences = pairwise_differences(weights, states)
+    return {"residue_ids": np.array(residue_ids, dtype=object), "states": states, "row": row, "col": col,
+            "weights": weights, "pairs": pairs, "differences": differences}
+
+
+def pair_edges(result, pair):
+    """Indices of the edges present in either state of a pair."""
+    first, second = (result["weights"][result["states"].index(state)] for state in pair)
+    return np.flatnonzero((first != 0) | (second != 0))
+
+
+def top_pair_changes(result, pair, k=10, largest=True):
+    """Edge indices of the k largest (or smallest) differences of a pair, among the edges present in either state."""
+    edges = pair_edges(result, pair)
+    return edges[top_changes(result["differences"][result["pairs"].index(pair)][edges], k, largest)]
+
+
+def difference_table(result, pair, edges=None):
+    """
+    Table of one state pair (edges present in either state, or the given edge indices).
+
+    Returns:
+    DataFrame: Residue1, Residue2, Weight_<state1>, Weight_<state2>, Weight_Difference (state2 - state1).
+    """
+    state_1, state_2 = pair
+    first, second = result["weights"][result["states"].index(state_1)], result["weights"][result["states"].index(state_2)]
+    if edges is None:
+        edges = pair_edges(result, pair)
+    return pd.DataFrame({
+        "Residue1": result["residue_ids"][result["row"][edges]],
+        "Residue2": result["residue_ids"][result["col"][edges]],
+        f"Weight_{state_1}": first[edges],
+        f"Weight_{state_2}": second[edges],
+        "Weight_Difference": result["differences"][result["pairs"].index(pair)][edges],
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pairwise co-occurrence weight differences between states.")
+    parser.add_argument("--state", nargs=2, action="append", metavar=("NAME", "WEIGHTS_CSV"), required=True,
+                        help="State name and its residue network weights CSV (repeat, in state order)")
+    parser.add_argument("--top", type=int, default=10, help="Number of largest and smallest changes to print")
+    parser.add_argument("--output_dir", default=".", help="Folder for the <state1>_<state2>_merged_weights.csv files")
+    args = parser.parse_args()
+
+    result = state_differences(dict(args.state))
+    os.makedirs(args.output_dir, exist_ok=True)
+    for pair in result["pairs"]:
+        difference_table(result, pair).to_csv(
+            os.path.join(args.output_dir, f"{pair[0]}_{pair[1]}_merged_weights.csv"), index=False)
+
+        columns = ["Residue1", "Residue2", "Weight_Difference"]
+        print(f"Largest differences in weights ({pair[1]} - {pair[0]}):")
+        print(difference_table(result, pair, top_pair_changes(result, pair, args.top))[columns])
+        print(f"Smallest differences in weights ({pair[1]} - {pair[0]}):")
+        print(difference_table(result, pair, top_pair_changes(result, pair, args.top, largest=False))[columns])
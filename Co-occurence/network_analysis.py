@@ -0,0 +1,322 @@
+"""
+Usage:
+Residue co-occurrence network analysis straight from a scipy.sparse weighted adjacency.
+
+The network is a symmetric csr_matrix (weights = co-occurrence frequency) over a residue index,
+built from the count matrix of cooccurrence_network_update.py or read back from a
+<state>_residue_network_weights.csv file. No graph object is built: weighted degree, sampled
+betweenness, label-propagation communities and shortest paths to the catalytic triad
+(His57 / Asp102 / Ser195, chymotrypsin numbering) are computed on the sparse matrix with
+scipy.sparse.csgraph. Path lengths are 1 / weight, so frequently co-occurring contacts are short.
+The force-directed layout is computed once and cached in an .npz keyed on the network, so
+re-plotting the same network skips it.
+
+Command to run:
+python network_analysis.py <TSA_residue_network_weights.csv> [--output_prefix TSA] [--triad 57 102 195]
+                           [--samples 64] [--layout_cache TSA_residue_network_layout.npz] [--plot]
+
+Outputs:
+<prefix>_network_metrics.csv: Residue, Degree, Weighted_Degree, Betweenness, Community, Triad_Residue,
+                              Triad_Distance, Triad_Path (one row per residue)
+<prefix>_residue_network.png (with --plot)
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from cooccurrence_states import load_state_weights
+
+CATALYTIC_TRIAD = (57, 102, 195)
+
+
+def symmetrize(upper):
+    """Symmetric csr_matrix from a matrix holding each undirected edge once (diagonal kept once)."""
+    upper = sparse.csr_matrix(upper, dtype=float)
+    adjacency = (upper + upper.T - sparse.diags(upper.diagonal())).tocsr()
+    adjacency.eliminate_zeros()
+    adjacency.sort_indices()
+    return adjacency
+
+
+def adjacency_from_counts(counts, num_structures):
+    """Normalized co-occurrence adjacency from the count matrix of count_contacts."""
+    return symmetrize(counts / max(num_structures, 1))
+
+
+def read_weights(weights_file):
+    """
+    Adjacency from a residue network weights CSV (Residue1, Residue2, Weight).
+
+    Returns:
+    tuple: (symmetric csr_matrix, residue IDs in index order)
+    """
+    residue_ids, matrices = load_state_weights({"weights": weights_file})
+    return symmetrize(matrices["weights"]), residue_ids
+
+
+def weighted_degree(adjacency):
+    """Sum of edge weights per residue."""
+    return np.asarray(adjacency.sum(axis=1)).ravel()
+
+
+def edge_lengths(adjacency):
+    """Same edges with length 1 / weight, for shortest paths."""
+    lengths = adjacency.copy()
+    lengths.data = 1.0 / lengths.data
+    return lengths
+
+
+def approximate_betweenness(adjacency, samples=64, seed=42):
+    """
+    Weighted betweenness centrality estimated from a random sample of source residues.
+
+    One shortest-path tree is grown per source with Dijkstra and the dependencies are
+    accumulated back from the farthest residue. With samples >= number of residues every
+    residue is a source and the result equals the exact normalized betweenness (when shortest
+    paths are unique, as they are for real-valued weights).
+
+    Returns:
+    ndarray: Betweenness per residue, normalized to [0, 1] like networkx.
+    """
+    n = adjacency.shape[0]
+    if n < 3:
+        return np.zeros(n)
+    rng = np.random.default_rng(seed)
+    sources = np.arange(n) if samples >= n else np.sort(rng.choice(n, samples, replace=False))
+    dist, pred = csgraph.dijkstra(edge_lengths(adjacency), directed=False, indices=sources,
+                                  return_predecessors=True)
+
+    betweenness = np.zeros(n)
+    for s, source in enumerate(sources):
+        reachable = np.flatnonzero(np.isfinite(dist[s]))
+        delta = np.zeros(n)
+        # Farthest first, so every residue's dependency is complete before it is passed on
+        for v in reachable[np.argsort(-dist[s, reachable], kind="stable")]:
+            parent = pred[s, v]
+            if parent >= 0 and parent != source:
+                delta[parent] += 1.0 + delta[v]
+        betweenness += delta
+    return betweenness * (n / len(sources)) / ((n - 1) * (n - 2))
+
+
+def label_propagation(adjacency, seed=42, max_iter=100):
+    """
+    Communities by weighted asynchronous label propagation.
+
+    Each residue in turn takes the label with the largest total edge weight among its
+    neighbours (keeping its own label on ties, else the smallest), until no label changes.
+
+    Returns:
+    ndarray: Community per residue, numbered 0.. by decreasing size.
+    """
+    n = adjacency.shape[0]
+    labels = np.arange(n)
+    rng = np.random.default_rng(seed)
+    indptr, indices, weights = adjacency.indptr, adjacency.indices, adjacency.data
+    for _ in range(max_iter):
+        changed = 0
+        for i in rng.permutation(n):
+            neighbours = indices[indptr[i]:indptr[i + 1]]
+            if len(neighbours) == 0:
+                continue
+            candidates, inverse = np.unique(labels[neighbours], return_inverse=True)
+            totals = np.bincount(inverse, weights=weights[indptr[i]:indptr[i + 1]])
+            best = candidates[totals == totals.max()]
+            if labels[i] not in best:
+                labels[i] = best[0]
+                changed += 1
+        if changed == 0:
+            break
+    _, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=int)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    return rank[inverse]
+
+
+def modularity(adjacency, communities):
+    """Newman modularity of a community assignment on the weighted adjacency."""
+    total = adjacency.sum()
+    if total == 0:
+        return 0.0
+    membership = sparse.csr_matrix((np.ones(len(communities)), (np.arange(len(communities)), communities)))
+    within = (membership.T @ adjacency @ membership).diagonal()
+    strength = membership.T @ weighted_degree(adjacency)
+    return float(np.sum(within / total - (strength / total) ** 2))
+
+
+def residue_number(residue_id):
+    """Sequence number of a residue ID such as SER195 (None if it has an insertion code or no number)."""
+    match = re.search(r"(-?\d+)$", residue_id)
+    return int(match.group(1)) if match else None
+
+
+def triad_paths(adjacency, residue_ids, triad=CATALYTIC_TRIAD):
+    """
+    Shortest path (length = sum of 1 / weight) from every residue to the nearest triad residue.
+
+    Returns:
+    DataFrame: Residue, Triad_Residue, Triad_Distance, Triad_Path ("SER214-SER195"); NaN / empty
+               when no triad residue is reachable.
+    """
+    numbers = [residue_number(r) for r in residue_ids]
+    targets = [i for i, number in enumerate(numbers) if number in triad]
+    missing = sorted(set(triad) - {numbers[i] for i in targets})
+    if missing:
+        print(f"Triad residue(s) {', '.join(map(str, missing))} not in the network")
+
+    table = pd.DataFrame({"Residue": residue_ids, "Triad_Residue": "", "Triad_Distance": np.nan, "Triad_Path": ""})
+    if not targets:
+        return table
+    dist, pred, nearest = csgraph.dijkstra(edge_lengths(adjacency), directed=False, indices=targets,
+                                           return_predecessors=True, min_only=True)
+    for v in np.flatnonzero(np.isfinite(dist)):
+        path = [v]
+        while pred[path[-1]] >= 0:
+            path.append(pred[path[-1]])
+        table.loc[v, ["Triad_Residue", "Triad_Distance", "Triad_Path"]] = [
+            residue_ids[nearest[v]], dist[v], "-".join(residue_ids[i] for i in path)]
+    return table
+
+
+def network_metrics(adjacency, residue_ids, triad=CATALYTIC_TRIAD, samples=64, seed=42):
+    """
+    Per-residue network metrics.
+
+    Returns:
+    DataFrame: Residue, Degree, Weighted_Degree, Betweenness, Community, Triad_Residue,
+               Triad_Distance, Triad_Path.
+    """
+    metrics = pd.DataFrame({
+        "Residue": residue_ids,
+        "Degree": np.diff(adjacency.indptr),
+        "Weighted_Degree": weighted_degree(adjacency),
+        "Betweenness": approximate_betweenness(adjacency, samples, seed),
+        "Community": label_propagation(adjacency, seed),
+    })
+    return pd.concat([metrics, triad_paths(adjacency, residue_ids, triad).drop(columns="Residue")], axis=1)
+
+
+def network_hash(adjacency, residue_ids, *parameters):
+    """SHA-1 of the residue IDs, the sparse adjacency and any layout parameters."""
+    digest = hashlib.sha1("\0".join(residue_ids).encode())
+    adjacency = adjacency.tocsr()
+    adjacency.sort_indices()
+    for array in (adjacency.indptr, adjacency.indices, adjacency.data):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(repr(parameters).encode())
+    return digest.hexdigest()
+
+
+def spring_layout(adjacency, iterations=50, seed=42, block=1024):
+    """
+    Fruchterman-Reingold layout on the sparse adjacency.
+
+    Attraction only runs over the stored edges; repulsion between all residues is computed
+    in row blocks so memory stays at block x n. Starts from a seeded random layout and returns
+    positions scaled to [-1, 1].
+    """
+    n = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    if n < 2:
+        return pos
+    k = np.sqrt(1.0 / n)
+    upper = sparse.triu(adjacency, k=1).tocoo()
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        displacement = np.zeros((n, 2))
+        for start in range(0, n, block):
+            delta = pos[start:start + block, None, :] - pos[None, :, :]
+            distance = np.maximum(np.linalg.norm(delta, axis=2), 0.01)
+            displacement[start:start + block] += np.einsum("ijk,ij->ik", delta, k * k / distance ** 2)
+        delta = pos[upper.row] - pos[upper.col]
+        pull = delta * (upper.data * np.linalg.norm(delta, axis=1) / k)[:, None]
+        np.add.at(displacement, upper.row, -pull)
+        np.add.at(displacement, upper.col, pull)
+        length = np.maximum(np.linalg.norm(displacement, axis=1), 0.01)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    pos -= pos.mean(axis=0)
+    return pos / max(np.abs(pos).max(), 1e-12)
+
+
+def cached_layout(adjacency, residue_ids, cache_file=None, iterations=50, seed=42):
+    """
+    Layout positions, read from cache_file when it was computed for the same network and settings.
+
+    Returns:
+    ndarray: (residues x 2) positions in residue index order.
+    """
+    key = network_hash(adjacency, residue_ids, iterations, seed)
+    if cache_file and os.path.exists(cache_file):
+        # A damaged cache file (e.g. from a killed run) is recomputed and overwritten
+        try:
+            with np.load(cache_file, allow_pickle=False) as cached:
+                if str(cached["key"]) == key:
+                    return cached["pos"]
+        except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            pass
+    pos = spring_layout(adjacency, iterations, seed)
+    if cache_file:
+        # Write to a temporary file and rename, so readers never see a partial cache file
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_file, key=key, pos=pos)
+        os.replace(tmp_file, cache_file)
+    return pos
+
+
+def plot_network(adjacency, residue_ids, pos, output_file):
+    """Draw residues at pos with edges coloured by weight."""
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    upper = sparse.triu(adjacency, k=1).tocoo()
+    fig, ax = plt.subplots(figsize=(12, 8))
+    edges = LineCollection(np.stack([pos[upper.row], pos[upper.col]], axis=1), array=upper.data,
+                           cmap=plt.cm.Blues, linewidths=2, zorder=1)
+    ax.add_collection(edges)
+    ax.scatter(pos[:, 0], pos[:, 1], s=500, c="skyblue", zorder=2)
+    for (x, y), residue in zip(pos, residue_ids):
+        ax.text(x, y, residue, fontsize=10, ha="center", va="center", zorder=3)
+    ax.set_axis_off()
+    ax.autoscale_view()
+    fig.savefig(output_file, dpi=300)
+    plt.close(fig)
+
+
+def analyze_network(adjacency, residue_ids, output_prefix, triad=CATALYTIC_TRIAD, samples=64, plot=False,
+                    layout_cache=None):
+    """Save the per-residue metrics (and the network figure) under output_prefix; returns the metrics."""
+    metrics = network_metrics(adjacency, residue_ids, triad, samples)
+    metrics.to_csv(f"{output_prefix}_network_metrics.csv", index=False)
+    print(f"{adjacency.shape[0]} residues, {adjacency.nnz // 2} contacts, "
+          f"{metrics['Community'].nunique()} communities "
+          f"(modularity {modularity(adjacency, metrics['Community'].to_numpy()):.3f})")
+    if plot:
+        pos = cached_layout(adjacency, residue_ids, layout_cache or f"{output_prefix}_residue_network_layout.npz")
+        plot_network(adjacency, residue_ids, pos, f"{output_prefix}_residue_network.png")
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sparse co-occurrence network analysis.")
+    parser.add_argument("weights_file", help="Residue network weights CSV (Residue1, Residue2, Weight)")
+    parser.add_argument("--output_prefix", default=None, help="Output prefix (default: weights file name before _residue_network_weights)")
+    parser.add_argument("--triad", type=int, nargs="+", default=list(CATALYTIC_TRIAD), help="Catalytic residue numbers")
+    parser.add_argument("--samples", type=int, default=64, help="Source residues sampled for betweenness")
+    parser.add_argument("--layout_cache", default=None, help="Layout cache (default <prefix>_residue_network_layout.npz)")
+    parser.add_argument("--plot", action="store_true", help="Also draw <prefix>_residue_network.png")
+    args = parser.parse_args()
+
+    prefix = args.output_prefix or os.path.basename(args.weights_file).replace("_residue_network_weights.csv", "").replace(".csv", "")
+    adjacency, residue_ids = read_weights(args.weights_file)
+    analyze_network(adjacency, residue_ids, prefix, tuple(args.triad), args.samples, args.plot, args.layout_cache)
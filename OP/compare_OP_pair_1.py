@@ -1,35 +1,87 @@
-import pandas as pd
+"""
+Usage:
+Compare order parameters (S²) between the two structures of every comparison pair, classify
+each residue by its distance from the catalytic residues and plot the ΔS² distribution.
+
+All pairs are merged in one pass into a single long-format table (one row per pair and
+residue) instead of one merged_s2calc_diff_<pdb1>_<pdb2>.csv per pair; create_heatmap.py
+reads that table directly. Each OP.out file is read once, however many pairs it appears in.
+
+Command to run:
+python compare_OP_pair_1.py [--pairs comparison_pairs_1.csv] [--op_dir OP_df]
+                            [--distances 1QNJ_qFit_all_distances.csv] [--long_table s2calc_diff_long.csv]
+                            [--pdb1_column GSA] [--pdb2_column TSA] [--dataset op_dataset]
+                            [--residue_map residue_map.csv] [--pair_files]
+
+Output:
+- s2calc_diff_long.csv (or .parquet): pair, pdb1, pdb2, resi, chain, icode, s2calc_pdb1, s2calc_pdb2, s2calc_diff, category
+- ΔOP_GSA_TSA.csv: s2calc_diff and category of every row
+- ΔOP_distribution_GSA_TSA.png: KDE of ΔS² per category
+- merged_s2calc_diff_<pdb1>_<pdb2>.csv per pair, only with --pair_files
+"""
+
+import argparse
+import os
+import sys
+
 import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-import os
+import pandas as pd
+import seaborn as sns
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+from residue_map import load_residue_map, to_reference
 
 # Define catalytic residues
 catalytic_residues = [57, 102, 195]
 
-# Load the distance data
-distance_data = pd.read_csv("1QNJ_qFit_all_distances.csv")
+CATEGORIES = ["Catalytic", "Binding", "Distal", "Other", "Unknown"]
+
+# Column types of the long-format table
+LONG_TABLE_DTYPES = {
+    "pair": "string",
+    "pdb1": "string",
+    "pdb2": "string",
+    "resi": "int64",
+    "chain": "string",
+    "icode": "string",
+    "s2calc_pdb1": "float64",
+    "s2calc_pdb2": "float64",
+    "s2calc_diff": "float64",
+    "category": pd.CategoricalDtype(CATEGORIES),
+}
+
 
 # Function to classify residues based on distance
 def classify_residue(residue_num, distance_data, catalytic_residues):
-    # Check if residue is catalytic
-    if residue_num in catalytic_residues:
-        return "Catalytic"
-    
-    # Get the distance for the residue
-    distance_row = distance_data[distance_data["resi"] == residue_num]
-    if not distance_row.empty:
-        distance = distance_row["distance"].values[0]
-        
-        # Classify based on distance
-        if distance < 4:
-            return "Binding"
-        elif distance > 10:
-            return "Distal"
-        else:
-            return "Other"
-    else:
-        return "Unknown"
+    """Classify a single residue; see classify_residues for the rules."""
+    return classify_residues(pd.Series([residue_num]), distance_data, catalytic_residues)[0]
+
+
+def classify_residues(residues, distance_data, catalytic_residues):
+    """
+    Classify residues by their distance from the catalytic residues with one lookup.
+
+    Parameters:
+    residues (Series): Residue numbers.
+    distance_data (DataFrame): Distance table with 'resi' and 'distance' columns (first row per resi is used).
+    catalytic_residues (list): Residue numbers classified as catalytic.
+
+    Returns:
+    ndarray: "Catalytic", "Binding" (< 4 Å), "Distal" (> 10 Å), "Other", or "Unknown" if the residue has no distance.
+    """
+    first_rows = distance_data.drop_duplicates(subset="resi", keep="first")
+    residues = pd.Series(residues).reset_index(drop=True)
+    has_distance = residues.isin(first_rows["resi"]).to_numpy()
+    distance = residues.map(first_rows.set_index("resi")["distance"]).to_numpy(dtype=float)
+
+    with np.errstate(invalid="ignore"):
+        return np.select(
+            [residues.isin(catalytic_residues).to_numpy(), ~has_distance, distance < 4, distance > 10],
+            ["Catalytic", "Unknown", "Binding", "Distal"],
+            default="Other",
+        )
+
 
 # Function to read OP.out files from the specified directory
 def read_op_file(pdb_id, directory):
@@ -40,77 +92,154 @@ def read_op_file(pdb_id, directory):
         print(f"Warning: File {pdb_file} not found!")
         return None
 
-# Read the comparison pairs file (PDB1, PDB2)
-comparison_data = pd.read_csv("comparison_pairs_1.csv")  # Replace with your actual comparison file
-
-# Initialize a list to store all ΔS² values and their categories
-all_s2calc_diff = []
-all_categories = []
-
-# Specify the directory containing the OP.out files
-directory = "OP_df"  # Replace with your directory path
-
-# Loop through each comparison pair
-for index, row in comparison_data.iterrows():
-    pdb1 = row['GSA']
-    chain1 = row['Chain']
-    pdb2 = row['TSA']
-    chain2 = row['Chain.1']
-
-    # Read the two OP.out files corresponding to the current comparison
-    pdb1_df = read_op_file(pdb1, directory)
-    pdb2_df = read_op_file(pdb2, directory)
-    
-    if pdb1_df is not None and pdb2_df is not None:
-        # Merge data on residue and chain to compute ΔS²
-        merged = pd.merge(
-            pdb1_df[["resi", "chain", "s2calc"]],
-            pdb2_df[["resi", "chain", "s2calc"]],
-            on=["resi", "chain"],
-            suffixes=("_pdb1", "_pdb2"),
+
+def load_op_tables(pdb_ids, directory):
+    """Read the OP.out file of every distinct PDB once; returns one table with a 'pdb' column."""
+    tables = []
+    for pdb_id in pd.unique(pd.Series(pdb_ids)):
+        op_df = read_op_file(pdb_id, directory)
+        if op_df is not None:
+            tables.append(op_df[["resi", "chain", "s2calc"]].assign(pdb=pdb_id))
+    if not tables:
+        return pd.DataFrame(columns=["resi", "chain", "s2calc", "pdb"])
+    return pd.concat(tables, ignore_index=True)
+
+
+def build_long_table(comparison_data, directory, distance_data, catalytic_residues,
+                     pdb1_column="GSA", pdb2_column="TSA", dataset=None, residue_map=None):
+    """
+    ΔS² of every comparison pair in one long-format table.
+
+    Parameters:
+    comparison_data (DataFrame): One row per pair.
+    directory (str): Directory containing the <PDB>_OP.out files.
+    distance_data (DataFrame): Distance table used for classification.
+    pdb1_column, pdb2_column (str): Columns holding the two PDB IDs of a pair.
+    dataset (str): Optional OP dataset directory (see op_dataset.py) used instead of the OP.out files.
+    residue_map (DataFrame): Optional residue map ("Structure store/residue_map.py"); residues are then
+                             matched by reference numbering and resi/chain/icode are reference positions.
+
+    Returns:
+    DataFrame: Columns of LONG_TABLE_DTYPES, pairs in file order and residues in OP file order.
+    """
+    pairs = pd.DataFrame({"pdb1": comparison_data[pdb1_column].astype(str),
+                          "pdb2": comparison_data[pdb2_column].astype(str)})
+    pairs["pair"] = pairs["pdb1"] + "_" + pairs["pdb2"]
+    pdb_ids = pd.unique(pd.concat([pairs["pdb1"], pairs["pdb2"]]))
+
+    if dataset is not None:
+        from op_dataset import load_op
+
+        # Only the partitions of the structures in the comparison file are read
+        op = load_op(dataset, pdb_ids, columns=["resi", "chain", "s2calc"]).drop(columns="family")
+    else:
+        op = load_op_tables(pdb_ids, directory)
+
+    on = ["resi", "chain", "icode"]
+    if residue_map is not None:
+        # Put every structure on the family reference numbering before joining
+        op = to_reference(op, residue_map, structure_column="pdb")
+        op = op.drop(columns=["resi", "chain", "ref_label"]).rename(
+            columns={"ref_resi": "resi", "ref_chain": "chain", "ref_icode": "icode"})
+    else:
+        op = op.assign(icode="")
+
+    # Pairs whose OP files are both present, as in the per-pair loop
+    available = pairs["pdb1"].isin(op["pdb"]) & pairs["pdb2"].isin(op["pdb"])
+    pairs = pairs[available]
+
+    # Merge data on residue and chain to compute ΔS² for every pair at once
+    merged = pairs.merge(op.rename(columns={"pdb": "pdb1", "s2calc": "s2calc_pdb1"}), on="pdb1")
+    merged = merged.merge(op.rename(columns={"pdb": "pdb2", "s2calc": "s2calc_pdb2"}), on=["pdb2"] + on)
+
+    # Calculate ΔS²
+    merged["s2calc_diff"] = merged["s2calc_pdb2"] - merged["s2calc_pdb1"]
+
+    # Classify residues based on distance from catalytic residues
+    merged["category"] = classify_residues(merged["resi"], distance_data, catalytic_residues)
+    return merged[list(LONG_TABLE_DTYPES)].astype(LONG_TABLE_DTYPES)
+
+
+def write_long_table(long_df, path):
+    """Write the long-format table as Parquet (.parquet) or CSV."""
+    if path.endswith(".parquet"):
+        long_df.to_parquet(path, index=False)
+    else:
+        long_df.to_csv(path, index=False)
+
+
+def read_long_table(path):
+    """Read a long-format table written by write_long_table with its column types."""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path).astype(LONG_TABLE_DTYPES)
+    dtypes = {column: dtype for column, dtype in LONG_TABLE_DTYPES.items() if column != "category"}
+    long_df = pd.read_csv(path, dtype=dtypes, keep_default_na=False, na_values={"s2calc_pdb1": [""], "s2calc_pdb2": [""], "s2calc_diff": [""]})
+    return long_df.astype(LONG_TABLE_DTYPES)
+
+
+def write_pair_files(long_df):
+    """Per-pair merged_s2calc_diff_<pdb1>_<pdb2>.csv files in the previous layout."""
+    columns = ["resi", "chain", "s2calc_pdb1", "s2calc_pdb2", "s2calc_diff", "category"]
+    # A pair listed twice in the comparison file got the same file twice; write it once
+    long_df = long_df.drop_duplicates(subset=["pair"] + columns)
+    for (pdb1, pdb2), pair_df in long_df.groupby(["pdb1", "pdb2"], sort=False, observed=True):
+        pair_df[columns].to_csv(f"merged_s2calc_diff_{pdb1}_{pdb2}.csv", index=False)
+
+
+def plot_distribution(final_df, output_path):
+    # Plot KDE of ΔS² for all comparisons, categorized
+    plt.figure(figsize=(8, 6))
+
+    # Plot KDE for each category with different colors
+    for category, color in zip(["Catalytic", "Binding", "Distal"], ["red", "green", "blue"]):
+        sns.kdeplot(
+            data=final_df[final_df["category"] == category],
+            x="s2calc_diff",
+            fill=True,
+            color=color,
+            alpha=0.5,
+            label=category
         )
-        
-        # Calculate ΔS²
-        merged["s2calc_diff"] = merged["s2calc_pdb2"] - merged["s2calc_pdb1"]
-        
-        # Classify residues based on distance from catalytic residues
-        merged["category"] = merged["resi"].apply(lambda x: classify_residue(x, distance_data, catalytic_residues))
-        
-        # Append the ΔS² differences and categories to the lists
-        all_s2calc_diff.extend(merged["s2calc_diff"])
-        all_categories.extend(merged["category"])
-
-        # Output the merged DataFrame (with s2calc_diff and categories) to CSV after this step
-        merged.to_csv(f"merged_s2calc_diff_{pdb1}_{pdb2}.csv", index=False)
-
-# Combine all results into a DataFrame for the final output
-final_df = pd.DataFrame({
-    "s2calc_diff": all_s2calc_diff,
-    "category": all_categories
-})
-
-# Plot KDE of ΔS² for all comparisons, categorized
-plt.figure(figsize=(8, 6))
-
-# Plot KDE for each category with different colors
-for category, color in zip(["Catalytic", "Binding", "Distal"], ["red", "green", "blue"]):
-    sns.kdeplot(
-        data=final_df[final_df["category"] == category], 
-        x="s2calc_diff", 
-        fill=True, 
-        color=color, 
-        alpha=0.5,
-        label=category
-    )
-
-plt.xlabel("ΔS² (TSA-GSA)", fontsize=12)
-plt.ylabel("Density", fontsize=12)
-plt.title("ΔS² Distribution for GSA vs. TSA", fontsize=14)
-plt.legend(title="Residue Categories")
-plt.grid(linestyle="--", alpha=0.3)
-plt.savefig("ΔOP_distribution_GSA_TSA.png", dpi=300)
-plt.close()
-
-# Save the final results (ΔS² and categories) to a CSV file
-final_df.to_csv("ΔOP_GSA_TSA.csv", index=False)
 
+    plt.xlabel("ΔS² (TSA-GSA)", fontsize=12)
+    plt.ylabel("Density", fontsize=12)
+    plt.title("ΔS² Distribution for GSA vs. TSA", fontsize=14)
+    plt.legend(title="Residue Categories")
+    plt.grid(linestyle="--", alpha=0.3)
+    plt.savefig(output_path, dpi=300)
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare S² between comparison pairs and classify residues.")
+    parser.add_argument("--pairs", default="comparison_pairs_1.csv", help="Comparison pairs CSV (GSA, Chain, TSA, Chain.1)")
+    parser.add_argument("--op_dir", default="OP_df", help="Directory containing the <PDB>_OP.out files")
+    parser.add_argument("--distances", default="1QNJ_qFit_all_distances.csv", help="Distance table (resi, chain, distance)")
+    parser.add_argument("--long_table", default="s2calc_diff_long.csv", help="Long-format output (.csv or .parquet)")
+    parser.add_argument("--pdb1_column", default="GSA", help="Pairs column with the first PDB ID")
+    parser.add_argument("--pdb2_column", default="TSA", help="Pairs column with the second PDB ID (ΔS² = pdb2 - pdb1)")
+    parser.add_argument("--dataset", default=None, help="OP dataset directory from op_dataset.py (replaces --op_dir)")
+    parser.add_argument("--residue_map", default=None, help="Residue map CSV; match residues by reference numbering")
+    parser.add_argument("--plot", default="ΔOP_distribution_GSA_TSA.png", help="ΔS² distribution figure")
+    parser.add_argument("--summary", default="ΔOP_GSA_TSA.csv", help="ΔS² and category of every residue comparison")
+    parser.add_argument("--pair_files", action="store_true", help="Also write one merged_s2calc_diff_<pdb1>_<pdb2>.csv per pair")
+    args = parser.parse_args()
+
+    # Load the distance data and the comparison pairs file (PDB1, PDB2)
+    distance_data = pd.read_csv(args.distances)
+    comparison_data = pd.read_csv(args.pairs)
+
+    long_df = build_long_table(comparison_data, args.op_dir, distance_data, catalytic_residues,
+                               args.pdb1_column, args.pdb2_column, args.dataset,
+                               load_residue_map(args.residue_map) if args.residue_map else None)
+    write_long_table(long_df, args.long_table)
+    if args.pair_files:
+        write_pair_files(long_df)
+
+    # ΔS² and categories of all comparisons
+    final_df = long_df[["s2calc_diff", "category"]].astype({"category": str})
+    plot_distribution(final_df, args.plot)
+
+    # Save the final results (ΔS² and categories) to a CSV file
+    final_df.to_csv(args.summary, index=False)
+    print(f"{long_df['pair'].nunique()} pairs, {len(long_df)} residues saved in {args.long_table}")
@@ -1,6 +1,13 @@
+import argparse
 import os
 import pandas as pd
 from functions import generate_op_heatmap, plot_op_distribution, plot_stddev_s2calc
+from compare_OP_pair_1 import read_long_table
+
+parser = argparse.ArgumentParser(description="Clustered ΔS² heatmap of the APO/GSA comparison pairs.")
+parser.add_argument("--linkage_cache", default=None, help="Directory to cache the row/column linkages in (default: no cache)")
+parser.add_argument("--pivot_only", action="store_true", help="Only write the reordered pivot CSV, without the figure")
+args = parser.parse_args()
 
 # Read comparison pairs
 txt_file = "comparison_pairs_1.csv"
@@ -9,37 +16,50 @@ df_pairs = pd.read_csv(txt_file)
 # Define the folder containing your merged CSV files
 OP_folder = "./"  # Replace with actual path
 
-# Initialize an empty list to store data
-data_list = []
+# Long-format ΔS² table written by compare_OP_pair_1.py (one file for all pairs)
+long_table = os.path.join(OP_folder, "s2calc_diff_long.csv")
+
+pair_names = [f"{gsa}_{tsa}" for gsa, tsa in zip(df_pairs["APO"], df_pairs["GSA"])]
 
-# 4. Iterate over GSA and TSA combinations in the TXT file
-for _, row in df_pairs.iterrows():
-    gsa = row["APO"]
-    tsa = row["GSA"]
+if os.path.exists(long_table):
+    # 4. Select the APO/GSA pairs from the long table in one step
+    long_df = read_long_table(long_table)
+    OP_df = long_df[long_df["pair"].isin(pair_names)].rename(columns={"pair": "PDB"})
+    OP_df = OP_df.astype({"PDB": str, "category": str})
+    missing = sorted(set(pair_names) - set(OP_df["PDB"]))
+    if missing:
+        print(f"Warning: {len(missing)} pairs not found in {long_table}: {', '.join(missing)}")
+    if OP_df.empty:
+        OP_df = None
+else:
+    # Initialize an empty list to store data
+    data_list = []
 
-    # Construct file name
-    filename = f"merged_s2calc_diff_{gsa}_{tsa}.csv"
-    file_path = os.path.join(OP_folder, filename)
+    # 4. Iterate over GSA and TSA combinations in the TXT file (per-pair files from --pair_files)
+    for pair_name in pair_names:
+        # Construct file name
+        filename = f"merged_s2calc_diff_{pair_name}.csv"
+        file_path = os.path.join(OP_folder, filename)
 
-    # Check if file exists
-    if os.path.exists(file_path):
-        # Read the CSV file
-        df = pd.read_csv(file_path)
+        # Check if file exists
+        if os.path.exists(file_path):
+            # Read the CSV file
+            df = pd.read_csv(file_path)
 
-        # Add PDB ID info
-        df['PDB'] = f"{gsa}_{tsa}"
+            # Add PDB ID info
+            df['PDB'] = pair_name
 
-        # Add to the list
-        data_list.append(df)
-    else:
-        print(f"Warning: {filename} not found in {OP_folder}")
+            # Add to the list
+            data_list.append(df)
+        else:
+            print(f"Warning: {filename} not found in {OP_folder}")
 
-# 5. Merge all DataFrames
-if data_list:
-    OP_df = pd.concat(data_list, ignore_index=True)
+    # 5. Merge all DataFrames
+    OP_df = pd.concat(data_list, ignore_index=True) if data_list else None
 
+if OP_df is not None:
     # 6. Run plotting functions
-    generate_op_heatmap(OP_df, "heatmap_APO_GSA.png")
+    generate_op_heatmap(OP_df, "heatmap_APO_GSA.png", cache_dir=args.linkage_cache, pivot_only=args.pivot_only)
     # plot_op_distribution(OP_df, "op_distribution.png")
     # plot_stddev_s2calc(OP_df, "stddev_s2calc.png")
 
@@ -2,42 +2,119 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import pandas as pd
+import hashlib
 import os
+import zipfile
 
-def generate_op_heatmap(OP_df, output_path):
+def op_pivot(OP_df):
+    """Pair x residue matrix of s2calc_diff used by generate_op_heatmap (missing values are 0)."""
+    pivot_op = OP_df.pivot_table(index=['PDB'], columns='resi', values='s2calc_diff').fillna(0)
+    return pivot_op.drop(columns=[150], errors='ignore')
+
+
+def compute_linkage(matrix, method='average', metric='euclidean'):
+    """
+    Hierarchical clustering of the rows of matrix, with the same backend choice as sns.clustermap.
+
+    fastcluster is used when installed (memory-saving vector version for single/centroid/median/ward),
+    otherwise scipy.cluster.hierarchy.linkage on the condensed distance matrix.
+
+    Returns:
+    ndarray: Linkage matrix.
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    try:
+        import fastcluster
+        if method == 'single' or (metric == 'euclidean' and method in ('centroid', 'median', 'ward')):
+            return fastcluster.linkage_vector(matrix, method=method, metric=metric)
+        return fastcluster.linkage(matrix, method=method, metric=metric)
+    except ImportError:
+        from scipy.cluster import hierarchy
+        from scipy.spatial.distance import pdist
+        return hierarchy.linkage(pdist(matrix, metric=metric), method=method)
+
+
+def _linkage_cache_key(pivot_op, method, metric):
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(pivot_op.to_numpy(dtype=float)).tobytes())
+    digest.update(repr((list(pivot_op.index), list(pivot_op.columns), method, metric)).encode())
+    return digest.hexdigest()
+
+
+def cached_linkage(pivot_op, cache_dir=None, method='average', metric='euclidean'):
+    """
+    Row and column linkages of the pivot, read from cache_dir when the same matrix was clustered before.
+
+    Parameters:
+    pivot_op (DataFrame): Matrix to cluster.
+    cache_dir (str): Directory for op_linkage_<hash>.npz files; None disables caching.
+
+    Returns:
+    tuple: (row linkage, column linkage)
+    """
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, f"op_linkage_{_linkage_cache_key(pivot_op, method, metric)}.npz")
+        if os.path.exists(cache_file):
+            # A damaged cache file (e.g. from a killed run) is recomputed and overwritten
+            try:
+                with np.load(cache_file) as cached:
+                    return cached['row_linkage'], cached['col_linkage']
+            except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+                pass
+
+    row_linkage = compute_linkage(pivot_op.to_numpy(), method, metric)
+    col_linkage = compute_linkage(pivot_op.to_numpy().T, method, metric)
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file and rename, so readers never see a partial cache file
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_file, row_linkage=row_linkage, col_linkage=col_linkage)
+        os.replace(tmp_file, cache_file)
+    return row_linkage, col_linkage
+
+
+def generate_op_heatmap(OP_df, output_path, cache_dir=None, pivot_only=False,
+                        method='average', metric='euclidean'):
     """
     Generate a heatmap of OP and save it to the specified output path.
 
+    Linkages are computed once (or read from cache_dir) and passed to the clustermap, so plotting
+    does not re-cluster the matrix.
+
     Parameters:
-    order_all_A (DataFrame): The input dataframe containing OP data.
+    OP_df (DataFrame): The input dataframe containing OP data.
     output_path (str): The path where the heatmap image will be saved.
+    cache_dir (str): Directory for cached linkages (None to disable).
+    pivot_only (bool): Only write the reordered pivot CSV, without drawing the figure.
     """
-    # Calculate standard deviations
-   # s2_sd = OP_df.groupby(['resi', 'chain'])['s2calc'].std().reset_index()
-   # s2_sd_diff = OP_df.groupby(['resi', 'chain'])['s2calc_diff'].std().reset_index()
-   # s2_sd_clean = s2_sd.dropna(subset=['s2calc'])
+    from scipy.cluster import hierarchy
 
     # Create a pivot table for the clustermap
-    pivot_op = OP_df.pivot_table(index=['PDB'], columns='resi', values='s2calc_diff').fillna(0)
-    pivot_op = pivot_op.drop(columns=[150], errors='ignore')
+    pivot_op = op_pivot(OP_df)
+    row_linkage, col_linkage = cached_linkage(pivot_op, cache_dir, method, metric)
 
-    # Generate the clustermap
-    plt.figure()
-    sns.color_palette("coolwarm", as_cmap=True)
-    g = sns.clustermap(pivot_op, cmap='coolwarm_r', figsize=(10, 8), col_cluster=True)
-
-    # Extract the row and column order from the clustermap
-    row_order = g.dendrogram_row.reordered_ind
-    col_order = g.dendrogram_col.reordered_ind
+    # Row and column order of the dendrograms (same leaf order the clustermap draws)
+    row_order = hierarchy.leaves_list(row_linkage)
+    col_order = hierarchy.leaves_list(col_linkage)
 
     # Reorder the pivot_op DataFrame based on the clustermap order
     pivot_op_reordered = pivot_op.iloc[row_order, col_order]
 
     # Output the reordered pivot_op DataFrame
     pivot_op_reordered.to_csv(output_path.replace('.png', '_pivot_op_reordered.csv'))
+    if pivot_only:
+        return
+
+    # Generate the clustermap from the precomputed linkages
+    plt.figure()
+    sns.clustermap(pivot_op, cmap='coolwarm_r', figsize=(10, 8), col_cluster=True,
+                   row_linkage=row_linkage, col_linkage=col_linkage)
 
     # Save the heatmap
     plt.savefig(output_path)
+    plt.close('all')
 
 
 def plot_op_distribution(OP_df, output_path):
@@ -74,13 +151,8 @@ def plot_stddev_s2calc(OP_df, output_path):
 
 
 
-def estimate_order_parameter(resn, s2):
-    """Estimate the entropy contribution for a given residue and order parameter S^2. Taken from Li & Brüschweiler 2009
-    Example usage: op_df[['Estimated_OP', 'Max_Entropy', 'Min_Entropy']] = op_df.apply(lambda row: pd.Series(estimate_order_parameter(row['resn'], row['s2calc'])), axis=1)
-    """
-   
-    # Constants from Table 1 of the paper
-    AA_OP_PARAMS = {
+# Constants from Table 1 of Li & Brüschweiler 2009
+AA_OP_PARAMS = {
     'V': {'A': 2.19, 'B': 1.32, 'M': 1, 'f': 'linear', 'max_entropy': 0.00697437, 'min_entropy': 0.00435153},
     'S': {'A': 2.19, 'B': 1.32, 'M': 1, 'f': 'linear', 'max_entropy': 0.00697437, 'min_entropy': 0.00435153},
     'T': {'A': 2.19, 'B': 1.32, 'M': 1, 'f': 'linear', 'max_entropy': 0.00697437, 'min_entropy': 0.00435153},
@@ -98,37 +170,125 @@ def estimate_order_parameter(resn, s2):
     'D': {'A': 3.69, 'B': 0.44, 'M': 2, 'f': 'log', 'max_entropy': 0.01466406, 'min_entropy': 0.01466406},
     'E': {'A': 3.66, 'B': 0.64, 'M': 3, 'f': 'log', 'max_entropy': 0.02181726, 'min_entropy': 0.02181726},
     'backbone': {'A': 3.42, 'B': 0.50, 'M': 2, 'f': 'log', 'max_entropy': 0.01359108, 'min_entropy': 0.01359108}
-    }
+}
 
-    # Boltzmann constant in kcal/(mol·K)
-    k_B = 1.987e-3  
-    
-    # Dictionary to convert three-letter amino acid codes to one-letter codes
-    three_to_one = {
-        'ALA': 'A', 'CYS': 'C', 'ASP': 'D', 'GLU': 'E', 'PHE': 'F',
-        'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LYS': 'K', 'LEU': 'L',
-        'MET': 'M', 'ASN': 'N', 'PRO': 'P', 'GLN': 'Q', 'ARG': 'R',
-        'SER': 'S', 'THR': 'T', 'VAL': 'V', 'TRP': 'W', 'TYR': 'Y'
-    }
+# Boltzmann constant in kcal/(mol·K)
+K_B = 1.987e-3
+
+# Dictionary to convert three-letter amino acid codes to one-letter codes
+THREE_TO_ONE = {
+    'ALA': 'A', 'CYS': 'C', 'ASP': 'D', 'GLU': 'E', 'PHE': 'F',
+    'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LYS': 'K', 'LEU': 'L',
+    'MET': 'M', 'ASN': 'N', 'PRO': 'P', 'GLN': 'Q', 'ARG': 'R',
+    'SER': 'S', 'THR': 'T', 'VAL': 'V', 'TRP': 'W', 'TYR': 'Y'
+}
+
+# Lookup arrays indexed by position in OP_PARAM_KEYS
+OP_PARAM_KEYS = list(AA_OP_PARAMS)
+OP_PARAM_ARRAYS = {
+    name: np.array([AA_OP_PARAMS[key][name] for key in OP_PARAM_KEYS], dtype=float)
+    for name in ['A', 'B', 'M', 'max_entropy', 'min_entropy']
+}
+OP_PARAM_ARRAYS['log'] = np.array([AA_OP_PARAMS[key]['f'] == 'log' for key in OP_PARAM_KEYS])
 
+
+def _param_key(resn):
     # Convert three-letter code to one-letter code if necessary
     if len(resn) == 3:
-        resn = three_to_one.get(resn.upper(), resn)
-    resn = resn.upper()
-    
+        resn = THREE_TO_ONE.get(resn.upper(), resn)
+    return resn.upper()
+
+
+def estimate_order_parameter(resn, s2):
+    """Estimate the entropy contribution for a given residue and order parameter S^2. Taken from Li & Brüschweiler 2009
+    For whole tables use estimate_order_parameters (arrays) or add_entropy_columns (DataFrame).
+    """
+    resn = _param_key(resn)
     if resn not in AA_OP_PARAMS:
         return np.nan, np.nan, np.nan  # Skip unknown residues
 
     params = AA_OP_PARAMS[resn]
     M, A, B, f_type = params['M'], params['A'], params['B'], params['f']
-    
+
     op_term = (1 - s2)
-    
+
     if f_type == 'log':
         op_term = np.log(op_term) if op_term > 0 else 0  # Avoid log(0)
 
-    entropy = k_B * M * (A + B * op_term)
+    entropy = K_B * M * (A + B * op_term)
     max_entropy = params['max_entropy']
     min_entropy = params['min_entropy']
-    
+
+    return entropy, max_entropy, min_entropy
+
+
+def estimate_order_parameters(resn, s2):
+    """
+    Vectorized estimate_order_parameter over arrays of residue names and S^2 values.
+
+    Parameters:
+    resn (array-like): Residue names (three- or one-letter codes).
+    s2 (array-like): Order parameters S^2.
+
+    Returns:
+    tuple: (entropy, max_entropy, min_entropy) float arrays, NaN for unknown residues.
+    """
+    # Resolve parameters once per distinct residue name, then broadcast through integer codes
+    # (a categorical Series is factorized from its existing codes)
+    codes, names = pd.factorize(resn if isinstance(resn, pd.Series) else np.asarray(resn, dtype=object))
+    name_rows = np.array([OP_PARAM_KEYS.index(_param_key(name)) if isinstance(name, str) and _param_key(name) in AA_OP_PARAMS
+                          else -1 for name in names], dtype=int)
+    rows = np.append(name_rows, -1)[codes]  # NA sentinel (-1) also maps to unknown
+    unknown = rows < 0
+
+    s2 = np.asarray(s2, dtype=float)
+    op_term = 1 - s2
+    is_log = OP_PARAM_ARRAYS['log'][rows]
+    positive = op_term > 0
+    op_term[is_log & positive] = np.log(op_term[is_log & positive])
+    op_term[is_log & ~positive] = 0  # Avoid log(0)
+
+    entropy = K_B * OP_PARAM_ARRAYS['M'][rows] * (OP_PARAM_ARRAYS['A'][rows] + OP_PARAM_ARRAYS['B'][rows] * op_term)
+    max_entropy = OP_PARAM_ARRAYS['max_entropy'][rows]
+    min_entropy = OP_PARAM_ARRAYS['min_entropy'][rows]
+    for values in (entropy, max_entropy, min_entropy):
+        values[unknown] = np.nan
     return entropy, max_entropy, min_entropy
+
+
+def add_entropy_columns(op_df, resn_column='resn', s2_column='s2calc'):
+    """
+    Add Estimated_OP, Max_Entropy and Min_Entropy columns to an OP dataframe in one pass.
+
+    Parameters:
+    op_df (DataFrame): OP data with residue name and S^2 columns.
+
+    Returns:
+    DataFrame: op_df with the three entropy columns added.
+    """
+    entropy, max_entropy, min_entropy = estimate_order_parameters(op_df[resn_column], op_df[s2_column].to_numpy())
+    return op_df.assign(Estimated_OP=entropy, Max_Entropy=max_entropy, Min_Entropy=min_entropy)
+
+
+def entropy_per_structure(op_df, structure_column='PDB'):
+    """
+    Total conformational entropy of each structure (columns from add_entropy_columns).
+
+    Returns:
+    DataFrame: One row per structure with summed Estimated_OP, Max_Entropy, Min_Entropy and n_residues.
+    """
+    grouped = op_df.groupby(structure_column, sort=False)
+    totals = grouped[['Estimated_OP', 'Max_Entropy', 'Min_Entropy']].sum()
+    totals['n_residues'] = grouped['Estimated_OP'].count()
+    return totals.reset_index()
+
+
+def entropy_per_residue(op_df, residue_columns=('resi', 'chain')):
+    """
+    Entropy of each residue across structures (columns from add_entropy_columns).
+
+    Returns:
+    DataFrame: One row per residue with mean, std and count of Estimated_OP.
+    """
+    stats = op_df.groupby(list(residue_columns))['Estimated_OP'].agg(['mean', 'std', 'count'])
+    return stats.rename(columns=lambda c: f'Estimated_OP_{c}').reset_index()
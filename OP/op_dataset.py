@@ -0,0 +1,171 @@
+"""
+Usage:
+Ingest *_OP.out order-parameter files into a partitioned Parquet dataset and query it.
+
+Every OP.out CSV is converted once into <dataset_dir>/family=<family>/pdb=<PDB>/part-0.parquet.
+Queries read only the requested columns and only the partitions of the requested PDBs, so
+comparison scripts load all structures of a comparison file in one call and build pairs
+with a vectorized self-join (see pair_table) instead of re-reading CSVs per pair.
+
+Command to run (ingest):
+python op_dataset.py <op_dir> <dataset_dir> --family Chymotrypsin [--pattern "*_OP.out"] [--workers 4] [--overwrite]
+
+Example command:
+python op_dataset.py /dors/wankowicz_lab/serine_protease/Chymotrypsin/OP_df ./op_dataset --family Chymotrypsin --workers 8
+
+Querying from another script:
+    from op_dataset import load_op, pair_table
+    op = load_op("./op_dataset", pdb_ids=["1QNJ", "2GCH"], columns=["resi", "chain", "s2calc"])
+    pairs = pair_table("./op_dataset", pd.read_csv("comparison_pairs_1.csv"), "GSA", "TSA")
+
+Requirements:
+- pandas and pyarrow
+"""
+
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+OP_SUFFIX = "_OP.out"
+PART_FILE = "part-0.parquet"
+
+# Partition keys are always strings (a PDB ID such as 1E00 must not be read as a number)
+PARTITIONING = ds.partitioning(pa.schema([("family", pa.string()), ("pdb", pa.string())]), flavor="hive")
+
+# Column types forced on ingest so every partition shares one schema
+OP_DTYPES = {"resi": "int64", "chain": "string", "resn": "string"}
+
+
+def partition_path(dataset_dir, family, pdb_id):
+    return os.path.join(dataset_dir, f"family={family}", f"pdb={pdb_id}", PART_FILE)
+
+
+def ingest_op_file(op_file, dataset_dir, family, overwrite=False):
+    """
+    Convert one <PDB>_OP.out file into its dataset partition, skipping it if the partition is up to date.
+
+    Returns:
+    str: Path of the partition file.
+    """
+    pdb_id = os.path.basename(op_file)[:-len(OP_SUFFIX)]
+    output_path = partition_path(dataset_dir, family, pdb_id)
+    if not overwrite and os.path.exists(output_path) and \
+            os.path.getmtime(output_path) >= os.path.getmtime(op_file):
+        return output_path
+
+    op_df = pd.read_csv(op_file)
+    op_df = op_df.astype({column: dtype for column, dtype in OP_DTYPES.items() if column in op_df.columns})
+    # Remaining numeric columns as float64 so a column of integers in one file does not clash with floats in another
+    numeric = [c for c in op_df.columns if c not in OP_DTYPES and pd.api.types.is_numeric_dtype(op_df[c])]
+    op_df[numeric] = op_df[numeric].astype("float64")
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Per-process temporary name with a leading dot, so parallel ingests do not share it and
+    # dataset readers skip it while it is written
+    tmp_path = os.path.join(os.path.dirname(output_path), f".{PART_FILE}.{os.getpid()}.tmp")
+    try:
+        pq.write_table(pa.Table.from_pandas(op_df, preserve_index=False), tmp_path)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output_path
+
+
+def ingest_op_folder(op_dir, dataset_dir, family, pattern="*" + OP_SUFFIX, workers=1, overwrite=False):
+    """Convert every OP.out file in a folder into the dataset; returns the list of partition files."""
+    op_files = sorted(glob.glob(os.path.join(op_dir, pattern)))
+    if not op_files:
+        print("No OP.out files found in the specified folder.")
+        return []
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(ingest_op_file, op_files, [dataset_dir] * len(op_files),
+                                    [family] * len(op_files), [overwrite] * len(op_files), chunksize=16))
+    else:
+        outputs = [ingest_op_file(op_file, dataset_dir, family, overwrite) for op_file in op_files]
+
+    print(f"Ingested {len(outputs)} OP.out files into {dataset_dir} (family={family})")
+    return outputs
+
+
+def open_dataset(dataset_dir):
+    """Open the partitioned dataset (family and pdb become string columns)."""
+    return ds.dataset(dataset_dir, format="parquet", partitioning=PARTITIONING)
+
+
+def load_op(dataset_dir, pdb_ids=None, families=None, columns=None):
+    """
+    Read order parameters from the dataset.
+
+    Parameters:
+    dataset_dir (str): Dataset directory written by ingest_op_folder.
+    pdb_ids (list): Only these PDB IDs (only their partitions are read); None for all.
+    families (list): Only these protease families; None for all.
+    columns (list): Columns to read (e.g. ["resi", "chain", "s2calc"]); None for all.
+
+    Returns:
+    DataFrame: Requested columns plus "family" and "pdb", ordered by family, PDB and file row.
+    """
+    dataset = open_dataset(dataset_dir)
+    condition = None
+    if pdb_ids is not None:
+        condition = ds.field("pdb").isin([str(p) for p in pdb_ids])
+    if families is not None:
+        family_condition = ds.field("family").isin([str(f) for f in families])
+        condition = family_condition if condition is None else condition & family_condition
+
+    if columns is not None:
+        columns = list(columns) + [c for c in ("family", "pdb") if c not in columns]
+    table = dataset.to_table(columns=columns, filter=condition)
+    op_df = table.to_pandas()
+    # Fragments are read in path order, so sorting by partition keeps each file's row order
+    return op_df.sort_values(["family", "pdb"], kind="stable").reset_index(drop=True)
+
+
+def pair_table(dataset_dir, pairs, pdb1_column, pdb2_column, value_column="s2calc",
+               on=("resi", "chain"), families=None):
+    """
+    Join the order parameters of both structures of every pair in one vectorized self-join.
+
+    Parameters:
+    pairs (DataFrame): One row per comparison pair.
+    pdb1_column, pdb2_column (str): Columns of pairs holding the two PDB IDs.
+    value_column (str): Order-parameter column to compare.
+    on (tuple): Columns matching residues between the two structures.
+
+    Returns:
+    DataFrame: pair, pdb1, pdb2, the `on` columns, <value>_pdb1, <value>_pdb2, in pair order.
+               Pairs missing either structure are dropped.
+    """
+    pairs = pd.DataFrame({"pdb1": pairs[pdb1_column].astype(str), "pdb2": pairs[pdb2_column].astype(str)})
+    pairs["pair"] = pairs["pdb1"] + "_" + pairs["pdb2"]
+
+    on = list(on)
+    op = load_op(dataset_dir, pd.unique(pd.concat([pairs["pdb1"], pairs["pdb2"]])), families,
+                 columns=on + [value_column]).drop(columns="family")
+
+    merged = pairs.merge(op.rename(columns={"pdb": "pdb1", value_column: f"{value_column}_pdb1"}), on="pdb1")
+    merged = merged.merge(op.rename(columns={"pdb": "pdb2", value_column: f"{value_column}_pdb2"}), on=["pdb2"] + on)
+    return merged[["pair", "pdb1", "pdb2"] + on + [f"{value_column}_pdb1", f"{value_column}_pdb2"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest *_OP.out files into a partitioned Parquet dataset.")
+    parser.add_argument("op_dir", type=str, help="Folder containing <PDB>_OP.out files")
+    parser.add_argument("dataset_dir", type=str, help="Output dataset directory")
+    parser.add_argument("--family", type=str, required=True, help="Protease family the files belong to (e.g. Chymotrypsin)")
+    parser.add_argument("--pattern", type=str, default="*" + OP_SUFFIX, help="Glob pattern for OP.out files")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--overwrite", action="store_true", help="Rewrite partitions even if they are up to date")
+    args = parser.parse_args()
+
+    ingest_op_folder(args.op_dir, args.dataset_dir, args.family, args.pattern, args.workers, args.overwrite)
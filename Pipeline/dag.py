@@ -0,0 +1,270 @@
+"""
+Task graph with checkpointing and two executors: a local process pool and SLURM.
+
+A graph is an ordered dict of task name -> task dict (see add_task). A task is either a shell
+command or a Python function call, with the files it produces and the tasks it depends on. A task
+whose outputs all exist is done and is skipped, so an interrupted run resumes where it stopped;
+a task is rerun anyway when an upstream task reruns, so results built on replaced inputs are
+redone. Outputs created by a stub run carry a <output>.stub marker and never count as done in a
+real run.
+A task starts only when every upstream task has finished successfully; when one fails, its
+downstream tasks are marked upstream_failed and the rest of the graph keeps running. A task added
+with run_on_failure=True (e.g. a merge of per-structure outputs) starts once every upstream task
+has finished or failed, and works with the outputs that exist.
+
+Running from another script:
+    from dag import add_task, run_local
+    graph = {}
+    add_task(graph, "qfit_1QNJ", "qfit_protein composite_omit_map.mtz ...", cwd="1QNJ",
+             outputs=["1QNJ/multiconformer_model2.pdb"])
+    add_task(graph, "merge", function=merge_csv, args=(inputs, "all.csv"), deps=["qfit_1QNJ"])
+    status = run_local(graph, workers=8)
+"""
+
+import inspect
+import os
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def add_task(graph, name, command=None, function=None, args=(), outputs=(), deps=(), cwd=None, resources=None,
+             run_on_failure=False):
+    """
+    Add a task to the graph.
+
+    Parameters:
+    name (str): Unique task name (also the log file name).
+    command (str): Shell command, run with bash in cwd.
+    function (callable): Module-level Python function to call instead of a command.
+    args (tuple): Positional arguments for function (plain values, so they survive pickling and SLURM).
+    outputs (list): Files the task writes. The task is skipped when all exist; a task without
+                    outputs always runs.
+    deps (list): Names of upstream tasks.
+    resources (dict): SLURM options for this task, e.g. {"mem": "12G", "time": "1-00:00:00"}.
+    run_on_failure (bool): Run once every upstream task has finished, also when some failed
+                           (SLURM afterany instead of afterok).
+
+    Returns:
+    dict: The task.
+    """
+    if (command is None) == (function is None):
+        raise ValueError(f"Task {name} needs exactly one of command or function")
+    if name in graph:
+        raise ValueError(f"Duplicate task {name}")
+    task = {"name": name, "command": command, "function": function, "args": tuple(args),
+            "outputs": list(outputs), "deps": list(deps), "cwd": cwd, "resources": dict(resources or {}),
+            "run_on_failure": run_on_failure}
+    graph[name] = task
+    return task
+
+
+def topological_order(graph):
+    """Task names with every task after its dependencies (graph order among independent tasks)."""
+    for task in graph.values():
+        missing = [dep for dep in task["deps"] if dep not in graph]
+        if missing:
+            raise ValueError(f"Task {task['name']} depends on unknown tasks: {', '.join(missing)}")
+
+    order, state = [], {}
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+        state[name] = "visiting"
+        for dep in graph[name]["deps"]:
+            visit(dep, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in graph:
+        visit(name, [])
+    return order
+
+
+STUB_SUFFIX = ".stub"
+
+
+def is_done(task, stub=False):
+    """
+    Checkpoint: every declared output exists and is non-empty.
+
+    Outputs with a stub marker only count in a stub run.
+    """
+    return bool(task["outputs"]) and all(os.path.exists(p) and os.path.getsize(p) > 0
+                                         and (stub or not os.path.exists(p + STUB_SUFFIX))
+                                         for p in task["outputs"])
+
+
+def pending_tasks(graph, order, stub=False, force=()):
+    """
+    Tasks that have to run: not done, forced, or downstream of a task that has to run.
+
+    Returns:
+    set: Task names.
+    """
+    pending = set()
+    for name in order:
+        task = graph[name]
+        if name in force or not is_done(task, stub) or any(dep in pending for dep in task["deps"]):
+            pending.add(name)
+    return pending
+
+
+def python_command(task):
+    """Shell command calling a function task (used by SLURM, where the function runs in a new interpreter)."""
+    function = task["function"]
+    source = inspect.getsourcefile(function)
+    module = os.path.splitext(os.path.basename(source))[0]
+    code = (f"import sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(source))!r}); "
+            f"from {module} import {function.__name__}; {function.__name__}(*{task['args']!r})")
+    return f"{shlex.quote(sys.executable)} -c {shlex.quote(code)}"
+
+
+def run_task(task, log_dir, setup="", stub=False):
+    """
+    Run one task, writing its stdout/stderr to <log_dir>/<name>.log.
+
+    Parameters:
+    setup (str): Shell lines run before every command (e.g. sourcing phenix_env.sh).
+    stub (bool): Do not run shell commands; create their declared outputs as placeholders instead
+                 (to test a graph on a workstation without the external tools).
+
+    Returns:
+    tuple: (name, status "done" or "failed", message)
+    """
+    log_path = os.path.join(log_dir, f"{task['name']}.log")
+    try:
+        for path in task["outputs"]:
+            if os.path.exists(path + STUB_SUFFIX):
+                os.remove(path + STUB_SUFFIX)
+        with open(log_path, "w") as log:
+            if task["function"] is not None:
+                stdout, stderr = sys.stdout, sys.stderr
+                sys.stdout = sys.stderr = log
+                try:
+                    task["function"](*task["args"])
+                finally:
+                    sys.stdout, sys.stderr = stdout, stderr
+            elif stub:
+                log.write(f"[stub] {task['command']}\n")
+                for path in task["outputs"]:
+                    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                    with open(path, "w") as f:
+                        f.write(f"stub output of {task['name']}\n")
+            else:
+                command = f"{setup}\n{task['command']}" if setup else task["command"]
+                result = subprocess.run(["bash", "-c", command], cwd=task["cwd"], stdout=log,
+                                        stderr=subprocess.STDOUT)
+                if result.returncode != 0:
+                    raise RuntimeError(f"exit code {result.returncode}")
+        missing = [p for p in task["outputs"] if not os.path.exists(p)]
+        if missing:
+            raise RuntimeError(f"missing outputs: {', '.join(missing)}")
+        if stub:
+            # Every output of a stub run (also of function tasks reading placeholders) is marked,
+            # so a real run redoes it
+            for path in task["outputs"]:
+                open(path + STUB_SUFFIX, "w").close()
+        return task["name"], "done", ""
+    except Exception as e:
+        # A failed command may leave partial outputs (e.g. from a shell redirect); drop them so
+        # the next run does not take them as a checkpoint
+        for path in task["outputs"]:
+            if os.path.isfile(path):
+                os.remove(path)
+        return task["name"], "failed", f"{type(e).__name__} - {e} (log: {log_path})"
+
+
+def run_local(graph, workers=1, log_dir="pipeline_logs", setup="", stub=False, force=()):
+    """
+    Run the graph with a local process pool.
+
+    Parameters:
+    workers (int): Number of tasks run at the same time.
+    force (list): Task names to rerun even if their outputs exist (their downstream tasks rerun too).
+
+    Returns:
+    dict: Task name -> "skipped" (already done), "done", "failed" or "upstream_failed".
+    """
+    order = topological_order(graph)
+    os.makedirs(log_dir, exist_ok=True)
+    to_run = pending_tasks(graph, order, stub, force)
+    status = {name: "skipped" for name in order if name not in to_run}
+    pending = [name for name in order if name in to_run]
+    running = {}
+    start = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            # Propagate failures, then submit every task whose dependencies have all finished
+            for name in list(pending):
+                task = graph[name]
+                deps = [status.get(dep) for dep in task["deps"]]
+                ready = ("skipped", "done", "failed", "upstream_failed") if task["run_on_failure"] else ("skipped", "done")
+                if not task["run_on_failure"] and any(s in ("failed", "upstream_failed") for s in deps):
+                    status[name] = "upstream_failed"
+                    pending.remove(name)
+                elif all(s in ready for s in deps) and len(running) < workers:
+                    running[pool.submit(run_task, graph[name], log_dir, setup, stub)] = name
+                    pending.remove(name)
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, task_status, message = future.result()
+                del running[future]
+                status[name] = task_status
+                print(f"[{time.time() - start:8.1f}s] {name}: {task_status}" + (f" ({message})" if message else ""))
+
+    counts = {s: sum(v == s for v in status.values()) for s in ("done", "skipped", "failed", "upstream_failed")}
+    print(", ".join(f"{n} {s}" for s, n in counts.items()))
+    return status
+
+
+def run_slurm(graph, log_dir="pipeline_logs", setup="", default_resources=None, force=(), dry_run=False):
+    """
+    Submit the graph to SLURM, one job per task chained with afterok dependencies.
+
+    Tasks that are already done, with no upstream task to rerun, are not submitted. Jobs are
+    submitted with --kill-on-invalid-dep=yes, so a failed task cancels its downstream jobs;
+    run_on_failure tasks use afterany instead and are not cancelled.
+
+    Returns:
+    dict: Task name -> SLURM job ID ("skipped" for tasks already done).
+    """
+    order = topological_order(graph)
+    os.makedirs(log_dir, exist_ok=True)
+    to_run = pending_tasks(graph, order, force=force)
+    job_ids = {}
+    for name in order:
+        task = graph[name]
+        if name not in to_run:
+            job_ids[name] = "skipped"
+            continue
+
+        command = python_command(task) if task["function"] is not None else task["command"]
+        script = "\n".join(line for line in (setup, f"cd {shlex.quote(os.path.abspath(task['cwd']))}"
+                                             if task["cwd"] else "", command) if line)
+        options = {"job-name": name, "output": os.path.join(log_dir, f"{name}.log"),
+                   **(default_resources or {}), **task["resources"]}
+        sbatch = ["sbatch", "--parsable"] + ([] if task["run_on_failure"] else ["--kill-on-invalid-dep=yes"])
+        sbatch += [f"--{k}={v}" for k, v in options.items()]
+        upstream = [job_ids[dep] for dep in task["deps"] if job_ids[dep] != "skipped"]
+        if upstream:
+            condition = "afterany" if task["run_on_failure"] else "afterok"
+            sbatch.append(f"--dependency={condition}:" + ":".join(upstream))
+        sbatch += ["--wrap", script]
+
+        if dry_run:
+            job_ids[name] = f"<{name}>"
+            print(" ".join(shlex.quote(a) for a in sbatch))
+            continue
+        result = subprocess.run(sbatch, capture_output=True, text=True, check=True)
+        job_ids[name] = result.stdout.strip().split(";")[0]
+        print(f"{name}: job {job_ids[name]}")
+    return job_ids
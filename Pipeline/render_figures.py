@@ -0,0 +1,220 @@
+"""
+Usage:
+Render a set of figures for several protease families in parallel, without a display.
+
+A JSON spec lists the families (each with its data folder and any other per-family values) and
+the figures (plotting script, arguments, input and output files). Every figure x family job runs
+its script in its own worker process with the non-interactive Agg backend, so plt.show() returns
+at once. A job is skipped when its outputs exist and the hash of its script, the repository
+modules it imports, its arguments and input files matches the last render (kept in
+<output_dir>/render_manifest.json).
+
+Command to run:
+python render_figures.py <spec.json> [--output_dir figures] [--workers 8] [--families Chymotrypsin Elastase]
+                         [--figures R_free_histogram] [--force]
+
+Spec layout (see figures.json):
+{
+  "families": {"Chymotrypsin": {"dir": "/dors/.../Chymotrypsin", "pairs": "Chymotrypsin_pairs.csv"}, ...},
+  "figures": {
+    "R_free_histogram": {
+      "script": "Statistic summary/R_free_histogram.py",
+      "args": ["--input", "{dir}/output/refinement_stats.csv", "--output", "{out}/R_free_distribution.png", "--family", "{family}"],
+      "inputs": ["{dir}/output/refinement_stats.csv"],
+      "outputs": ["{out}/R_free_distribution.png"],
+      "deps": ["OP/functions (1).py"],         (optional; extra code files hashed with the script)
+      "families": ["Chymotrypsin"]            (optional; default all families)
+    }, ...
+  }
+}
+Placeholders: {family}, {out} (= <output_dir>/<family>, also the working directory of the
+script) and every key of the family entry (e.g. {dir}, {pairs}). Script paths are relative to
+the repository root; an input may be a directory (all files below it are hashed). Modules the
+script imports from its own folder or from folders it adds to sys.path (e.g. "Structure store")
+are found and hashed automatically, including their own imports; "deps" adds any others.
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+MANIFEST = "render_manifest.json"
+
+
+def expand_jobs(spec, output_dir, families=None, figures=None):
+    """
+    One job per figure x family, with placeholders filled in.
+
+    Returns:
+    list: Job dicts with key, script, deps, args, inputs, outputs and cwd.
+    """
+    jobs = []
+    for figure, figure_spec in spec["figures"].items():
+        if figures and figure not in figures:
+            continue
+        for family in figure_spec.get("families", list(spec["families"])):
+            if families and family not in families:
+                continue
+            values = {**spec["families"][family], "family": family,
+                      "out": os.path.abspath(os.path.join(output_dir, family))}
+            fill = lambda items: [str(item).format(**values) for item in items]
+            jobs.append({
+                "key": f"{family}/{figure}",
+                "script": os.path.join(REPO_DIR, figure_spec["script"]),
+                "deps": [os.path.join(REPO_DIR, dep) for dep in figure_spec.get("deps", [])],
+                "args": fill(figure_spec.get("args", [])),
+                "inputs": fill(figure_spec.get("inputs", [])),
+                "outputs": fill(figure_spec.get("outputs", [])),
+                "cwd": values["out"],
+            })
+    return jobs
+
+
+def _input_files(path):
+    """The file itself, or every file under a directory input (sorted)."""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+
+
+def script_modules(script):
+    """
+    Repository modules a script imports, directly or through other repository modules.
+
+    Module names are looked up in the script's folder and in repository folders named in its
+    sys.path.append / sys.path.insert calls.
+
+    Returns:
+    list: Module file paths (sorted), not including the script itself.
+    """
+    found, todo = set(), [os.path.abspath(script)]
+    while todo:
+        path = todo.pop()
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+        folders = [os.path.dirname(path)]
+        names = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.add(node.module.split(".")[0])
+            elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                  and node.func.attr in ("append", "insert") and ast.unparse(node.func.value) == "sys.path"):
+                folders += [os.path.join(REPO_DIR, c.value) for c in ast.walk(node)
+                            if isinstance(c, ast.Constant) and isinstance(c.value, str)
+                            and c.value.strip("./") and os.path.isdir(os.path.join(REPO_DIR, c.value))]
+        for name in names:
+            for folder in folders:
+                module = os.path.join(folder, f"{name}.py")
+                if os.path.isfile(module):
+                    if module not in found and module != os.path.abspath(script):
+                        found.add(module)
+                        todo.append(module)
+                    break
+    return sorted(found)
+
+
+def job_hash(job):
+    """
+    SHA-1 of the script, the modules it imports, its extra deps, its arguments and the contents of
+    its input files (directories: all files below).
+    """
+    digest = hashlib.sha1()
+    code = [job["script"]] + script_modules(job["script"]) + job.get("deps", [])
+    for path in code + [f for path in job["inputs"] for f in _input_files(path)]:
+        digest.update(path.encode() + b"\0")
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    digest.update(json.dumps(job["args"]).encode())
+    return digest.hexdigest()
+
+
+def render(job):
+    """
+    Run one plotting script with the Agg backend in a separate process.
+
+    Returns:
+    tuple: (key, status "rendered" or "failed", message, seconds)
+    """
+    start = time.time()
+    os.makedirs(job["cwd"], exist_ok=True)
+    env = {**os.environ, "MPLBACKEND": "Agg"}
+    log_path = os.path.join(job["cwd"], os.path.basename(job["key"]) + ".log")
+    with open(log_path, "w") as log:
+        result = subprocess.run([sys.executable, job["script"]] + job["args"], cwd=job["cwd"], env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+    missing = [p for p in job["outputs"] if not os.path.exists(p)]
+    if result.returncode != 0 or missing:
+        reason = f"exit code {result.returncode}" if result.returncode != 0 else f"missing {', '.join(missing)}"
+        return job["key"], "failed", f"{reason} (log: {log_path})", time.time() - start
+    return job["key"], "rendered", "", time.time() - start
+
+
+def render_all(jobs, output_dir, workers=1, force=False):
+    """
+    Render jobs in parallel, skipping the ones whose input hash is unchanged.
+
+    Returns:
+    dict: Job key -> "rendered", "unchanged", "failed" or "missing_input".
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    status, hashes, todo = {}, {}, []
+    for job in jobs:
+        missing = [p for p in job["inputs"] if not os.path.exists(p)]
+        if missing:
+            status[job["key"]] = "missing_input"
+            print(f"{job['key']}: missing input {', '.join(missing)}")
+            continue
+        hashes[job["key"]] = job_hash(job)
+        if not force and manifest.get(job["key"]) == hashes[job["key"]] and all(os.path.exists(p) for p in job["outputs"]):
+            status[job["key"]] = "unchanged"
+        else:
+            todo.append(job)
+
+    # Each job is its own Python process; threads only wait on them
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, job_status, message, seconds in pool.map(render, todo):
+            status[key] = job_status
+            if job_status == "rendered":
+                manifest[key] = hashes[key]
+            else:
+                manifest.pop(key, None)
+            print(f"{key}: {job_status} in {seconds:.1f}s" + (f" ({message})" if message else ""))
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    counts = {s: sum(v == s for v in status.values()) for s in ("rendered", "unchanged", "failed", "missing_input")}
+    print(", ".join(f"{n} {s}" for s, n in counts.items()))
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render figures x protease families in parallel with a headless backend.")
+    parser.add_argument("spec", help="JSON figure spec")
+    parser.add_argument("--output_dir", default="figures", help="Figures go to <output_dir>/<family>/")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Figures rendered at the same time")
+    parser.add_argument("--families", nargs="*", help="Only these families")
+    parser.add_argument("--figures", nargs="*", help="Only these figures")
+    parser.add_argument("--force", action="store_true", help="Render even if the input hash is unchanged")
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    status = render_all(expand_jobs(spec, args.output_dir, args.families, args.figures), args.output_dir,
+                        args.workers, args.force)
+    sys.exit(1 if any(s == "failed" for s in status.values()) else 0)
@@ -0,0 +1,219 @@
+"""
+Usage:
+Run the per-structure workflow as one dependency graph instead of separate SLURM array scripts.
+
+For every PDB ID in the list (in <base_dir>/<PDB>/):
+  refine (phenix.refine) -> omit_map (phenix.composite_omit_map) -> qfit (qfit_protein)
+  -> qfit_refine (qfit_final_refine_xray.sh) -> [ensemble (phenix.ensemble_refinement)]
+and in <output_dir>/:
+  qfit_refine -> rotalyze (phenix.rotalyze), op (phenix.reduce, make_methyl_df.py, calc_OP.py),
+                 rvalues (single_parse_log.py)
+followed by family-wide merges that start once every upstream task has finished or failed, and
+merge the outputs that exist:
+  all_rvalues.csv, rotamer_data.csv (create_rotamer_data_parsing.py) and the OP Parquet dataset
+  (op_dataset.py).
+With --result_db the merged R-values, rotamers and OP tables are written to one SQLite result
+store (Structure store/result_store.py); all_rvalues.csv is then exported from the store.
+
+Tasks whose outputs exist are skipped, so structures refined earlier (e.g. with an existing
+<PDB>.updated_refine_001.pdb) only run the missing steps. Per-task logs go to <output_dir>/pipeline_logs.
+
+Command to run:
+python run_pipeline.py <pdb_list.txt> <base_dir> <output_dir> [--family Chymotrypsin] [--ensemble] [--result_db results.db]
+                       [--backend local|slurm] [--workers 8] [--setup setup.sh] [--stub] [--dry_run]
+
+Example commands:
+# Workstation, external tools replaced by placeholders to check the wiring
+python run_pipeline.py pdbs_1.txt ./Chymotrypsin ./Chymotrypsin/output --stub --workers 4
+# Cluster: one job per task, chained with afterok dependencies
+python run_pipeline.py pdbs_1.txt /dors/wankowicz_lab/serine_protease/Chymotrypsin \
+    /dors/wankowicz_lab/serine_protease/Chymotrypsin/output --backend slurm --setup env_setup.sh
+
+setup.sh holds the lines every command needs first, e.g.
+    source /dors/wankowicz_lab/shared/conda/etc/profile.d/conda.sh
+    conda activate qfit
+    source .../phenix_env.sh
+    export PHENIX_OVERWRITE_ALL=true
+"""
+
+import argparse
+import os
+import sys
+
+from dag import add_task, run_local, run_slurm
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "OP"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Rotamer states"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+
+TOOLKIT_DIR = "/dors/wankowicz_lab/ensemble_bioinformatic_toolkit"
+
+# SLURM resources per step (from the original array scripts)
+RESOURCES = {
+    "refine": {"mem": "16G", "cpus-per-task": 3, "time": "2-00:00:00"},
+    "omit_map": {"mem": "16G", "cpus-per-task": 1, "time": "2-00:00:00"},
+    "qfit": {"mem": "12G", "cpus-per-task": 1, "time": "0-34:15:00"},
+    "qfit_refine": {"mem": "12G", "cpus-per-task": 1, "time": "0-34:15:00"},
+    "ensemble": {"mem": "8G", "cpus-per-task": 2, "time": "96:00:00"},
+    "bioinformatics": {"mem": "4G", "cpus-per-task": 1, "time": "02:00:00"},
+    "merge": {"mem": "8G", "cpus-per-task": 1, "time": "02:00:00"},
+}
+
+
+def merge_csv(input_files, output_file):
+    """Concatenate CSV files keeping the first header (replaces the awk merge); missing or empty files are skipped."""
+    header_written = False
+    with open(output_file, "w") as out:
+        for path in input_files:
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                print(f"Skipping {path}: missing or empty")
+                continue
+            with open(path) as f:
+                header = f.readline()
+                if not header_written:
+                    out.write(header)
+                    header_written = True
+                for line in f:
+                    out.write(line)
+    print(f"Merged {len(input_files)} files into {output_file}")
+
+
+def store_csv(input_files, result_db, table, key_suffix, export_file=None):
+    """Load per-structure CSV files into a result store table (keyed by PDB) and optionally export the table."""
+    from result_store import export_table, import_files
+    present = [path for path in input_files if os.path.exists(path) and os.path.getsize(path) > 0]
+    import_files(result_db, table, present, key_column="PDB", key_suffix=key_suffix)
+    if export_file:
+        export_table(result_db, table, export_file)
+    print(f"Stored {len(present)} of {len(input_files)} files in {result_db} ({table})")
+
+
+def merge_rotamers(input_files, output_file):
+    """Parse the listed rotalyze outputs into one rotamer table; missing or empty files are skipped."""
+    from create_rotamer_data_parsing import load_rotamer_files, write_rotamers
+    present = [path for path in input_files if os.path.exists(path) and os.path.getsize(path) > 0]
+    write_rotamers(load_rotamer_files(present), output_file)
+    print(f"Merged {len(present)} of {len(input_files)} rotamer files into {output_file}")
+
+
+def ingest_op(op_dir, dataset_dir, family):
+    from op_dataset import ingest_op_folder
+    ingest_op_folder(op_dir, dataset_dir, family)
+
+
+def read_pdb_list(pdb_list):
+    """PDB IDs from a list file, one per line (blank lines ignored)."""
+    with open(pdb_list) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def add_structure_tasks(graph, pdb, base_dir, output_dir, ensemble=False, resolution=1.5, toolkit_dir=TOOLKIT_DIR):
+    """Add the refinement and bioinformatics tasks of one structure; returns the names of its final tasks."""
+    work = os.path.join(base_dir, pdb)
+    qfit_pdb = os.path.join(work, f"{pdb}_qFit.pdb")
+    qfit_log = os.path.join(work, f"{pdb}_qFit.log")
+    out = lambda name: os.path.join(output_dir, name)
+
+    add_task(graph, f"refine_{pdb}", cwd=work, resources=RESOURCES["refine"],
+             command=f"phenix.refine {pdb}.mtz {pdb}.updated.pdb xray_data.r_free_flags.generate=True "
+                     "refinement.main.number_of_macro_cycles=8 refinement.main.ordered_solvent=True "
+                     "refinement.target_weights.optimize_xyz_weight=true refinement.target_weights.optimize_adp_weight=true "
+                     "refinement.input.xray_data.r_free_flags.label=R-free-flags miller_array.labels.name=FOBS,SIGFOBS --overwrite",
+             outputs=[os.path.join(work, f"{pdb}.updated_refine_001.pdb")])
+    add_task(graph, f"omit_map_{pdb}", cwd=work, resources=RESOURCES["omit_map"], deps=[f"refine_{pdb}"],
+             command=f"phenix.composite_omit_map {pdb}.mtz {pdb}.updated_refine_001.pdb omit-type=refine nproc=1",
+             outputs=[os.path.join(work, "composite_omit_map.mtz")])
+    add_task(graph, f"qfit_{pdb}", cwd=work, resources=RESOURCES["qfit"], deps=[f"omit_map_{pdb}"],
+             command=f"qfit_protein composite_omit_map.mtz -l 2FOFCWT,PH2FOFCWT {pdb}.updated_refine_001.pdb",
+             outputs=[os.path.join(work, "multiconformer_model2.pdb")])
+    add_task(graph, f"qfit_refine_{pdb}", cwd=work, resources=RESOURCES["qfit_refine"], deps=[f"qfit_{pdb}"],
+             command=f"qfit_final_refine_xray.sh {pdb}.mtz",
+             outputs=[qfit_pdb, qfit_log])
+    final = []
+    if ensemble:
+        add_task(graph, f"ensemble_{pdb}", cwd=work, resources=RESOURCES["ensemble"], deps=[f"qfit_refine_{pdb}"],
+                 command=f"if [ -f LIG.cif ]; then LIG=elbow.LIG.{pdb}.cif; else LIG=; fi; "
+                         f"phenix.ensemble_refinement {pdb}.updated_refine_001.pdb {pdb}_qFit.mtz $LIG "
+                         "ptls=0.8 wxray_coupled_tbath_offset=5 tx=0.8",
+                 outputs=[os.path.join(work, f"{pdb}.updated_refine_001_ensemble.pdb")])
+        final.append(f"ensemble_{pdb}")
+
+    bio = RESOURCES["bioinformatics"]
+    add_task(graph, f"rotalyze_{pdb}", cwd=output_dir, resources=bio, deps=[f"qfit_refine_{pdb}"],
+             command=f"phenix.rotalyze model={qfit_pdb} outliers_only=False > {out(pdb + '_rotamer_output.txt')}",
+             outputs=[out(f"{pdb}_rotamer_output.txt")])
+    add_task(graph, f"op_{pdb}", cwd=output_dir, resources=bio, deps=[f"qfit_refine_{pdb}"],
+             command=f"phenix.reduce -NOFLIP {qfit_pdb} > {out(pdb + '_qFit_H.pdb')} && "
+                     f"make_methyl_df.py {out(pdb + '_qFit_H.pdb')} --pdb {pdb} && "
+                     f"b_fac=$(b_factor.py {qfit_pdb} --pdb={pdb}) && "
+                     f"calc_OP.py {out(pdb + '.dat')} {out(pdb + '_qFit_H.pdb')} {out(pdb + '_OP.out')} -r {resolution} -b $b_fac",
+             outputs=[out(f"{pdb}_OP.out")])
+    add_task(graph, f"rvalues_{pdb}", cwd=output_dir, resources=bio, deps=[f"qfit_refine_{pdb}"],
+             command=f"python {toolkit_dir}/multiconformer_tools/single_parse_log.py {qfit_log} {pdb} "
+                     f"> {out(pdb + '_rvalues.csv')}",
+             outputs=[out(f"{pdb}_rvalues.csv")])
+    return final + [f"rotalyze_{pdb}", f"op_{pdb}", f"rvalues_{pdb}"]
+
+
+def build_pipeline(pdb_ids, base_dir, output_dir, family="protease", ensemble=False, resolution=1.5,
+                   toolkit_dir=TOOLKIT_DIR, result_db=None):
+    """Task graph for all structures plus the family-wide merges (into result_db if given)."""
+    # Commands run in per-structure folders, so every path is absolute
+    base_dir, output_dir = os.path.abspath(base_dir), os.path.abspath(output_dir)
+    graph = {}
+    for pdb in pdb_ids:
+        add_structure_tasks(graph, pdb, base_dir, output_dir, ensemble, resolution, toolkit_dir)
+
+    merge = RESOURCES["merge"]
+    rvalue_files = [os.path.join(output_dir, f"{pdb}_rvalues.csv") for pdb in pdb_ids]
+    if result_db:
+        result_db = os.path.abspath(result_db)
+        add_task(graph, "merge_rvalues", function=store_csv, resources=merge,
+                 args=(rvalue_files, result_db, "rvalues", "_rvalues.csv", os.path.join(output_dir, "all_rvalues.csv")),
+                 deps=[f"rvalues_{pdb}" for pdb in pdb_ids], run_on_failure=True)
+        add_task(graph, "store_op", function=store_csv, resources=merge,
+                 args=([os.path.join(output_dir, f"{pdb}_OP.out") for pdb in pdb_ids], result_db, "op", "_OP.out"),
+                 deps=[f"op_{pdb}" for pdb in pdb_ids], run_on_failure=True)
+    else:
+        add_task(graph, "merge_rvalues", function=merge_csv, resources=merge,
+                 args=(rvalue_files, os.path.join(output_dir, "all_rvalues.csv")),
+                 deps=[f"rvalues_{pdb}" for pdb in pdb_ids], run_on_failure=True)
+    add_task(graph, "merge_rotamers", function=merge_rotamers, resources=merge,
+             args=([os.path.join(output_dir, f"{pdb}_rotamer_output.txt") for pdb in pdb_ids],
+                   result_db or os.path.join(output_dir, "rotamer_data.csv")),
+             deps=[f"rotalyze_{pdb}" for pdb in pdb_ids], run_on_failure=True)
+    add_task(graph, "ingest_op", function=ingest_op, resources=merge,
+             args=(output_dir, os.path.join(output_dir, "op_dataset"), family),
+             deps=[f"op_{pdb}" for pdb in pdb_ids], run_on_failure=True)
+    return graph
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run refinement, qFit and bioinformatics as one dependency graph.")
+    parser.add_argument("pdb_list", help="Text file with one PDB ID per line")
+    parser.add_argument("base_dir", help="Folder with one sub-folder per PDB (<PDB>.mtz, <PDB>.updated.pdb)")
+    parser.add_argument("output_dir", help="Folder for bioinformatics outputs and merged tables")
+    parser.add_argument("--family", default="protease", help="Family name of the OP dataset partition")
+    parser.add_argument("--ensemble", action="store_true", help="Also run phenix.ensemble_refinement")
+    parser.add_argument("--resolution", type=float, default=1.5, help="Resolution passed to calc_OP.py (-r)")
+    parser.add_argument("--toolkit_dir", default=TOOLKIT_DIR, help="ensemble_bioinformatic_toolkit checkout")
+    parser.add_argument("--result_db", default=None, help="SQLite result store (.db) for the merged tables")
+    parser.add_argument("--backend", choices=["local", "slurm"], default="local", help="Executor")
+    parser.add_argument("--workers", type=int, default=1, help="Tasks run at the same time (local backend)")
+    parser.add_argument("--setup", help="Shell file with environment setup run before every command")
+    parser.add_argument("--stub", action="store_true", help="Local backend: create placeholder outputs instead of running external tools")
+    parser.add_argument("--force", nargs="*", default=[], help="Task names to rerun even if their outputs exist")
+    parser.add_argument("--dry_run", action="store_true", help="SLURM backend: print the sbatch commands only")
+    args = parser.parse_args()
+
+    setup = open(args.setup).read() if args.setup else ""
+    os.makedirs(args.output_dir, exist_ok=True)
+    log_dir = os.path.join(args.output_dir, "pipeline_logs")
+    graph = build_pipeline(read_pdb_list(args.pdb_list), args.base_dir, args.output_dir, args.family,
+                           args.ensemble, args.resolution, args.toolkit_dir, args.result_db)
+
+    if args.backend == "slurm":
+        run_slurm(graph, log_dir, setup, force=args.force, dry_run=args.dry_run)
+    else:
+        status = run_local(graph, args.workers, log_dir, setup, args.stub, args.force)
+        sys.exit(1 if any(s in ("failed", "upstream_failed") for s in status.values()) else 0)
@@ -0,0 +1,65 @@
+"""
+Checkpoint tests for dag.py.
+
+Command to run:
+python -m pytest Pipeline/test_dag.py
+"""
+
+import os
+
+from dag import add_task, run_local, run_slurm
+from run_pipeline import merge_csv
+
+
+def build_graph(tmp_path):
+    graph = {}
+    add_task(graph, "refine", f"echo refined > {tmp_path}/model.pdb", outputs=[f"{tmp_path}/model.pdb"])
+    add_task(graph, "qfit", f"cat {tmp_path}/model.pdb > {tmp_path}/qfit.pdb", outputs=[f"{tmp_path}/qfit.pdb"],
+             deps=["refine"])
+    return graph
+
+
+def test_stub_outputs_do_not_checkpoint_real_run(tmp_path):
+    log_dir = str(tmp_path / "logs")
+    graph = build_graph(tmp_path)
+    assert run_local(graph, log_dir=log_dir, stub=True) == {"refine": "done", "qfit": "done"}
+    assert run_local(graph, log_dir=log_dir, stub=True) == {"refine": "skipped", "qfit": "skipped"}
+
+    assert run_slurm(graph, log_dir=log_dir, dry_run=True) == {"refine": "<refine>", "qfit": "<qfit>"}
+    assert run_local(graph, log_dir=log_dir) == {"refine": "done", "qfit": "done"}
+    assert open(tmp_path / "qfit.pdb").read() == "refined\n"
+    assert not os.path.exists(tmp_path / "model.pdb.stub")
+    assert run_local(graph, log_dir=log_dir) == {"refine": "skipped", "qfit": "skipped"}
+
+
+def test_rerun_upstream_reruns_downstream(tmp_path):
+    log_dir = str(tmp_path / "logs")
+    graph = build_graph(tmp_path)
+    run_local(graph, log_dir=log_dir)
+    assert run_local(graph, log_dir=log_dir, force=["refine"]) == {"refine": "done", "qfit": "done"}
+
+    os.remove(tmp_path / "model.pdb")
+    assert run_slurm(graph, log_dir=log_dir, dry_run=True) == {"refine": "<refine>", "qfit": "<qfit>"}
+
+
+def test_merge_runs_over_existing_outputs_after_failure(tmp_path, capsys):
+    log_dir = str(tmp_path / "logs")
+    graph = {}
+    add_task(graph, "rvalues_1AAA", f"printf 'PDB,Rfree\\n1AAA,0.2\\n' > {tmp_path}/1AAA.csv",
+             outputs=[f"{tmp_path}/1AAA.csv"])
+    add_task(graph, "rvalues_2BBB", "exit 1", outputs=[f"{tmp_path}/2BBB.csv"])
+    add_task(graph, "merge", function=merge_csv, deps=["rvalues_1AAA", "rvalues_2BBB"], run_on_failure=True,
+             args=([f"{tmp_path}/1AAA.csv", f"{tmp_path}/2BBB.csv"], f"{tmp_path}/all.csv"),
+             outputs=[f"{tmp_path}/all.csv"])
+    add_task(graph, "plot", "true", deps=["rvalues_2BBB"])
+
+    status = run_local(graph, log_dir=log_dir)
+    assert status == {"rvalues_1AAA": "done", "rvalues_2BBB": "failed", "merge": "done", "plot": "upstream_failed"}
+    assert open(tmp_path / "all.csv").read() == "PDB,Rfree\n1AAA,0.2\n"
+
+    capsys.readouterr()
+    run_slurm(graph, log_dir=log_dir, force=["rvalues_1AAA"], dry_run=True)
+    sbatch = {line.split("--job-name=")[1].split()[0]: line for line in capsys.readouterr().out.splitlines()}
+    assert "--dependency=afterany:<rvalues_1AAA>:<rvalues_2BBB>" in sbatch["merge"]
+    assert "--kill-on-invalid-dep" not in sbatch["merge"]
+    assert "--dependency=afterok:<rvalues_2BBB>" in sbatch["plot"]
@@ -1,35 +1,159 @@
+"""
+Usage:
+Parse phenix.rotalyze outputs (<PDB>_rotamer_output.txt, written by run_all_bioinformatics_new.sh)
+into one typed table for cross-structure rotamer-state analysis.
+
+Each file is read in one go and its residue lines are split with a single regex pass: the
+fixed-width rotalyze residue ID gives chain, resi, icode, altloc and resn, and the remaining
+':'-separated fields follow the file's own header (score, chi1-chi4, rotamer, ...). Files
+are parsed in parallel and every residue line is kept.
+
+Command to run:
+python create_rotamer_data_parsing.py [--pattern "./*_rotamer_output.txt"] [--output rotamer_data.csv] [--workers 4]
+
+With --output results.db the rows go into the "rotamers" table of the SQLite result store
+(Structure store/result_store.py), replacing earlier rows of the same PDBs.
+
+Output columns:
+PDB, chain, resi, icode, altloc, resn, then the remaining rotalyze columns (e.g. score, chi1-chi4, rotamer).
+PDB, chain, icode, altloc, resn, rotamer (and evaluation) are categorical; resi is an integer,
+numeric rotalyze fields are floats (empty chi angles are NaN).
+"""
+
 #packages
-import pandas as pd
-import numpy as np
-import os
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
 import glob
+import os
+import re
 import sys
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+
+ROTAMER_SUFFIX = "_rotamer_output.txt"
+
+# Fixed-width rotalyze residue ID: chain (2), resseq (4), icode (1), altloc (1), resname (3), then the other fields
+RESIDUE_LINE = re.compile(
+    r"^(?P<chain>[^:]{2})(?P<resi>[ \d-]{3}\d)(?P<icode>[^:])(?P<altloc>[^:])(?P<resn>[^:]{3}):(?P<fields>.*)$",
+    re.MULTILINE,
+)
+
+ID_COLUMNS = ["PDB", "chain", "resi", "icode", "altloc", "resn"]
+CATEGORY_COLUMNS = ["PDB", "chain", "icode", "altloc", "resn", "rotamer", "evaluation"]
+
+
+def pdb_id_from_filename(filename):
+    """PDB ID from <PDB>_rotamer_output.txt."""
+    name = os.path.basename(filename)
+    return name[:-len(ROTAMER_SUFFIX)] if name.endswith(ROTAMER_SUFFIX) else os.path.splitext(name)[0]
+
+
+def parse_rotalyze_file(filename):
+    """
+    Parse one phenix.rotalyze output file.
+
+    Parameters:
+    filename (str): Path to a <PDB>_rotamer_output.txt file.
+
+    Returns:
+    DataFrame: One row per residue line (SUMMARY excluded), string-valued; None if the file has no header.
+    """
+    with open(filename, "r") as f:
+        text = f.read()
+    header_line, _, body = text.partition("\n")
+    header = [column.strip() for column in header_line.split(":")]
+    if not header or header[0] != "residue":
+        return None
+
+    matches = RESIDUE_LINE.findall(body)
+    columns = header[1:]
+    fields = [m[5].split(":") for m in matches]
+    # Pad or trim so every row has exactly the header's fields
+    fields = [(row + [""] * len(columns))[:len(columns)] for row in fields]
+
+    df = pd.DataFrame(fields, columns=columns, dtype=str)
+    df.insert(0, "resn", [m[4] for m in matches])
+    df.insert(0, "altloc", [m[3].strip() for m in matches])
+    df.insert(0, "icode", [m[2].strip() for m in matches])
+    df.insert(0, "resi", [m[1] for m in matches])
+    df.insert(0, "chain", [m[0].strip() for m in matches])
+    df.insert(0, "PDB", pdb_id_from_filename(filename))
+    return df
+
+
+def type_rotamer_table(rotamer):
+    """Convert the string table from parse_rotalyze_file to typed columns."""
+    rotamer["resi"] = rotamer["resi"].str.strip().astype(np.int64)
+    for column in rotamer.columns.difference(ID_COLUMNS + CATEGORY_COLUMNS):
+        values = rotamer[column].str.strip().fillna("")  # NaN where a file lacks the column
+        numeric = pd.to_numeric(values.replace("", np.nan), errors="coerce")
+        # Numeric when every non-empty value parses; empty chi angles become NaN
+        rotamer[column] = numeric if (numeric.notna() | (values == "")).all() else values
+    for column in CATEGORY_COLUMNS:
+        if column in rotamer.columns:
+            rotamer[column] = rotamer[column].str.strip().astype("category")
+    return rotamer
+
+
+def load_rotamers(pattern="./*" + ROTAMER_SUFFIX, workers=1):
+    """
+    Parse every rotalyze output matching pattern into one typed table.
+
+    Parameters:
+    pattern (str): Glob pattern of rotalyze output files.
+    workers (int): Number of worker processes.
+
+    Returns:
+    DataFrame: Rotamer table (see the module docstring), files in sorted order.
+    """
+    return load_rotamer_files(sorted(glob.glob(pattern)), workers)
+
+
+def load_rotamer_files(all_files, workers=1):
+    """
+    Parse the given rotalyze output files into one typed table.
+
+    Parameters:
+    all_files (list): Rotalyze output files, in table order.
+    workers (int): Number of worker processes.
+
+    Returns:
+    DataFrame: Rotamer table (see the module docstring).
+    """
+    if workers > 1:
+        with Pool(processes=workers) as pool:
+            tables = list(pool.imap(parse_rotalyze_file, all_files, chunksize=16))
+    else:
+        tables = [parse_rotalyze_file(filename) for filename in all_files]
+
+    tables = [table for table in tables if table is not None]
+    if not tables:
+        return pd.DataFrame(columns=ID_COLUMNS)
+    return type_rotamer_table(pd.concat(tables, axis=0, ignore_index=True))
+
+
+def write_rotamers(rotamer, output):
+    """Save the rotamer table as .csv, .parquet or into a result store (.db)."""
+    if output.endswith(".parquet"):
+        rotamer.to_parquet(output, index=False)
+    elif output.endswith(".db"):
+        from result_store import write_results
+        write_results(output, "rotamers", rotamer, replace={"PDB": rotamer["PDB"].unique().tolist()})
+    else:
+        rotamer.to_csv(output, index=False)
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse phenix.rotalyze outputs into one rotamer table.")
+    parser.add_argument("--pattern", default="./*" + ROTAMER_SUFFIX, help="Glob pattern of rotalyze output files")
+    parser.add_argument("--output", default="rotamer_data.csv", help="Output table (.csv, .parquet or result store .db)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    args = parser.parse_args()
 
-# ## LOAD IN ROTAMERS
-all_files = glob.glob("./*_rotamer_output.txt")
-li = []
-for filename in all_files:
-    try:
-        df = pd.read_csv(filename, index_col=None, header=0, sep=':')
-        df['PDB'] = filename[10:15]
-        li.append(df)
-    except pd.errors.EmptyDataError:
-        continue
-
-rotamer = pd.concat(li, axis=0, ignore_index=True)
-rotamer = rotamer[rotamer['residue']!= 'SUMMARY'].reset_index()
-split = rotamer['residue'].str.split(" ")
-for i in range(0, (len(rotamer.index)-1)):
-    rotamer.loc[i,'chain'] = split[i][1]
-    STUPID = str(rotamer.loc[i,'residue'])[3:6]
-    tmp = []
-    try:
-        tmp = (int(''.join(i for i in STUPID if i.isdigit())))
-    except:
-        newstr = ''.join((ch if ch in '0123456789.-e' else ' ') for ch in STUPID)
-        tmp = [float(i) for i in newstr.split()]
-    rotamer.loc[i, 'resi'] = tmp
+    # ## LOAD IN ROTAMERS
+    rotamer = load_rotamers(args.pattern, args.workers)
+    write_rotamers(rotamer, args.output)
+    print(f"{len(rotamer)} residues from {rotamer['PDB'].nunique()} structures saved in {args.output}")
@@ -1,8 +1,15 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 
-# Read data (note the spaces and special characters in the filename)
-file_path = "Serine_Protease_Suppmentary_table - Chymotrypsin(filtered).csv"
+parser = argparse.ArgumentParser(description="Histogram of R_free values.")
+parser.add_argument("--input", default="refinement_stats.csv", help="Table with an R_free column (from refinement_stats.py)")
+parser.add_argument("--output", default="R_free_distribution.png", help="Output figure")
+parser.add_argument("--family", default="Chymotrypsin", help="Protease family named in the title")
+args = parser.parse_args()
+
+# Read the per-PDB table written by refinement_stats.py (R-values parsed from the refinement logs)
+file_path = args.input
 df = pd.read_csv(file_path)
 
 # Extract and clean R_free column data
@@ -19,7 +26,7 @@ plt.hist(r_free,
          density=False)              # Show frequency instead of density
 
 # Add chart labels
-plt.title("R_free Distribution of Chymotrpsin Structures", fontsize=14, pad=20)
+plt.title(f"R_free Distribution of {args.family} Structures", fontsize=14, pad=20)
 plt.xlabel("R_free Value", fontsize=12)
 plt.ylabel("Frequency", fontsize=12)
 plt.grid(axis="y", linestyle=":", alpha=0.4)
@@ -40,5 +47,5 @@ plt.text(0.95, 0.95, stats_text,
 
 # Optimize layout and save figure
 plt.tight_layout()
-plt.savefig("Elastase_R_free_Distribution.png", dpi=300, bbox_inches="tight")
+plt.savefig(args.output, dpi=300, bbox_inches="tight")
 plt.show()
@@ -0,0 +1,169 @@
+"""
+Usage:
+Collect R-work, R-free, resolution, space group and cell of every refined structure into one table.
+
+The directory tree is scanned for phenix/qFit refinement logs (<PDB>_qFit.log) and MTZ files
+(<PDB>_qFit.mtz). Logs are read from the end for the final "R-work = ..., R-free = ..." line;
+MTZ headers are read with gemmi without loading the reflections. Files are parsed in parallel,
+and a per-file cache keyed on modification time and size means later runs only re-parse new or
+changed files. This replaces the per-PDB single_parse_log.py array jobs with their awk merge, and
+the phenix.mtz.dump | grep | cut resolution lookup.
+
+Command to run:
+python refinement_stats.py <root_dir> [--output refinement_stats.csv] [--cache refinement_files.csv]
+                           [--log_suffix _qFit.log] [--mtz_suffix _qFit.mtz] [--workers 8] [--result_db results.db]
+
+Example command:
+python refinement_stats.py /dors/wankowicz_lab/serine_protease/Chymotrypsin --workers 16
+
+Output columns (one row per PDB):
+PDB, R_work, R_free, resolution, resolution_low, space_group, a, b, c, alpha, beta, gamma, log_file, mtz_file
+"""
+
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import gemmi
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+
+# "Final R-work = 0.1834, R-free = 0.2102" (phenix.refine) or "r_work = 0.1834 r_free = 0.2102"
+R_VALUES = re.compile(rb"r[-_]work\s*=\s*([0-9.]+),?\s+r[-_]free\s*=\s*([0-9.]+)", re.IGNORECASE)
+TAIL_BYTES = 65536
+
+FILE_COLUMNS = ["path", "kind", "PDB", "mtime_ns", "size", "R_work", "R_free", "resolution", "resolution_low",
+                "space_group", "a", "b", "c", "alpha", "beta", "gamma", "error"]
+
+
+def parse_log(log_file):
+    """
+    Last R-work / R-free pair reported in a refinement log.
+
+    The end of the file is searched first, since the final statistics are printed last.
+
+    Returns:
+    dict: {"R_work", "R_free"} (NaN if the log has none).
+    """
+    with open(log_file, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - TAIL_BYTES, 0))
+        matches = R_VALUES.findall(f.read())
+        if not matches and size > TAIL_BYTES:
+            f.seek(0)
+            matches = R_VALUES.findall(f.read())
+    if not matches:
+        return {"R_work": np.nan, "R_free": np.nan}
+    r_work, r_free = matches[-1]
+    return {"R_work": float(r_work.rstrip(b".")), "R_free": float(r_free.rstrip(b"."))}
+
+
+def parse_mtz_header(mtz_file):
+    """Resolution range, space group and cell from an MTZ header (reflections are not read)."""
+    mtz = gemmi.read_mtz_file(mtz_file, with_data=False)
+    a, b, c, alpha, beta, gamma = mtz.cell.parameters
+    return {"resolution": mtz.resolution_high(), "resolution_low": mtz.resolution_low(),
+            "space_group": mtz.spacegroup.hm if mtz.spacegroup else "",
+            "a": a, "b": b, "c": c, "alpha": alpha, "beta": beta, "gamma": gamma}
+
+
+def parse_file(entry):
+    """Parse one file found by find_files; errors are recorded in the row instead of raised."""
+    row = dict(entry)
+    try:
+        row.update(parse_log(entry["path"]) if entry["kind"] == "log" else parse_mtz_header(entry["path"]))
+        row["error"] = ""
+    except Exception as e:
+        row["error"] = f"{type(e).__name__} - {e}"
+    return row
+
+
+def find_files(root_dir, log_suffix="_qFit.log", mtz_suffix="_qFit.mtz"):
+    """Logs and MTZs under root_dir with their PDB ID, modification time and size."""
+    entries = []
+    for root, _, files in os.walk(root_dir):
+        for name in sorted(files):
+            for kind, suffix in (("log", log_suffix), ("mtz", mtz_suffix)):
+                if name.endswith(suffix):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    entries.append({"path": path, "kind": kind, "PDB": name[:-len(suffix)],
+                                    "mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+    return entries
+
+
+def scan_files(root_dir, cache_file=None, log_suffix="_qFit.log", mtz_suffix="_qFit.mtz", workers=1):
+    """
+    Per-file table of parsed values, re-parsing only files that are new or changed since the cache.
+
+    Returns:
+    DataFrame: One row per file (FILE_COLUMNS); the cache is rewritten when given.
+    """
+    entries = find_files(root_dir, log_suffix, mtz_suffix)
+    cached = {}
+    if cache_file and os.path.exists(cache_file):
+        previous = pd.read_csv(cache_file, dtype={"PDB": str, "space_group": str, "error": str}, keep_default_na=False,
+                               na_values={c: [""] for c in FILE_COLUMNS if c not in ("path", "kind", "PDB", "space_group", "error")})
+        cached = {row["path"]: row for row in previous.to_dict("records")}
+
+    rows, todo = [], []
+    for entry in entries:
+        old = cached.get(entry["path"])
+        if old is not None and old["mtime_ns"] == entry["mtime_ns"] and old["size"] == entry["size"] and not old["error"]:
+            rows.append(old)
+        else:
+            todo.append(entry)
+
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows += list(pool.map(parse_file, todo, chunksize=32))
+    else:
+        rows += [parse_file(entry) for entry in todo]
+    print(f"{len(todo)} files parsed, {len(entries) - len(todo)} unchanged")
+
+    files = pd.DataFrame(rows, columns=FILE_COLUMNS).sort_values("path", kind="stable").reset_index(drop=True)
+    if cache_file:
+        files.to_csv(cache_file, index=False)
+    return files
+
+
+def summarize(files):
+    """
+    One row per PDB: R-values from its log, header values from its MTZ.
+
+    When a PDB has several logs or MTZs in the tree, the most recently modified one is used.
+    """
+    latest = files[files["error"] == ""].sort_values("mtime_ns").groupby(["PDB", "kind"]).tail(1)
+    logs = latest[latest["kind"] == "log"][["PDB", "R_work", "R_free", "path"]].rename(columns={"path": "log_file"})
+    mtz_columns = ["resolution", "resolution_low", "space_group", "a", "b", "c", "alpha", "beta", "gamma"]
+    mtzs = latest[latest["kind"] == "mtz"][["PDB"] + mtz_columns + ["path"]].rename(columns={"path": "mtz_file"})
+    summary = logs.merge(mtzs, on="PDB", how="outer")
+    columns = ["PDB", "R_work", "R_free"] + mtz_columns + ["log_file", "mtz_file"]
+    return summary[columns].sort_values("PDB").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect R-values, resolution, space group and cell of refined structures.")
+    parser.add_argument("root_dir", help="Directory tree with refinement logs and MTZ files")
+    parser.add_argument("--output", default="refinement_stats.csv", help="Per-PDB summary table")
+    parser.add_argument("--cache", default="refinement_files.csv", help="Per-file cache (re-parse only changed files)")
+    parser.add_argument("--log_suffix", default="_qFit.log", help="File name suffix of refinement logs")
+    parser.add_argument("--mtz_suffix", default="_qFit.mtz", help="File name suffix of MTZ files")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--result_db", default=None, help="Also write the summary to the refinement_stats table of this result store")
+    args = parser.parse_args()
+
+    files = scan_files(args.root_dir, args.cache, args.log_suffix, args.mtz_suffix, args.workers)
+    for row in files[files["error"] != ""].itertuples():
+        print(f"Failed to parse {row.path}: {row.error}")
+    summary = summarize(files)
+    summary.to_csv(args.output, index=False)
+    if args.result_db:
+        from result_store import write_results
+        write_results(args.result_db, "refinement_stats", summary, replace={"PDB": summary["PDB"].tolist()})
+    print(f"{len(summary)} structures saved in {args.output}")
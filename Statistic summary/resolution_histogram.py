@@ -1,18 +1,25 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 
-# Read CSV data (assumes file is in current directory)
-df = pd.read_csv("Serine_Protease_Raw_data1.csv")
+parser = argparse.ArgumentParser(description="Histogram of resolutions.")
+parser.add_argument("--input", default="refinement_stats.csv", help="Table with a resolution column (from refinement_stats.py)")
+parser.add_argument("--output", default="resolution_distribution.png", help="Output figure")
+parser.add_argument("--family", default="Serine Protease", help="Protease family named in the title")
+args = parser.parse_args()
+
+# Read the per-PDB table written by refinement_stats.py (resolution from the MTZ headers)
+df = pd.read_csv(args.input)
 
 # Extract and clean resolution column (ensure numeric values)
-resolution = pd.to_numeric(df["Resolution (Å)"], errors="coerce").dropna()
+resolution = pd.to_numeric(df["resolution"], errors="coerce").dropna()
 
 # Plot histogram
 plt.figure(figsize=(10, 6))
 plt.hist(resolution, bins=30, color="#999999", edgecolor="black", alpha=0.8)
 
 # Add labels
-plt.title("Resolution Distribution of Serine Protease Structures", fontsize=14)
+plt.title(f"Resolution Distribution of {args.family} Structures", fontsize=14)
 plt.xlabel("Resolution (Å)", fontsize=12)
 plt.ylabel("Frequency", fontsize=12)
 plt.grid(axis="y", linestyle="--", alpha=0.4)
@@ -32,5 +39,5 @@ plt.text(0.95, 0.95, stats_text,
 
 # Save figure
 plt.tight_layout()
-plt.savefig("resolution_distribution.png", dpi=300)
+plt.savefig(args.output, dpi=300)
 plt.show()
@@ -0,0 +1,190 @@
+"""
+Streaming reader for multi-model ensembles (e.g. phenix.ensemble_refinement output).
+
+The file is read one MODEL block at a time. The first model defines a shared topology
+(chain, resi, icode, resn, name, element, ...), and every later model only contributes its
+per-atom values (B-factors, occupancies or coordinates) for the selected atoms, checked
+against that topology. Values go into a (models x atoms) float32 array, optionally a .npy
+memory map on disk. Per-residue statistics are reduced model by model, so only a
+(models x residues) array is ever held in memory.
+
+Example:
+    from ensemble import ensemble_residue_b_factors
+    stats = ensemble_residue_b_factors("2GCH.updated_refine_001_ensemble.pdb", exclude_chains=("S",))
+    print(stats["resi"], stats["mean"], stats["median"], stats["std"])
+"""
+
+import gzip
+
+import numpy as np
+
+from structure_store import parse_records, fixed_width, record_column, record_float_column
+
+
+def _open_binary(pdb_file):
+    return gzip.open(pdb_file, "rb") if pdb_file.endswith(".gz") else open(pdb_file, "rb")
+
+
+def iter_model_records(pdb_file):
+    """
+    Yield (model number, ATOM/HETATM lines) for each MODEL block, reading one block at a time.
+
+    A file without MODEL records is a single model numbered 1.
+    """
+    model = 1
+    records = []
+    with _open_binary(pdb_file) as f:
+        for line in f:
+            tag = line[:6]
+            if tag == b"ATOM  " or tag == b"HETATM":
+                records.append(line.rstrip(b"\r\n"))
+            elif tag == b"MODEL ":
+                model = int(line[10:14])
+            elif tag == b"ENDMDL":
+                yield model, records
+                records = []
+    if records:
+        yield model, records
+
+
+def count_models(pdb_file):
+    """Number of models in the file (1 if it has no MODEL records)."""
+    n = 0
+    with _open_binary(pdb_file) as f:
+        for line in f:
+            if line[:6] == b"MODEL ":
+                n += 1
+    return max(n, 1)
+
+
+def select_atoms(topology, exclude_chains=("S",), include_hetatm=False, heavy_only=True, first_altloc=True):
+    """
+    Atom selection on a topology from parse_records.
+
+    Parameters:
+    exclude_chains (tuple): Chains to drop entirely (chain S holds waters in the ensembles).
+    include_hetatm (bool): Keep HETATM records (waters, ligands).
+    heavy_only (bool): Drop hydrogens.
+    first_altloc (bool): Keep only the first alternate conformer of each atom.
+
+    Returns:
+    ndarray: Boolean mask over the topology atoms.
+    """
+    keep = ~np.isin(topology["chain"], list(exclude_chains))
+    if not include_hetatm:
+        keep &= ~topology["hetatm"]
+    if heavy_only:
+        keep &= topology["element"] != "H"
+    if first_altloc:
+        atom_keys = np.char.add(np.char.add(topology["residue_index"].astype(str), ":"), topology["name"])
+        _, first = np.unique(atom_keys, return_index=True)
+        is_first = np.zeros(len(atom_keys), dtype=bool)
+        is_first[first] = True
+        keep &= is_first
+    return keep
+
+
+def _model_values(fixed, field):
+    if field == "coords":
+        return np.column_stack([record_float_column(fixed, axis) for axis in "xyz"])
+    return record_float_column(fixed, field)
+
+
+def iter_ensemble(pdb_file, field="b", check_topology=True, **selection):
+    """
+    Stream one model at a time.
+
+    Parameters:
+    pdb_file (str): Multi-model PDB file (.pdb or .pdb.gz).
+    field (str): "b", "occupancy" or "coords".
+    check_topology (bool): Verify every model has the same atoms (by name) as the first.
+    selection: Keyword arguments for select_atoms.
+
+    Yields:
+    tuple: (selected topology, model number, float32 values of the selected atoms); the
+           topology dict is the same object for every model.
+    """
+    topology = None
+    for model, records in iter_model_records(pdb_file):
+        fixed = fixed_width(records)
+        if topology is None:
+            atoms = parse_records(records, np.full(len(records), model, dtype=np.int32))
+            mask = select_atoms(atoms, **selection)
+            topology = {name: values[mask] for name, values in atoms.items() if name not in ("coords", "b", "occupancy")}
+            topology_names = record_column(fixed, "name")
+        elif check_topology:
+            names = record_column(fixed, "name")
+            if len(names) != len(topology_names) or not np.array_equal(names, topology_names):
+                raise ValueError(f"Model {model} of {pdb_file} does not match the topology of the first model")
+        yield topology, model, _model_values(fixed, field)[mask]
+
+
+def read_ensemble(pdb_file, field="b", out_file=None, **selection):
+    """
+    Read all models into one (models x atoms) float32 array ((models x atoms x 3) for coords).
+
+    Parameters:
+    out_file (str): Optional .npy path; the array is then a memory map filled model by model.
+    selection: Keyword arguments for select_atoms.
+
+    Returns:
+    tuple: (selected topology, model numbers, values array)
+    """
+    n_models = count_models(pdb_file)
+    values = None
+    models = []
+    topology = None
+    for i, (topology, model, model_values) in enumerate(iter_ensemble(pdb_file, field, **selection)):
+        if values is None:
+            shape = (n_models,) + model_values.shape
+            values = np.lib.format.open_memmap(out_file, mode="w+", dtype=np.float32, shape=shape) \
+                if out_file else np.empty(shape, dtype=np.float32)
+        values[i] = model_values
+        models.append(model)
+    if values is None:
+        return topology, np.zeros(0, dtype=np.int32), np.zeros((0, 0), dtype=np.float32)
+    return topology, np.array(models, dtype=np.int32), values[:len(models)]
+
+
+def residue_starts(topology):
+    """Start index of each residue in the selected atoms (atoms of a residue are contiguous)."""
+    residue_index = topology["residue_index"]
+    if len(residue_index) == 0:
+        return np.zeros(0, dtype=int)
+    return np.flatnonzero(np.r_[True, residue_index[1:] != residue_index[:-1]])
+
+
+def ensemble_residue_b_factors(pdb_file, exclude_chains=("S",), include_hetatm=False, heavy_only=True,
+                               first_altloc=True):
+    """
+    Per-residue B-factor statistics across an ensemble, streamed model by model.
+
+    For every model the B-factors of each residue's selected atoms are averaged; the statistics
+    are then taken over the models. Defaults drop chain S, HETATM records and hydrogens.
+
+    Returns:
+    dict: "chain", "resi", "icode", "resn" per residue, "model_means" (models x residues) and the
+          per-residue "mean", "median", "std", "min", "max" over models; None if the file has no atoms.
+    """
+    model_means = []
+    topology = None
+    for topology, _, b in iter_ensemble(pdb_file, "b", exclude_chains=exclude_chains,
+                                        include_hetatm=include_hetatm, heavy_only=heavy_only,
+                                        first_altloc=first_altloc):
+        if not model_means:
+            starts = residue_starts(topology)
+            counts = np.diff(np.r_[starts, len(b)])
+        model_means.append(np.add.reduceat(b.astype(np.float64), starts) / counts if len(starts) else np.zeros(0))
+
+    if topology is None:
+        return None
+
+    model_means = np.array(model_means)
+    stats = {name: topology[name][starts] for name in ("chain", "resi", "icode", "resn")}
+    stats["model_means"] = model_means
+    stats["mean"] = model_means.mean(axis=0)
+    stats["median"] = np.median(model_means, axis=0)
+    stats["std"] = model_means.std(axis=0)
+    stats["min"] = model_means.min(axis=0)
+    stats["max"] = model_means.max(axis=0)
+    return stats
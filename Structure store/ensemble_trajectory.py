@@ -0,0 +1,268 @@
+"""
+Usage:
+Memory-mapped trajectory format for ensemble refinement outputs, with streaming RMSF and Cα PCA.
+
+Each *.updated_refine_001_ensemble.pdb is streamed once (see ensemble.py) into
+<traj_dir>/<name>.coords.npy, a (models x atoms x 3) float32 .npy memory map, next to
+<name>.topology.npz holding the shared per-atom topology and the model numbers. Analyses
+memory-map the coordinates and walk them in blocks of models with float64 accumulators, so
+ensembles larger than RAM are handled and the text PDB is never parsed again.
+
+Ensemble refinement models are refined against the same crystal lattice and share one frame,
+so fluctuations are taken directly about the mean structure without superposition.
+
+Command to run:
+python ensemble_trajectory.py <ensemble.pdb> [<ensemble.pdb> ...] [--traj_dir ensemble_trajectory]
+                              [--components 10] [--chunk 64] [--overwrite]
+
+Example command:
+python ensemble_trajectory.py 2GCH/2GCH.updated_refine_001_ensemble.pdb --traj_dir ./ensemble_trajectory
+
+Outputs per ensemble (in traj_dir):
+- <name>.coords.npy, <name>.topology.npz   trajectory
+- <name>_rmsf_atom.csv                      chain, resi, icode, resn, name, rmsf
+- <name>_rmsf_residue.csv                   chain, resi, icode, resn, rmsf, mean_atom_rmsf, max_atom_rmsf
+- <name>_ca_pca.npz                         eigenvalues, variance_fraction, components (3 x Cα), projections (models x k)
+
+Using from another script:
+    from ensemble_trajectory import load_trajectory, rmsf, ca_pca
+    topology, models, coords = load_trajectory("ensemble_trajectory", "2GCH.updated_refine_001_ensemble.pdb")
+    per_atom = rmsf(coords)
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from ensemble import read_ensemble, residue_starts
+
+COORDS_SUFFIX = ".coords.npy"
+TOPOLOGY_SUFFIX = ".topology.npz"
+
+
+def trajectory_name(pdb_file):
+    """File name without .pdb/.gz, as used for store files."""
+    name = os.path.basename(pdb_file)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
+
+
+def trajectory_paths(traj_dir, pdb_file):
+    """(coordinates .npy, topology .npz) paths of an ensemble's trajectory."""
+    base = os.path.join(traj_dir, trajectory_name(pdb_file))
+    return base + COORDS_SUFFIX, base + TOPOLOGY_SUFFIX
+
+
+def convert_ensemble(pdb_file, traj_dir, overwrite=False, **selection):
+    """
+    Stream a multi-model PDB into the trajectory format, skipping it if the trajectory is up to date.
+
+    Parameters:
+    pdb_file (str): Ensemble PDB (.pdb or .pdb.gz).
+    traj_dir (str): Output directory.
+    selection: Keyword arguments for ensemble.select_atoms (default: no chain S, no HETATM,
+               heavy atoms, first alternate conformer).
+
+    Returns:
+    tuple: (coordinates path, topology path)
+    """
+    coords_path, topology_path = trajectory_paths(traj_dir, pdb_file)
+    if not overwrite and os.path.exists(coords_path) and os.path.exists(topology_path) and \
+            os.path.getmtime(topology_path) >= os.path.getmtime(pdb_file):
+        return coords_path, topology_path
+
+    os.makedirs(traj_dir, exist_ok=True)
+    tmp_coords = coords_path + ".tmp"
+    topology, models, coords = read_ensemble(pdb_file, field="coords", out_file=tmp_coords, **selection)
+    if topology is None:
+        raise ValueError(f"{pdb_file} has no atoms")
+    if isinstance(coords, np.memmap):
+        coords.flush()
+    del coords
+    os.replace(tmp_coords, coords_path)
+
+    # Topology is written last, so its timestamp marks a complete trajectory
+    tmp_topology = topology_path + ".tmp.npz"
+    np.savez(tmp_topology, models=models, **topology)
+    os.replace(tmp_topology, topology_path)
+    return coords_path, topology_path
+
+
+def load_trajectory(traj_dir, pdb_file):
+    """
+    Memory-map a converted ensemble.
+
+    Returns:
+    tuple: (topology dict, model numbers, read-only (models x atoms x 3) float32 memory map)
+    """
+    coords_path, topology_path = trajectory_paths(traj_dir, pdb_file)
+    with np.load(topology_path) as f:
+        topology = {name: f[name] for name in f.files}
+    models = topology.pop("models")
+    coords = np.load(coords_path, mmap_mode="r")
+    # read_ensemble sizes the file by MODEL records; keep only the models actually read
+    return topology, models, coords[:len(models)]
+
+
+def _blocks(n_models, chunk):
+    for start in range(0, n_models, chunk):
+        yield start, min(start + chunk, n_models)
+
+
+def mean_structure(coords, atoms=None, chunk=64):
+    """
+    Mean coordinates over models, accumulated in float64 one block of models at a time.
+
+    Parameters:
+    coords (ndarray): (models x atoms x 3) array or memory map.
+    atoms (ndarray): Optional atom indices or mask; all atoms if None.
+
+    Returns:
+    ndarray: (atoms x 3) float64
+    """
+    total = None
+    for start, stop in _blocks(len(coords), chunk):
+        block = np.asarray(coords[start:stop], dtype=np.float64)
+        if atoms is not None:
+            block = block[:, atoms]
+        total = block.sum(axis=0) if total is None else total + block.sum(axis=0)
+    return total / len(coords)
+
+
+def rmsf(coords, atoms=None, chunk=64):
+    """
+    Per-atom root-mean-square fluctuation about the mean structure (population, over models).
+
+    Two streaming passes: the mean, then the squared deviations.
+
+    Returns:
+    ndarray: RMSF of each atom (float64)
+    """
+    mean = mean_structure(coords, atoms, chunk)
+    msf = np.zeros(len(mean))
+    for start, stop in _blocks(len(coords), chunk):
+        block = np.asarray(coords[start:stop], dtype=np.float64)
+        if atoms is not None:
+            block = block[:, atoms]
+        msf += ((block - mean) ** 2).sum(axis=(0, 2))
+    return np.sqrt(msf / len(coords))
+
+
+def residue_fluctuation(topology, atom_rmsf):
+    """
+    Per-residue fluctuation from per-atom RMSF.
+
+    Returns:
+    dict: "chain", "resi", "icode", "resn" per residue, "rmsf" (RMS over the residue's atoms, i.e.
+          the square root of its mean squared fluctuation), "mean_atom_rmsf" and "max_atom_rmsf".
+    """
+    starts = residue_starts(topology)
+    counts = np.diff(np.r_[starts, len(atom_rmsf)])
+    stats = {name: topology[name][starts] for name in ("chain", "resi", "icode", "resn")}
+    if len(starts) == 0:
+        stats.update(rmsf=np.zeros(0), mean_atom_rmsf=np.zeros(0), max_atom_rmsf=np.zeros(0))
+        return stats
+    stats["rmsf"] = np.sqrt(np.add.reduceat(atom_rmsf ** 2, starts) / counts)
+    stats["mean_atom_rmsf"] = np.add.reduceat(atom_rmsf, starts) / counts
+    stats["max_atom_rmsf"] = np.maximum.reduceat(atom_rmsf, starts)
+    return stats
+
+
+def ca_atoms(topology):
+    """Indices of the protein Cα atoms of a trajectory topology."""
+    return np.flatnonzero((topology["name"] == "CA") & (topology["element"] == "C") & ~topology["hetatm"])
+
+
+def covariance(coords, atoms, chunk=64):
+    """
+    Positional covariance of the selected atoms over models, streamed in blocks of models.
+
+    Coordinates are flattened per model as (x1, y1, z1, x2, ...), so the matrix is 3n x 3n and
+    its trace is the summed mean squared fluctuation of the atoms.
+
+    Returns:
+    tuple: (mean (n x 3), covariance (3n x 3n)), both float64
+    """
+    mean = mean_structure(coords, atoms, chunk)
+    flat_mean = mean.ravel()
+    cov = np.zeros((len(flat_mean), len(flat_mean)))
+    for start, stop in _blocks(len(coords), chunk):
+        block = np.asarray(coords[start:stop], dtype=np.float64)[:, atoms].reshape(stop - start, -1)
+        block -= flat_mean
+        cov += block.T @ block
+    return mean, cov / len(coords)
+
+
+def project(coords, atoms, mean, components, chunk=64):
+    """Projection of every model onto principal components ((3n x k) -> (models x k))."""
+    flat_mean = mean.ravel()
+    projections = np.empty((len(coords), components.shape[1]))
+    for start, stop in _blocks(len(coords), chunk):
+        block = np.asarray(coords[start:stop], dtype=np.float64)[:, atoms].reshape(stop - start, -1)
+        projections[start:stop] = (block - flat_mean) @ components
+    return projections
+
+
+def ca_pca(topology, coords, n_components=10, chunk=64):
+    """
+    Principal component analysis of Cα fluctuations across the ensemble.
+
+    Parameters:
+    topology (dict): Trajectory topology.
+    coords (ndarray): (models x atoms x 3) array or memory map.
+    n_components (int): Number of components to keep.
+
+    Returns:
+    dict: "atoms" (Cα indices), "mean", "eigenvalues" (Å², descending), "variance_fraction",
+          "components" (3n x k) and "projections" (models x k).
+    """
+    atoms = ca_atoms(topology)
+    mean, cov = covariance(coords, atoms, chunk)
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    order = np.argsort(eigenvalues)[::-1][:n_components]
+    eigenvalues = np.clip(eigenvalues[order], 0, None)
+    components = eigenvectors[:, order]
+    total = np.trace(cov)
+    return {
+        "atoms": atoms,
+        "mean": mean,
+        "eigenvalues": eigenvalues,
+        "variance_fraction": eigenvalues / total if total > 0 else np.zeros_like(eigenvalues),
+        "components": components,
+        "projections": project(coords, atoms, mean, components, chunk),
+    }
+
+
+def analyze_ensemble(pdb_file, traj_dir, n_components=10, chunk=64, overwrite=False):
+    """Convert one ensemble and write its RMSF tables and Cα PCA next to the trajectory."""
+    convert_ensemble(pdb_file, traj_dir, overwrite)
+    topology, models, coords = load_trajectory(traj_dir, pdb_file)
+    base = os.path.join(traj_dir, trajectory_name(pdb_file))
+
+    atom_rmsf = rmsf(coords, chunk=chunk)
+    atom_columns = {name: topology[name] for name in ("chain", "resi", "icode", "resn", "name")}
+    pd.DataFrame({**atom_columns, "rmsf": atom_rmsf}).to_csv(base + "_rmsf_atom.csv", index=False)
+    pd.DataFrame(residue_fluctuation(topology, atom_rmsf)).to_csv(base + "_rmsf_residue.csv", index=False)
+
+    pca = ca_pca(topology, coords, n_components, chunk)
+    ca = pca["atoms"]
+    np.savez(base + "_ca_pca.npz", models=models, chain=topology["chain"][ca], resi=topology["resi"][ca],
+             icode=topology["icode"][ca], **{k: v for k, v in pca.items() if k != "atoms"})
+    print(f"{trajectory_name(pdb_file)}: {len(models)} models, {coords.shape[1]} atoms, "
+          f"PC1 {pca['variance_fraction'][:1].sum():.1%} of Cα variance")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ensembles to memory-mapped trajectories and compute RMSF and Cα PCA.")
+    parser.add_argument("pdb_files", nargs="+", help="Ensemble refinement PDB files")
+    parser.add_argument("--traj_dir", default="ensemble_trajectory", help="Output directory")
+    parser.add_argument("--components", type=int, default=10, help="Number of principal components to keep")
+    parser.add_argument("--chunk", type=int, default=64, help="Models per block when streaming the trajectory")
+    parser.add_argument("--overwrite", action="store_true", help="Reconvert even if the trajectory is up to date")
+    args = parser.parse_args()
+
+    for pdb_file in args.pdb_files:
+        analyze_ensemble(pdb_file, args.traj_dir, args.components, args.chunk, args.overwrite)
@@ -0,0 +1,283 @@
+"""
+Usage:
+Residue correspondence index mapping every structure's residues onto a family reference numbering.
+
+Each protein chain of a structure is aligned once (global sequence alignment of its Cα residues)
+to a reference chain that carries the family numbering, e.g. a chymotrypsin-numbered structure
+with insertion codes such as 184A. Every aligned residue gets the reference chain, residue number
+and insertion code, whatever the structure's own chain names and numbering. The index is stored
+as one table and extended incrementally, so comparison scripts join on it instead of matching
+raw resi/chain or re-aligning.
+
+Command to run:
+python residue_map.py <structure_list.txt> <reference.pdb> <residue_map.csv> [--reference_chain A]
+                      [--min_identity 0.3] [--store_dir structure_store] [--workers 4]
+
+Each line of structure_list.txt is "<structure.pdb>" or "<structure.pdb> <structure_id>"
+(default ID: file name without .pdb/.gz).
+
+Joining from another script:
+    from residue_map import load_residue_map, to_reference
+    residue_map = load_residue_map("residue_map.csv")
+    op_ref = to_reference(op_df, residue_map, structure_column="PDB")   # adds ref_chain, ref_resi, ref_icode, ref_label
+
+Output columns:
+structure, chain, resi, icode, resn, ref_chain, ref_resi, ref_icode, ref_label, identity, reference
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from structure_store import load_atoms
+
+THREE_TO_ONE = {
+    'ALA': 'A', 'CYS': 'C', 'ASP': 'D', 'GLU': 'E', 'PHE': 'F',
+    'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LYS': 'K', 'LEU': 'L',
+    'MET': 'M', 'ASN': 'N', 'PRO': 'P', 'GLN': 'Q', 'ARG': 'R',
+    'SER': 'S', 'THR': 'T', 'VAL': 'V', 'TRP': 'W', 'TYR': 'Y'
+}
+
+MAP_DTYPES = {
+    "structure": str, "chain": str, "resi": "int64", "icode": str, "resn": str,
+    "ref_chain": str, "ref_resi": "int64", "ref_icode": str, "ref_label": str,
+    "identity": "float64", "reference": str,
+}
+
+
+def structure_id(pdb_file):
+    """Default structure ID: file name without .pdb/.gz (as used for store files)."""
+    name = os.path.basename(pdb_file)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
+
+
+def protein_residues(pdb_file, store_dir=None):
+    """
+    Residues with a protein Cα of every chain (first model, first alternate conformer).
+
+    Returns:
+    dict: chain -> {"resi": int array, "icode": str array, "resn": str array}, in file order.
+    """
+    atoms = load_atoms(pdb_file, store_dir)
+    if len(atoms["model"]) == 0:
+        return {}
+    ca = (atoms["name"] == "CA") & (atoms["element"] == "C") & (atoms["model"] == atoms["model"][0])
+    chains = atoms["chain"][ca]
+    resi = np.asarray(atoms["resi"][ca], dtype=np.int64)
+    icode = atoms["icode"][ca]
+    resn = atoms["resn"][ca]
+    keys = np.char.add(resi.astype(str), icode)
+
+    residues = {}
+    for chain in pd.unique(chains):
+        in_chain = np.flatnonzero(chains == chain)
+        _, first = np.unique(keys[in_chain], return_index=True)
+        idx = in_chain[np.sort(first)]
+        residues[str(chain)] = {"resi": resi[idx], "icode": icode[idx], "resn": resn[idx]}
+    return residues
+
+
+def align_sequences(seq_1, seq_2, gap=-1.0):
+    """
+    Global (Needleman-Wunsch) alignment of two one-letter sequences.
+
+    Identities score 1, mismatches 0 and gaps `gap`.
+
+    Returns:
+    tuple: (idx_1, idx_2, identical) for every aligned (non-gap) position.
+    """
+    n, m = len(seq_1), len(seq_2)
+    score = np.zeros((n + 1, m + 1))
+    score[:, 0] = gap * np.arange(n + 1)
+    score[0, :] = gap * np.arange(m + 1)
+    # One-letter codes as integers, so all identities are one comparison
+    codes_1 = np.array(seq_1, dtype="U1").view(np.int32)
+    codes_2 = np.array(seq_2, dtype="U1").view(np.int32)
+    identities = (codes_1[:, None] == codes_2[None, :]).astype(float)
+    steps = gap * np.arange(m + 1)
+    row = np.empty(m + 1)
+    for i in range(1, n + 1):
+        np.add(score[i - 1, :-1], identities[i - 1], out=row[1:])
+        np.maximum(row[1:], score[i - 1, 1:] + gap, out=row[1:])
+        row[0] = score[i, 0]
+        # Horizontal gaps: score[i, j] = max over k <= j of row[k] + gap * (j - k), a running maximum
+        row -= steps
+        np.maximum.accumulate(row, out=score[i])
+        score[i] += steps
+
+    # Trace back (with a tolerance: the running maximum may round differently from one addition)
+    score = score.tolist()
+    idx_1, idx_2, identical = [], [], []
+    i, j = n, m
+    while i > 0 and j > 0:
+        match = seq_1[i - 1] == seq_2[j - 1]
+        if abs(score[i][j] - (score[i - 1][j - 1] + match)) < 1e-9:
+            idx_1.append(i - 1)
+            idx_2.append(j - 1)
+            identical.append(match)
+            i, j = i - 1, j - 1
+        elif abs(score[i][j] - (score[i - 1][j] + gap)) < 1e-9:
+            i -= 1
+        else:
+            j -= 1
+    return (np.array(idx_1[::-1], dtype=int), np.array(idx_2[::-1], dtype=int),
+            np.array(identical[::-1], dtype=bool))
+
+
+def _sequence(residues):
+    return [THREE_TO_ONE.get(r, 'X') for r in residues["resn"]]
+
+
+def map_structure(pdb_file, reference, structure=None, min_identity=0.3, store_dir=None):
+    """
+    Map the residues of one structure onto the reference numbering.
+
+    Parameters:
+    pdb_file (str): Structure to map.
+    reference (dict): {"chain", "label", "residues"} from load_reference.
+    structure (str): Structure ID (default: file name).
+    min_identity (float): Chains whose identical aligned residues cover less than this fraction of the
+                          shorter sequence are not mapped (inhibitor peptides, other proteins).
+
+    Returns:
+    DataFrame: Rows in MAP_DTYPES layout, one per aligned residue.
+    """
+    structure = structure or structure_id(pdb_file)
+    ref_residues = reference["residues"]
+    ref_sequence = _sequence(ref_residues)
+
+    tables = []
+    for chain, residues in protein_residues(pdb_file, store_dir).items():
+        idx, ref_idx, identical = align_sequences(_sequence(residues), ref_sequence)
+        identity = identical.sum() / max(min(len(residues["resn"]), len(ref_sequence)), 1)
+        if identity < min_identity:
+            continue
+        tables.append(pd.DataFrame({
+            "structure": structure,
+            "chain": chain,
+            "resi": residues["resi"][idx],
+            "icode": residues["icode"][idx],
+            "resn": residues["resn"][idx],
+            "ref_chain": reference["chain"],
+            "ref_resi": ref_residues["resi"][ref_idx],
+            "ref_icode": ref_residues["icode"][ref_idx],
+            "ref_label": np.char.add(ref_residues["resi"][ref_idx].astype(str), ref_residues["icode"][ref_idx]),
+            "identity": float(identity),
+            "reference": reference["label"],
+        }))
+    if not tables:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in MAP_DTYPES.items()})
+    return pd.concat(tables, ignore_index=True).astype(MAP_DTYPES)
+
+
+def load_reference(reference_pdb, reference_chain="A", store_dir=None):
+    """Residues of the reference chain plus a label recorded in the map ("<structure id>:<chain>")."""
+    residues = protein_residues(reference_pdb, store_dir)
+    if reference_chain not in residues:
+        raise ValueError(f"Reference chain {reference_chain} not found in {reference_pdb}")
+    return {"chain": reference_chain, "label": f"{structure_id(reference_pdb)}:{reference_chain}",
+            "residues": residues[reference_chain]}
+
+
+def load_residue_map(map_file):
+    """Read a residue map with its column types (blank insertion codes stay empty strings)."""
+    return pd.read_csv(map_file, dtype=MAP_DTYPES, keep_default_na=False)
+
+
+def build_residue_map(structures, reference_pdb, map_file, reference_chain="A", min_identity=0.3,
+                      store_dir=None, workers=1):
+    """
+    Map every structure onto the reference numbering, skipping structures already in map_file.
+
+    Parameters:
+    structures (list): [(pdb_file, structure_id)] pairs.
+    reference_pdb (str): Structure carrying the family numbering.
+    map_file (str): Residue map CSV; created or extended.
+
+    Returns:
+    DataFrame: The full residue map.
+    """
+    reference = load_reference(reference_pdb, reference_chain, store_dir)
+    residue_map = load_residue_map(map_file) if os.path.exists(map_file) else None
+    if residue_map is not None and len(residue_map) and (residue_map["reference"] != reference["label"]).any():
+        raise ValueError(f"{map_file} was built against a different reference; use a new map file")
+
+    done = set(residue_map["structure"]) if residue_map is not None else set()
+    pending = [(pdb_file, sid) for pdb_file, sid in structures if sid not in done]
+    print(f"{len(pending)} structures to map ({len(done)} already in {map_file})")
+
+    args = ([pdb_file for pdb_file, _ in pending], [reference] * len(pending), [sid for _, sid in pending],
+            [min_identity] * len(pending), [store_dir] * len(pending))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tables = list(pool.map(map_structure, *args, chunksize=8))
+    else:
+        tables = list(map(map_structure, *args))
+
+    tables = ([residue_map] if residue_map is not None else []) + tables
+    residue_map = pd.concat(tables, ignore_index=True).astype(MAP_DTYPES) if tables else \
+        pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in MAP_DTYPES.items()})
+    residue_map.to_csv(map_file, index=False)
+    return residue_map
+
+
+def primary_chains(residue_map):
+    """Chain of each structure with the highest identity to the reference chain (first in file order on ties)."""
+    chains = residue_map.drop_duplicates(subset=["structure", "chain"])
+    best = chains.sort_values("identity", ascending=False, kind="stable").drop_duplicates(subset="structure")
+    return dict(zip(best["structure"], best["chain"]))
+
+
+def to_reference(df, residue_map, structure_column="structure", chain_column="chain", resi_column="resi",
+                 icode_column=None, how="inner"):
+    """
+    Attach reference numbering to a per-residue table with one merge.
+
+    Parameters:
+    df (DataFrame): Table with structure, chain and residue number columns.
+    residue_map (DataFrame): From load_residue_map / build_residue_map.
+    icode_column (str): Insertion-code column of df; None matches residues without insertion code.
+    how (str): "inner" drops residues without a reference position, "left" keeps them with NaN.
+
+    Returns:
+    DataFrame: df with ref_chain, ref_resi, ref_icode and ref_label columns added.
+    """
+    keys = residue_map[["structure", "chain", "resi", "icode", "ref_chain", "ref_resi", "ref_icode", "ref_label"]]
+    keys = keys.rename(columns={"structure": "_structure", "chain": "_chain", "resi": "_resi", "icode": "_icode"})
+    left = df.assign(_structure=df[structure_column].astype(str), _chain=df[chain_column].astype(str),
+                     _resi=df[resi_column].astype("int64"),
+                     _icode=df[icode_column].fillna("").astype(str) if icode_column else "")
+    merged = left.merge(keys, on=["_structure", "_chain", "_resi", "_icode"], how=how)
+    return merged.drop(columns=["_structure", "_chain", "_resi", "_icode"])
+
+
+def read_structure_list(list_file):
+    """Return [(pdb_file, structure_id)] from a structure list file."""
+    structures = []
+    with open(list_file, "r") as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                structures.append((fields[0], fields[1] if len(fields) > 1 else structure_id(fields[0])))
+    return structures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map residues of many structures onto a reference numbering.")
+    parser.add_argument("structure_list", help="File with one '<structure.pdb> [structure_id]' per line")
+    parser.add_argument("reference_pdb", help="Reference structure carrying the family numbering")
+    parser.add_argument("map_file", help="Residue map CSV (extended if it exists)")
+    parser.add_argument("--reference_chain", default="A", help="Chain of the reference structure")
+    parser.add_argument("--min_identity", type=float, default=0.3, help="Minimum sequence identity for a chain to be mapped")
+    parser.add_argument("--store_dir", default=None, help="Structure store directory for cached coordinates")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    args = parser.parse_args()
+
+    residue_map = build_residue_map(read_structure_list(args.structure_list), args.reference_pdb, args.map_file,
+                                    args.reference_chain, args.min_identity, args.store_dir, args.workers)
+    print(f"{residue_map['structure'].nunique()} structures, {len(residue_map)} residues in {args.map_file}")
@@ -0,0 +1,264 @@
+"""
+Usage:
+Transactional SQLite result store shared by the analysis scripts.
+
+Scripts write their per-structure results (R-values, rotamers, OP, distances, RMSDs) as rows of
+one table in a single database file, instead of one small file per PDB that is merged later with
+awk or glob-and-concat. Every write is one transaction that first deletes the rows it replaces
+(e.g. all rows of the same PDB), so reruns are idempotent. The database runs in WAL mode with a
+busy timeout, so many processes can write at once (writes are serialized by SQLite, reads never
+block). Keep the database on a local or node-local disk: SQLite locking is not reliable on
+network filesystems.
+
+Command to run:
+python result_store.py <results.db> tables
+python result_store.py <results.db> export <table> <output.csv|.tsv|.parquet> [--where PDB=1QNJ]
+python result_store.py <results.db> export_files <table> <key_column> <pattern> [--output_dir .] [--columns ...]
+python result_store.py <results.db> import <table> "<glob pattern>" [--key_column PDB --key_suffix _rvalues.csv]
+
+Example commands:
+python result_store.py results.db export distances all_distances.csv
+python result_store.py results.db export_files distances PDB "{}_all_distances.csv" --columns resi chain distance
+python result_store.py results.db import rvalues "output/*_rvalues.csv" --key_column PDB --key_suffix _rvalues.csv
+
+Writing from another script:
+    from result_store import write_results
+    write_results("results.db", "distances", df, replace={"PDB": pdb_id})
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+BUSY_TIMEOUT = 600.0
+
+
+def connect(db_path, timeout=BUSY_TIMEOUT):
+    """Open the store (creating it) in WAL mode; writers wait up to timeout seconds for the lock."""
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _where(where):
+    """SQL condition and parameters for {column: value or list of values}."""
+    clauses, params = [], []
+    for column, value in (where or {}).items():
+        if isinstance(value, (list, tuple, set, pd.Series, pd.Index)):
+            value = list(value)
+            clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(value))})" if value else "0")
+            params += value
+        else:
+            clauses.append(f"{_quote(column)} = ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def table_columns(conn, table):
+    """Column names of a table (empty if it does not exist)."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+
+def write_results(db_path, table, df, replace=None, retries=5):
+    """
+    Write a DataFrame into a table in one transaction.
+
+    The table is created from the DataFrame's columns on first use, and columns new to the table
+    are added. Rows matching replace are deleted in the same transaction, so a rerun for the same
+    structure replaces its rows instead of duplicating them.
+
+    Parameters:
+    db_path (str): SQLite database file.
+    table (str): Table name (e.g. "distances").
+    df (DataFrame): Rows to write.
+    replace (dict): {column: value or list of values} selecting the rows this write replaces.
+    retries (int): Extra attempts if the database stays locked beyond the busy timeout.
+
+    Returns:
+    int: Number of rows written.
+    """
+    # Categoricals and other extension types go in as plain values, missing values as NULL
+    types = {column: _sql_type(df[column].dtype) for column in df.columns}
+    values = df.astype(object).where(df.notna(), None)
+    rows = list(values.itertuples(index=False, name=None))
+    columns = ", ".join(_quote(c) for c in df.columns)
+    insert = f"INSERT INTO {_quote(table)} ({columns}) VALUES ({', '.join('?' * len(df.columns))})"
+
+    for attempt in range(retries + 1):
+        conn = connect(db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = table_columns(conn, table)
+            if not existing:
+                definition = ", ".join(f"{_quote(c)} {t}" for c, t in types.items())
+                conn.execute(f"CREATE TABLE {_quote(table)} ({definition})")
+            for column in df.columns:
+                if existing and column not in existing:
+                    conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)} {types[column]}")
+            if replace and existing:
+                condition, params = _where(replace)
+                conn.execute(f"DELETE FROM {_quote(table)}{condition}", params)
+            conn.executemany(insert, rows)
+            conn.execute("COMMIT")
+            return len(rows)
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if "locked" not in str(e) or attempt == retries:
+                raise
+            time.sleep(2 ** attempt)
+        finally:
+            conn.close()
+
+
+def read_results(db_path, table, where=None, columns=None):
+    """
+    Read rows of a table.
+
+    Parameters:
+    where (dict): {column: value or list of values}; all rows if None.
+    columns (list): Columns to read; all if None.
+
+    Returns:
+    DataFrame: Rows in insertion order.
+    """
+    conn = connect(db_path)
+    try:
+        selected = ", ".join(_quote(c) for c in columns) if columns else "*"
+        condition, params = _where(where)
+        return pd.read_sql_query(f"SELECT {selected} FROM {_quote(table)}{condition} ORDER BY rowid", conn,
+                                 params=params)
+    finally:
+        conn.close()
+
+
+def list_tables(db_path):
+    """Table names with their row counts."""
+    conn = connect(db_path)
+    try:
+        names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+        return {name: conn.execute(f"SELECT COUNT(*) FROM {_quote(name)}").fetchone()[0] for name in names}
+    finally:
+        conn.close()
+
+
+def export_table(db_path, table, output_path, where=None):
+    """Export a table in bulk to .csv, .tsv or .parquet; returns the number of rows."""
+    df = read_results(db_path, table, where)
+    if output_path.endswith(".parquet"):
+        df.to_parquet(output_path, index=False)
+    else:
+        df.to_csv(output_path, index=False, sep="\t" if output_path.endswith(".tsv") else ",")
+    return len(df)
+
+
+def export_files(db_path, table, key_column, pattern, output_dir=".", columns=None):
+    """
+    Write one CSV per key value in the previous per-structure layout (e.g. "{}_all_distances.csv").
+
+    Parameters:
+    columns (list): Columns written to each file; default all but the key column.
+
+    Returns:
+    list: Paths written.
+    """
+    df = read_results(db_path, table)
+    columns = list(columns) if columns else [c for c in df.columns if c != key_column]
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for key, key_df in df.groupby(key_column, sort=False):
+        path = os.path.join(output_dir, pattern.format(key))
+        key_df[columns].to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def import_files(db_path, table, pattern, key_column=None, key_suffix=None, sep=","):
+    """
+    Load existing per-structure CSV files into a table, one transaction per file.
+
+    Parameters:
+    pattern (str or list): Glob pattern, or a list of files.
+    key_column (str): Column to fill with the structure ID taken from the file name; rows of the
+                      same ID are replaced. None to append the files as they are.
+    key_suffix (str): File name suffix removed to get the ID (e.g. "_rvalues.csv").
+
+    Returns:
+    int: Number of files imported.
+    """
+    files = sorted(glob.glob(pattern)) if isinstance(pattern, str) else list(pattern)
+    for path in files:
+        df = pd.read_csv(path, sep=sep)
+        replace = None
+        if key_column:
+            name = os.path.basename(path)
+            key = name[:-len(key_suffix)] if key_suffix and name.endswith(key_suffix) else os.path.splitext(name)[0]
+            if key_column in df.columns:
+                df = df.drop(columns=key_column)
+            df.insert(0, key_column, key)
+            replace = {key_column: key}
+        write_results(db_path, table, df, replace)
+    return len(files)
+
+
+def _parse_where(items):
+    where = {}
+    for item in items or []:
+        column, _, value = item.partition("=")
+        where.setdefault(column, []).append(value)
+    return where
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query, export and import tables of the SQLite result store.")
+    parser.add_argument("db_path", help="SQLite result store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("tables", help="List tables and row counts")
+    export = commands.add_parser("export", help="Export one table to a single file")
+    export.add_argument("table")
+    export.add_argument("output", help="Output file (.csv, .tsv or .parquet)")
+    export.add_argument("--where", nargs="*", help="Filters as column=value (text comparison)")
+    export_per_key = commands.add_parser("export_files", help="Export one file per key value")
+    export_per_key.add_argument("table")
+    export_per_key.add_argument("key_column")
+    export_per_key.add_argument("pattern", help='File name pattern with {} for the key, e.g. "{}_all_distances.csv"')
+    export_per_key.add_argument("--output_dir", default=".")
+    export_per_key.add_argument("--columns", nargs="*", help="Columns written to each file (default: all but the key)")
+    load = commands.add_parser("import", help="Import existing CSV files")
+    load.add_argument("table")
+    load.add_argument("pattern", help="Glob pattern of CSV files")
+    load.add_argument("--key_column", default=None, help="Column filled with the ID from the file name")
+    load.add_argument("--key_suffix", default=None, help="File name suffix removed to get the ID")
+    load.add_argument("--sep", default=",", help="Field separator of the files")
+    args = parser.parse_args()
+
+    if args.command == "tables":
+        for name, count in list_tables(args.db_path).items():
+            print(f"{name}\t{count}")
+    elif args.command == "export":
+        n = export_table(args.db_path, args.table, args.output, _parse_where(args.where))
+        print(f"{n} rows of {args.table} saved in {args.output}")
+    elif args.command == "export_files":
+        paths = export_files(args.db_path, args.table, args.key_column, args.pattern, args.output_dir,
+                             args.columns)
+        print(f"{len(paths)} files written to {args.output_dir}")
+    else:
+        n = import_files(args.db_path, args.table, args.pattern, args.key_column, args.key_suffix, args.sep)
+        print(f"{n} files imported into {args.table}")
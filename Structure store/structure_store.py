@@ -0,0 +1,320 @@
+"""
+Usage:
+One-time converter and loader for a compact binary per-structure coordinate store.
+
+Every analysis script used to re-parse the same PDB files with its own library (PyMOL,
+Biopython, MDAnalysis). This script parses each PDB once with a vectorized fixed-column
+reader and writes a single columnar binary file per structure. Loading a stored structure
+memory-maps the columns, so repeated analyses skip text parsing entirely.
+
+Command to run:
+python structure_store.py <pdb_folder> <store_dir> [--pattern "*.pdb"] [--workers 4]
+
+Example command:
+python structure_store.py /dors/wankowicz_lab/serine_protease/Chymotrypsin/pdb_files ./structure_store --workers 8
+
+Loading from another script:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Structure store"))
+    from structure_store import load_atoms
+    atoms = load_atoms("1QNJ.pdb", store_dir="./structure_store")
+    ca = atoms["name"] == "CA"
+    print(atoms["coords"][ca], atoms["b"][ca])
+
+File layout (<PDB file name>.store):
+- 8-byte magic "SPSTORE1", 8-byte little-endian header length, JSON header
+- One contiguous array per column at 64-byte aligned offsets listed in the header
+- Columns: coords (N x 3 float32), b, occupancy (float32), resi, model, residue_index (int32),
+  hetatm (uint8), altloc, icode (S1), chain, resn, name, element (uint16 codes into interned tables)
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MAGIC = b"SPSTORE1"
+ALIGN = 64
+STORE_SUFFIX = ".store"
+
+# Fixed PDB columns (0-based start, end)
+PDB_COLUMNS = {
+    "name": (12, 16),
+    "altloc": (16, 17),
+    "resn": (17, 21),
+    "chain": (21, 22),
+    "resi": (22, 26),
+    "icode": (26, 27),
+    "x": (30, 38),
+    "y": (38, 46),
+    "z": (46, 54),
+    "occupancy": (54, 60),
+    "b": (60, 66),
+    "element": (76, 78),
+}
+
+# String columns stored as codes into a per-structure table
+INTERNED_COLUMNS = ["chain", "resn", "name", "element"]
+
+
+def _read_records(pdb_file):
+    """Return the ATOM/HETATM lines of a (optionally gzipped) PDB file and the model number of each."""
+    opener = gzip.open if pdb_file.endswith(".gz") else open
+    with opener(pdb_file, "rb") as f:
+        lines = f.read().splitlines()
+
+    records = []
+    models = []
+    model = 1
+    for line in lines:
+        tag = line[:6]
+        if tag == b"ATOM  " or tag == b"HETATM":
+            records.append(line)
+            models.append(model)
+        elif tag == b"MODEL ":
+            model = int(line[10:14])
+    return records, np.array(models, dtype=np.int32)
+
+
+def fixed_width(records):
+    """Pad ATOM/HETATM lines to 80 columns and view them as an (N x 80) byte matrix."""
+    return np.array(records, dtype="S80").view("S1").reshape(-1, 80)
+
+
+def record_column(fixed, name):
+    """Slice one fixed-width PDB column out of an (N x 80) byte matrix as stripped byte strings."""
+    start, end = PDB_COLUMNS[name]
+    raw = np.ascontiguousarray(fixed[:, start:end]).view(f"S{end - start}").ravel()
+    return np.char.strip(raw)
+
+
+def record_float_column(fixed, name):
+    """One numeric PDB column as float32 (blank fields are NaN)."""
+    values = record_column(fixed, name)
+    return np.where(values == b"", b"nan", values).astype(np.float32)
+
+
+def parse_pdb(pdb_file):
+    """
+    Parse a PDB file into columnar NumPy arrays with one vectorized pass over fixed columns.
+
+    Parameters:
+    pdb_file (str): Path to a .pdb or .pdb.gz file.
+
+    Returns:
+    dict: Column name -> array, in the layout written by write_store (strings decoded).
+    """
+    records, models = _read_records(pdb_file)
+    return parse_records(records, models)
+
+
+def parse_records(records, models):
+    """
+    Columnar arrays from ATOM/HETATM lines (bytes) and the model number of each line.
+
+    Returns:
+    dict: Same layout as parse_pdb.
+    """
+    fixed = fixed_width(records)
+
+    atoms = {
+        "coords": np.column_stack([record_float_column(fixed, axis) for axis in "xyz"]).astype(np.float32),
+        "b": record_float_column(fixed, "b"),
+        "occupancy": record_float_column(fixed, "occupancy"),
+        "resi": record_column(fixed, "resi").astype(np.int32) if len(records) else np.zeros(0, dtype=np.int32),
+        "model": models,
+        "hetatm": np.array([line[:6] == b"HETATM" for line in records], dtype=bool),
+        "altloc": np.ascontiguousarray(fixed[:, 16]).astype("U1"),
+        "icode": np.ascontiguousarray(fixed[:, 26]).astype("U1"),
+    }
+    for name in INTERNED_COLUMNS:
+        atoms[name] = record_column(fixed, name).astype(str)
+
+    # Element falls back to the first letter of the atom name when columns 77-78 are blank
+    missing = atoms["element"] == ""
+    atoms["element"][missing] = np.char.lstrip(atoms["name"][missing], "0123456789").astype("U1")
+
+    # Blank altloc/icode are stored as empty strings, as PyMOL and Biopython report them stripped
+    atoms["altloc"] = np.char.strip(atoms["altloc"])
+    atoms["icode"] = np.char.strip(atoms["icode"])
+
+    atoms["residue_index"] = _residue_index(atoms)
+    return atoms
+
+
+def _residue_index(atoms):
+    """Consecutive residue number per atom; a new residue starts whenever model/chain/resi/icode changes."""
+    n = len(atoms["resi"])
+    if n == 0:
+        return np.zeros(0, dtype=np.int32)
+    change = np.zeros(n, dtype=bool)
+    change[0] = True
+    for key in ["model", "chain", "resi", "icode"]:
+        change[1:] |= atoms[key][1:] != atoms[key][:-1]
+    return (np.cumsum(change) - 1).astype(np.int32)
+
+
+def write_store(atoms, output_path, source=None):
+    """
+    Write parsed atoms to a single columnar binary file.
+
+    Parameters:
+    atoms (dict): Output of parse_pdb.
+    output_path (str): Destination .store file.
+    source (str): Optional path of the PDB the store was built from.
+    """
+    columns = {
+        "coords": atoms["coords"].astype(np.float32),
+        "b": atoms["b"].astype(np.float32),
+        "occupancy": atoms["occupancy"].astype(np.float32),
+        "resi": atoms["resi"].astype(np.int32),
+        "model": atoms["model"].astype(np.int32),
+        "residue_index": atoms["residue_index"].astype(np.int32),
+        "hetatm": atoms["hetatm"].astype(np.uint8),
+        "altloc": np.char.encode(atoms["altloc"]).astype("S1"),
+        "icode": np.char.encode(atoms["icode"]).astype("S1"),
+    }
+    tables = {}
+    for name in INTERNED_COLUMNS:
+        table, codes = np.unique(atoms[name], return_inverse=True)
+        tables[name] = table.tolist()
+        columns[name] = codes.astype(np.uint16)
+
+    # Lay out columns at aligned offsets after the header
+    layout = {}
+    offset = 0
+    for name, values in columns.items():
+        layout[name] = {"dtype": values.dtype.str, "shape": list(values.shape), "offset": offset}
+        offset += -(-values.nbytes // ALIGN) * ALIGN
+
+    header = json.dumps({"columns": layout, "tables": tables, "source": source}).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    # Per-process temporary name, so parallel writers of the same store never share a file
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name, values in columns.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(np.ascontiguousarray(values).tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_header(store_file):
+    with open(store_file, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{store_file} is not a structure store file")
+        header_len = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_len))
+    data_start = -(-(len(MAGIC) + 8 + header_len) // ALIGN) * ALIGN
+    return header, data_start
+
+
+def load_structure(store_file, decode=True):
+    """
+    Memory-map a structure store file.
+
+    Parameters:
+    store_file (str): Path to a .store file.
+    decode (bool): Replace interned code columns with string arrays (chain, resn, name, element).
+
+    Returns:
+    dict: Column name -> array. Numeric columns are read-only memory maps.
+    """
+    header, data_start = _read_header(store_file)
+    atoms = {}
+    for name, spec in header["columns"].items():
+        shape = tuple(spec["shape"])
+        if np.prod(shape) == 0:
+            atoms[name] = np.zeros(shape, dtype=spec["dtype"])
+            continue
+        atoms[name] = np.memmap(store_file, dtype=spec["dtype"], mode="r",
+                                offset=data_start + spec["offset"], shape=shape)
+
+    atoms["hetatm"] = atoms["hetatm"].view(bool)
+    atoms["altloc"] = np.char.decode(atoms["altloc"]).astype("U1")
+    atoms["icode"] = np.char.decode(atoms["icode"]).astype("U1")
+    for name in INTERNED_COLUMNS:
+        if decode:
+            atoms[name] = np.array(header["tables"][name], dtype=str)[atoms[name]]
+        else:
+            atoms[name + "_table"] = np.array(header["tables"][name], dtype=str)
+    return atoms
+
+
+def store_path(store_dir, pdb_file):
+    """Path of the store file for a PDB file (file name without .pdb/.gz, so refinement variants stay apart)."""
+    name = os.path.basename(pdb_file)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return os.path.join(store_dir, os.path.splitext(name)[0] + STORE_SUFFIX)
+
+
+def convert_structure(pdb_file, store_dir, overwrite=False):
+    """
+    Convert one PDB file into the store, skipping it if the store file is newer than the PDB.
+
+    Returns:
+    str: Path of the store file.
+    """
+    output_path = store_path(store_dir, pdb_file)
+    if not overwrite and os.path.exists(output_path) and \
+            os.path.getmtime(output_path) >= os.path.getmtime(pdb_file):
+        return output_path
+    write_store(parse_pdb(pdb_file), output_path, source=os.path.abspath(pdb_file))
+    return output_path
+
+
+def load_atoms(pdb_file, store_dir=None):
+    """
+    Loader the analysis scripts call instead of their own PDB parsers.
+
+    Reads the stored copy of pdb_file when store_dir is given (converting it on first use),
+    otherwise parses the PDB directly. Both paths return the same column layout.
+    """
+    if store_dir is None:
+        return parse_pdb(pdb_file)
+    os.makedirs(store_dir, exist_ok=True)
+    return load_structure(convert_structure(pdb_file, store_dir))
+
+
+def convert_folder(pdb_folder, store_dir, pattern="*.pdb", workers=1, overwrite=False):
+    """Convert every PDB in a folder matching pattern; returns the list of store files."""
+    pdb_files = sorted(glob.glob(os.path.join(pdb_folder, pattern)))
+    if not pdb_files:
+        print("No PDB files found in the specified folder.")
+        return []
+    os.makedirs(store_dir, exist_ok=True)
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(convert_structure, pdb_files, [store_dir] * len(pdb_files),
+                                    [overwrite] * len(pdb_files), chunksize=8))
+    else:
+        outputs = [convert_structure(pdb_file, store_dir, overwrite) for pdb_file in pdb_files]
+
+    print(f"Converted {len(outputs)} structures into {store_dir}")
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert PDB files into the binary structure store.")
+    parser.add_argument("pdb_folder", type=str, help="Folder containing PDB files")
+    parser.add_argument("store_dir", type=str, help="Output directory for .store files")
+    parser.add_argument("--pattern", type=str, default="*.pdb", help="Glob pattern for PDB files (e.g. '*.pdb.gz')")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--overwrite", action="store_true", help="Rebuild store files even if they are up to date")
+    args = parser.parse_args()
+
+    convert_folder(args.pdb_folder, args.store_dir, args.pattern, args.workers, args.overwrite)
@@ -1,21 +1,64 @@
+"""
+Usage:
+Add a SIGFOBS column (sqrt(max(FOBS, 0))) right after FOBS in MTZ files before the qfit_protein runs.
+
+Files are processed in parallel and skipped when their output is newer than the input, so a
+directory tree of thousands of MTZs can be prepared (and re-prepared after adding files) in one
+call. A summary table lists every file as processed, skipped or failed.
+
+Command to run:
+python reorder_mtz.py [<mtz_dir>] [--recursive] [--workers 8] [--suffix _with_sigma]
+                      [--summary reorder_mtz_summary.csv] [--overwrite]
+
+Example command:
+python reorder_mtz.py /dors/wankowicz_lab/serine_protease/Chymotrypsin/mtz --recursive --workers 16
+"""
+
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import gemmi
 import numpy as np
-import os
 
+SUMMARY_COLUMNS = ["input", "output", "status", "message"]
 
-def reorder_columns_with_sigfobs(input_mtz_path, output_suffix="_with_sigma"):
+
+def output_path_for(input_mtz_path, output_suffix="_with_sigma"):
+    return f"{os.path.splitext(input_mtz_path)[0]}{output_suffix}.mtz"
+
+
+def reorder_columns_with_sigfobs(input_mtz_path, output_suffix="_with_sigma", overwrite=False):
+    """
+    Write a copy of one MTZ with SIGFOBS inserted after FOBS.
+
+    Parameters:
+    input_mtz_path (str): MTZ file with a FOBS column.
+    output_suffix (str): Appended to the file name for the output.
+    overwrite (bool): Rewrite the output even if it is newer than the input.
+
+    Returns:
+    dict: Summary row with input, output, status ("processed", "skipped" or "failed") and message.
+    """
+    output_path = output_path_for(input_mtz_path, output_suffix)
+    row = {"input": input_mtz_path, "output": output_path, "status": "processed", "message": ""}
     try:
-        print(f"\n🔍 Processing file: {input_mtz_path}")
+        if not overwrite and os.path.exists(output_path) and \
+                os.path.getmtime(output_path) >= os.path.getmtime(input_mtz_path):
+            row.update(status="skipped", message="Output is up to date")
+            return row
 
         # Read original MTZ file
         original_mtz = gemmi.read_mtz_file(input_mtz_path)
 
         # Check required columns
-        if not original_mtz.column_with_label("FOBS"):
+        labels = original_mtz.column_labels()
+        if "FOBS" not in labels:
             raise ValueError("Missing FOBS column")
-        if original_mtz.column_with_label("SIGFOBS"):
-            print(f"⚠️  File already contains SIGFOBS column. Skipping.")
-            return
+        if "SIGFOBS" in labels:
+            row.update(status="skipped", output="", message="File already contains SIGFOBS column")
+            return row
 
         # ===== Create new MTZ object =====
         new_mtz = gemmi.Mtz()
@@ -39,49 +82,78 @@ def reorder_columns_with_sigfobs(input_mtz_path, output_suffix="_with_sigma"):
             if hasattr(orig_dataset, 'id'):
                 new_dataset.id = orig_dataset.id
 
-        # ===== Column order handling =====
-        target_columns = []
-        inserted = False
-        for col in original_mtz.columns:
-            target_columns.append(col.label)
-            if col.label == "FOBS" and not inserted:
-                target_columns.append("SIGFOBS")
-                inserted = True
-
-        # ===== Add all columns =====
-        for label in target_columns:
-            if label == "SIGFOBS":
+        # ===== Column order: SIGFOBS after the first FOBS =====
+        fobs_idx = labels.index("FOBS")
+        order = np.insert(np.arange(len(labels)), fobs_idx + 1, fobs_idx)
+        for i, source in enumerate(order):
+            if i == fobs_idx + 1:
                 new_mtz.add_column("SIGFOBS", "Q")
             else:
-                orig_col = original_mtz.column_with_label(label)
-                new_mtz.add_column(orig_col.label, orig_col.type)
-
-        # ===== Data reorganization =====
-        original_data = original_mtz.array
-        fobs_idx = original_mtz.column_labels().index("FOBS")
-        sigfobs = np.sqrt(np.clip(original_data[:, fobs_idx], 0, None))
-
-        new_data = []
-        for label in target_columns:
-            if label == "SIGFOBS":
-                new_data.append(sigfobs)
-            else:
-                idx = original_mtz.column_labels().index(label)
-                new_data.append(original_data[:, idx])
+                new_mtz.add_column(labels[source], original_mtz.columns[source].type)
 
-        new_mtz.set_data(np.column_stack(new_data))
+        # ===== Data reorganization: one gather, FOBS duplicated into the SIGFOBS slot =====
+        new_data = original_mtz.array[:, order]
+        new_data[:, fobs_idx + 1] = np.sqrt(np.clip(new_data[:, fobs_idx], 0, None))
+        new_mtz.set_data(new_data)
 
         # ===== Save output file =====
-        output_path = f"{os.path.splitext(input_mtz_path)[0]}{output_suffix}.mtz"
-        new_mtz.write_to_file(output_path)
-        print(f"✅ Successfully generated: {output_path}")
+        tmp_path = output_path + ".tmp"
+        new_mtz.write_to_file(tmp_path)
+        os.replace(tmp_path, output_path)
 
     except Exception as e:
-        print(f"❌ Failed to process: {type(e).__name__} - {str(e)}")
+        row.update(status="failed", message=f"{type(e).__name__} - {str(e)}")
+    return row
+
+
+def find_mtz_files(mtz_dir, recursive=False, output_suffix="_with_sigma"):
+    """MTZ inputs under mtz_dir in sorted order, leaving out outputs of earlier runs."""
+    if recursive:
+        paths = [os.path.join(root, f) for root, _, files in os.walk(mtz_dir) for f in files]
+    else:
+        paths = [os.path.join(mtz_dir, f) for f in os.listdir(mtz_dir)]
+    return sorted(p for p in paths
+                  if p.endswith(".mtz") and not p.endswith(output_suffix + ".mtz") and os.path.isfile(p))
+
+
+def reorder_folder(mtz_dir=".", recursive=False, output_suffix="_with_sigma", workers=1, overwrite=False,
+                   summary_path="reorder_mtz_summary.csv"):
+    """
+    Process every MTZ in a folder (or tree) and write the summary table.
+
+    Returns:
+    list: Summary rows, in file order.
+    """
+    mtz_files = find_mtz_files(mtz_dir, recursive, output_suffix)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(reorder_columns_with_sigfobs, mtz_files, [output_suffix] * len(mtz_files),
+                                 [overwrite] * len(mtz_files), chunksize=16))
+    else:
+        rows = [reorder_columns_with_sigfobs(f, output_suffix, overwrite) for f in mtz_files]
+
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    for row in rows:
+        if row["status"] == "failed":
+            print(f"❌ Failed to process {row['input']}: {row['message']}")
+    counts = {status: sum(row["status"] == status for row in rows) for status in ("processed", "skipped", "failed")}
+    print(f"\nAll files processed! {counts['processed']} processed, {counts['skipped']} skipped, "
+          f"{counts['failed']} failed (see {summary_path})")
+    return rows
 
 
 if __name__ == "__main__":
-    for f in os.listdir('.'):
-        if f.endswith('.mtz'):
-            reorder_columns_with_sigfobs(f)
-    print("\nAll files processed!")
+    parser = argparse.ArgumentParser(description="Insert a SIGFOBS column after FOBS in MTZ files.")
+    parser.add_argument("mtz_dir", nargs="?", default=".", help="Folder containing MTZ files")
+    parser.add_argument("--recursive", action="store_true", help="Also process MTZs in subdirectories")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--suffix", default="_with_sigma", help="Suffix of the output file names")
+    parser.add_argument("--summary", default="reorder_mtz_summary.csv", help="Summary table of processed, skipped and failed files")
+    parser.add_argument("--overwrite", action="store_true", help="Rewrite outputs even if they are up to date")
+    args = parser.parse_args()
+
+    reorder_folder(args.mtz_dir, args.recursive, args.suffix, args.workers, args.overwrite, args.summary)